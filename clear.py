@@ -1,181 +1,272 @@
 import os
-import shutil
-import send2trash
-import hashlib
-import winreg
+import sys
 import subprocess
-import json
 import threading
-import concurrent.futures
-import time
+import tkinter
 from tkinter import filedialog, messagebox
 import customtkinter as ctk
-from PIL import Image, ImageTk
-from collections import defaultdict
-import psutil
 
-ctk.set_appearance_mode("Dark")
-ctk.set_default_color_theme("blue")
+from pccleaner import dedupe
+from pccleaner import duplicates as duplicates_engine
+from pccleaner import gifcache
+from pccleaner import inventory
+from pccleaner import liveindex
+from pccleaner import similar
+from pccleaner.deleter import Deleter, empty_windows_recycle_bin
+from pccleaner.analysis import DiskUsage, analyze_disk, find_large_files, LARGE_FILE_SIZE, TOP_FILES
+from pccleaner.hashcache import HashCache
+from pccleaner.logsink import LogPipeline, StreamSink, coalesce
+from pccleaner.progress import OperationController, format_progress, format_size
+from pccleaner.report import ReportStore
+from pccleaner.rowmodel import RowModel
+from pccleaner.tempclean import clean_folder, temp_folders, trash_folders
+from pccleaner.topk import TopK
 
 class AnimatedGIF(ctk.CTkLabel):
-    def __init__(self, master, path, size=(100, 100)):
+    # Кадры декодируются и уменьшаются в фоновом потоке (или берутся из кеша на диске),
+    # PhotoImage создаётся при первом показе кадра. Пока окно свёрнуто, анимация стоит.
+    def __init__(self, master, path, size=(100, 100), log_pipeline=None):
+        super().__init__(master, text="", width=size[0], height=size[1])
+        self.log_pipeline = log_pipeline
         self.frames = []
+        self.durations = []
+        self.photos = {}
         self.current_frame = 0
-        
-        image = Image.open(path)
-        for frame in range(image.n_frames):
-            image.seek(frame)
-            frame_image = image.copy().resize(size, Image.LANCZOS)
-            self.frames.append(ImageTk.PhotoImage(frame_image))
-        
-        super().__init__(master, image=self.frames[0], text="")
         self.is_playing = False
+        self._job = None
+        self._loaded = threading.Event()
+        threading.Thread(target=self.load, args=(path, size), daemon=True).start()
+        self.winfo_toplevel().bind("<Unmap>", self.on_visibility, add="+")
+        self.winfo_toplevel().bind("<Map>", self.on_visibility, add="+")
+
+    def load(self, path, size):
+        try:
+            self.frames, self.durations = gifcache.load_frames(path, size)
+        except Exception as e:
+            if self.log_pipeline is not None:
+                self.log_pipeline.emit(f"Не удалось загрузить {path}: {e}", level="error")
+        self._loaded.set()
+
+    def photo(self, index):
+        from PIL import ImageTk
+
+        if index not in self.photos:
+            self.photos[index] = ImageTk.PhotoImage(self.frames[index])
+        return self.photos[index]
 
     def start(self):
         self.is_playing = True
-        self.animate()
+        self.schedule(0)
 
     def stop(self):
         self.is_playing = False
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+
+    def schedule(self, delay):
+        if self._job is not None:
+            self.after_cancel(self._job)
+        self._job = self.after(delay, self.animate)
+
+    def on_visibility(self, event):
+        # События Map/Unmap приходят и от дочерних виджетов, нас интересует только само окно
+        if event.widget is not self.winfo_toplevel() or not self.is_playing:
+            return
+        if event.type == tkinter.EventType.Unmap:
+            if self._job is not None:
+                self.after_cancel(self._job)
+                self._job = None
+        elif self._job is None:
+            self.schedule(0)
 
     def animate(self):
-        if self.is_playing:
-            self.current_frame = (self.current_frame + 1) % len(self.frames)
-            self.configure(image=self.frames[self.current_frame])
-            self.after(50, self.animate)
+        self._job = None
+        if not self.is_playing:
+            return
+        if not self._loaded.is_set():
+            self.schedule(50)
+            return
+        if not self.frames:
+            return
+        self.configure(image=self.photo(self.current_frame))
+        delay = self.durations[self.current_frame]
+        self.current_frame = (self.current_frame + 1) % len(self.frames)
+        self.schedule(delay)
+
+class TextboxLogSink:
+    # Выводит записи лога в CTkTextbox одной вставкой за такт таймера
+    def __init__(self, textbox, max_lines_per_flush=500, max_lines=10000):
+        self.textbox = textbox
+        self.max_lines_per_flush = max_lines_per_flush
+        self.max_lines = max_lines
+
+    def write(self, records):
+        lines = [message if count == 1 else f"{message} (x{count})" for message, count in coalesce(records)]
+        skipped = len(lines) - self.max_lines_per_flush
+        if skipped > 0:
+            lines = lines[:self.max_lines_per_flush] + [f"... пропущено сообщений: {skipped}"]
+        self.textbox.insert("end", "\n".join(lines) + "\n")
+        excess = int(self.textbox.index("end-1c").split(".")[0]) - self.max_lines
+        if excess > 0:
+            self.textbox.delete("1.0", f"{excess + 1}.0")
+        self.textbox.see("end")
+
+class VirtualList(ctk.CTkFrame):
+    # Показывает RowModel: меток создаётся столько, сколько строк помещается в окно,
+    # при прокрутке у них меняется только текст. Фильтр и сортировка выполняются в модели,
+    # выделение хранится в модели по id строк.
+    def __init__(self, master, model, format_row, sort_columns=(), filter_columns=None, on_activate=None,
+                 row_height=24, **kwargs):
+        super().__init__(master, **kwargs)
+        self.model = model
+        self.format_row = format_row
+        self.filter_columns = filter_columns
+        self.on_activate = on_activate
+        self.row_height = row_height
+        self.top = 0
+        self.labels = []
+        self.shown = []
+        self._version = -1
+        self._sort_state = {}
+        self._filter_job = None
+        self._selected_color = ctk.ThemeManager.theme["CTkButton"]["fg_color"]
+
+        toolbar = ctk.CTkFrame(self, fg_color="transparent")
+        toolbar.pack(fill="x")
+        self.filter_entry = ctk.CTkEntry(toolbar, placeholder_text="Фильтр")
+        self.filter_entry.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        self.filter_entry.bind("<KeyRelease>", self.on_filter_key)
+        for title, name, reverse in sort_columns:
+            ctk.CTkButton(toolbar, text=title, width=90,
+                          command=lambda name=name, reverse=reverse: self.sort(name, reverse)).pack(side="left", padx=2)
+        self.count_label = ctk.CTkLabel(toolbar, text="")
+        self.count_label.pack(side="left", padx=5)
+
+        body = ctk.CTkFrame(self)
+        body.pack(fill="both", expand=True, pady=(5, 0))
+        self.scrollbar = ctk.CTkScrollbar(body, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.rows_frame = ctk.CTkFrame(body, fg_color="transparent")
+        self.rows_frame.pack(side="left", fill="both", expand=True)
+        self.rows_frame.bind("<Configure>", self.on_resize)
+        self.bind_wheel(self.rows_frame)
+
+    def bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda event: self.scroll_to(self.top - 3 * (1 if event.delta > 0 else -1)))
+        widget.bind("<Button-4>", lambda event: self.scroll_to(self.top - 3))
+        widget.bind("<Button-5>", lambda event: self.scroll_to(self.top + 3))
+
+    def on_resize(self, event):
+        count = max(event.height // self.row_height, 1)
+        while len(self.labels) < count:
+            index = len(self.labels)
+            label = ctk.CTkLabel(self.rows_frame, text="", anchor="w", height=self.row_height, corner_radius=0)
+            label.pack(fill="x")
+            label.bind("<Button-1>", lambda event, index=index: self.on_click(index))
+            label.bind("<Double-Button-1>", lambda event, index=index: self.on_double_click(index))
+            self.bind_wheel(label)
+            self.labels.append(label)
+        while len(self.labels) > count:
+            self.labels.pop().destroy()
+        self.refresh(force=True)
+
+    def on_click(self, index):
+        if index < len(self.shown):
+            self.model.toggle(self.shown[index])
+            self.refresh()
+
+    def on_double_click(self, index):
+        if index < len(self.shown) and self.on_activate:
+            self.on_activate(self.shown[index])
+
+    def on_filter_key(self, event):
+        # Фильтруем, когда пользователь перестал печатать, а не на каждую клавишу
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(250, self.apply_filter)
+
+    def apply_filter(self):
+        self._filter_job = None
+        self.model.filter(self.filter_entry.get(), self.filter_columns)
+        self.scroll_to(0)
+
+    def sort(self, name, reverse):
+        # Повторное нажатие меняет направление
+        reverse = not self._sort_state[name] if name in self._sort_state else reverse
+        self._sort_state[name] = reverse
+        self.model.sort(name, reverse)
+        self.scroll_to(0)
+
+    def on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.scroll_to(int(float(args[0]) * len(self.model)))
+        elif action == "scroll":
+            step = int(args[0]) * (len(self.labels) if len(args) > 1 and args[1] == "pages" else 1)
+            self.scroll_to(self.top + step)
+
+    def scroll_to(self, top):
+        self.top = top
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        if self.model.version == self._version and not force:
+            return
+        self._version = self.model.version
+        total = len(self.model)
+        visible = len(self.labels)
+        self.top = max(min(self.top, total - visible), 0)
+        rows = self.model.slice(self.top, visible)
+        self.shown = [row_id for row_id, _ in rows]
+        for i, label in enumerate(self.labels):
+            if i < len(rows):
+                row_id, row = rows[i]
+                selected = row_id in self.model.selected
+                label.configure(text=self.format_row(row_id, row),
+                                fg_color=self._selected_color if selected else "transparent")
+            else:
+                label.configure(text="", fg_color="transparent")
+        if total:
+            self.scrollbar.set(self.top / total, min((self.top + visible) / total, 1.0))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self.count_label.configure(text=f"строк: {total}, выбрано: {len(self.model.selected)}")
 
 class PCCleaner:
-    def __init__(self, log_widget):
-        self.log_widget = log_widget
-        self.stop_flag = threading.Event()
-        self.report_data = {}
+    def __init__(self, log_pipeline=None):
+        if log_pipeline is None:
+            log_pipeline = LogPipeline()
+            log_pipeline.add_sink(StreamSink(sys.stdout))
+            log_pipeline.start()
+        self.log_pipeline = log_pipeline
+        self.controller = OperationController()
+        self.report = ReportStore()
+        # Общие настройки удаления: потоки, лимиты удалений и байт в секунду, корзина вместо удаления
+        self.delete_settings = {"max_workers": None, "ops_per_s": None, "bytes_per_s": None, "trash": False}
+        # Полный анализ диска без снимка прошлого анализа (снимок старше недели и так не используется)
+        self.rescan = False
+        # Программы и автозагрузка: реестр в Windows, в других системах — только поддельный реестр для проверки
+        provider = inventory.default_provider()
+        self.inventory = inventory.Inventory(provider, inventory.default_cache_path()) if provider else None
 
     def log(self, message):
-        self.log_widget.insert("end", message + "\n")
-        self.log_widget.see("end")
-        self.report_data[time.strftime("%Y-%m-%d %H:%M:%S")] = message
+        self.log_pipeline.emit(message)
+        self.report.add(message)
 
-    def analyze_installed_programs(self):
-        self.log("Анализ установленных программ...")
-        programs = self.get_installed_programs()
-        self.show_installed_programs(programs)
-
-    def get_installed_programs(self):
-        programs = []
-        for hive in [winreg.HKEY_LOCAL_MACHINE, winreg.HKEY_CURRENT_USER]:
-            key_path = r"Software\Microsoft\Windows\CurrentVersion\Uninstall"
-            try:
-                key = winreg.OpenKey(hive, key_path)
-                for i in range(winreg.QueryInfoKey(key)[0]):
-                    try:
-                        subkey_name = winreg.EnumKey(key, i)
-                        subkey = winreg.OpenKey(key, subkey_name)
-                        display_name = winreg.QueryValueEx(subkey, "DisplayName")[0]
-                        uninstall_string = winreg.QueryValueEx(subkey, "UninstallString")[0]
-                        programs.append((display_name, uninstall_string))
-                    except WindowsError:
-                        continue
-            except WindowsError:
-                continue
-        return programs
-
-    def show_installed_programs(self, programs):
-        programs_window = ctk.CTkToplevel()
-        programs_window.title("Установленные программы")
-        programs_window.geometry("600x400")
-
-        listbox = ctk.CTkTextbox(programs_window)
-        listbox.pack(fill="both", expand=True, padx=10, pady=10)
-
-        for program, _ in sorted(programs):
-            listbox.insert("end", f"{program}\n")
-
-        uninstall_button = ctk.CTkButton(programs_window, text="Удалить выбранную программу", 
-                                        command=lambda: self.uninstall_program(listbox, programs))
-        uninstall_button.pack(pady=10)
-
-    def uninstall_program(self, listbox, programs):
-        selected = listbox.selection_get().split("\n")[0]
-        for program_name, uninstall_string in programs:
-            if program_name == selected:
-                if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить {program_name}?"):
-                    try:
-                        subprocess.run(uninstall_string, shell=True, check=True)
-                        self.log(f"Программа {program_name} успешно удалена")
-                    except subprocess.CalledProcessError:
-                        self.log(f"Ошибка при удалении программы {program_name}")
-                break
-
-    def export_report(self):
-        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
-        if file_path:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.report_data, f, ensure_ascii=False, indent=4)
-            self.log(f"Отчет экспортирован в {file_path}")
-
-    def analyze_large_files(self):
-        path = filedialog.askdirectory(title="Выберите директорию для анализа больших файлов")
-        if not path:
-            return
-
-        self.log(f"Анализ больших файлов в {path}")
-        large_files = []
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            for root, _, files in os.walk(path):
-                if self.stop_flag.is_set():
-                    break
-                futures = [executor.submit(self.get_file_size, os.path.join(root, file)) for file in files]
-                for future in concurrent.futures.as_completed(futures):
-                    if self.stop_flag.is_set():
-                        break
-                    file_path, size = future.result()
-                    if size > 100 * 1024 * 1024:  # файлы больше 100 МБ
-                        large_files.append((file_path, size))
-
-        large_files.sort(key=lambda x: x[1], reverse=True)
-        self.show_large_files(large_files[:100])  # показываем топ-100 больших файлов
-
-    def show_large_files(self, large_files):
-        large_files_window = ctk.CTkToplevel()
-        large_files_window.title("Большие файлы")
-        large_files_window.geometry("600x400")
-
-        listbox = ctk.CTkTextbox(large_files_window)
-        listbox.pack(fill="both", expand=True, padx=10, pady=10)
-
-        for file_path, size in large_files:
-            file_name = os.path.basename(file_path)
-            listbox.insert("end", f"{self.format_size(size)} - {file_name}\n")
-
-        delete_button = ctk.CTkButton(large_files_window, text="Удалить выбранный файл", 
-                                    command=lambda: self.delete_large_file(listbox, large_files))
-        delete_button.pack(pady=10)
+    def make_deleter(self, task, **overrides):
+        return Deleter(**{"stop_flag": task, "progress": task, **self.delete_settings, **overrides})
 
     def manage_startup_programs(self):
+        if self.inventory is None:
+            self.log("Автозагрузка доступна только в Windows (или в поддельном реестре PCCLEANER_INVENTORY)")
+            return
         startup_programs = self.get_startup_programs()
         self.show_startup_programs(startup_programs)
 
     def get_startup_programs(self):
-        startup_programs = []
-        startup_path = os.path.join(os.getenv('APPDATA'), 'Microsoft', 'Windows', 'Start Menu', 'Programs', 'Startup')
-        
-        # Проверяем программы в папке автозагрузки
-        for item in os.listdir(startup_path):
-            item_path = os.path.join(startup_path, item)
-            startup_programs.append((item, item_path))
-        
-        # Проверяем программы в реестре
-        key_path = r"Software\Microsoft\Windows\CurrentVersion\Run"
-        for hive in [winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE]:
-            try:
-                key = winreg.OpenKey(hive, key_path)
-                for i in range(winreg.QueryInfoKey(key)[1]):
-                    name, value, type = winreg.EnumValue(key, i)
-                    startup_programs.append((name, value))
-            except WindowsError:
-                continue
-        
+        # Папка автозагрузки и разделы Run; перечитываются только изменившиеся с прошлого раза
+        startup_programs = self.inventory.startup_items()
+        self.save_inventory()
         return startup_programs
 
     def show_startup_programs(self, startup_programs):
@@ -186,8 +277,8 @@ class PCCleaner:
         listbox = ctk.CTkTextbox(startup_window)
         listbox.pack(fill="both", expand=True, padx=10, pady=10)
 
-        for program, path in startup_programs:
-            listbox.insert("end", f"{program}\n")
+        for item in startup_programs:
+            listbox.insert("end", f"{item.name}\n")
 
         disable_button = ctk.CTkButton(startup_window, text="Отключить выбранную программу", 
                                    command=lambda: self.disable_startup_program(listbox, startup_programs))
@@ -195,233 +286,390 @@ class PCCleaner:
 
     def disable_startup_program(self, listbox, startup_programs):
         selected = listbox.selection_get().split("\n")[0]
-        for program, path in startup_programs:
-            if program == selected:
-                if path.endswith('.lnk'):
-                    try:
-                        os.remove(path)
-                        self.log(f"Программа {program} удалена из автозагрузки")
-                    except Exception as e:
-                        self.log(f"Ошибка при удалении {program} из автозагрузки: {str(e)}")
-                else:
-                    try:
-                        key_path = r"Software\Microsoft\Windows\CurrentVersion\Run"
-                        key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, key_path, 0, winreg.KEY_ALL_ACCESS)
-                        winreg.DeleteValue(key, program)
-                        winreg.CloseKey(key)
-                        self.log(f"Программа {program} удалена из автозагрузки")
-                    except WindowsError as e:
-                        self.log(f"Ошибка при удалении {program} из автозагрузки: {str(e)}")
-                    break
-        
-        # Обновляем список программ автозагрузки
-        updated_startup_programs = self.get_startup_programs()
-        listbox.delete("1.0", "end")
-        for program, _ in updated_startup_programs:
-            listbox.insert("end", f"{program}\n")
-
-    def clean_temp_files(self):
-        temp_folders = [os.environ.get('TEMP'), os.environ.get('TMP')]
-        for folder in temp_folders:
-            if folder and os.path.exists(folder):
-                self.log(f"Очистка временной папки: {folder}")
-                with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-                    for root, dirs, files in os.walk(folder):
-                        if self.stop_flag.is_set():
-                            break
-                        futures = []
-                        for name in files + dirs:
-                            path = os.path.join(root, name)
-                            if os.path.isfile(path):
-                                futures.append(executor.submit(self.delete_file, path))
-                            elif os.path.isdir(path):
-                                futures.append(executor.submit(self.delete_directory, path))
-                        concurrent.futures.wait(futures)
-        self.log("Очистка временных файлов завершена")
-
-    def delete_file(self, path):
-        try:
-            os.unlink(path)
-            self.log(f"Удален файл: {path}")
-        except Exception as e:
-            self.log(f"Ошибка при удалении {path}: {str(e)}")
+        for item in startup_programs:
+            if item.name == selected:
+                try:
+                    # Перечитывается только источник, из которого убрали запись
+                    startup_programs[:] = self.inventory.disable_startup(item)
+                    self.log(f"Программа {item.name} удалена из автозагрузки")
+                except OSError as e:
+                    self.log(f"Ошибка при удалении {item.name} из автозагрузки: {str(e)}")
+                break
+        self.save_inventory()
 
-    def delete_directory(self, path):
-        try:
-            shutil.rmtree(path)
-            self.log(f"Удалена папка: {path}")
-        except Exception as e:
-            self.log(f"Ошибка при удалении {path}: {str(e)}")
+        listbox.delete("1.0", "end")
+        for item in startup_programs:
+            listbox.insert("end", f"{item.name}\n")
+
+    def clean_temp_files(self, folders=None, rules=None, dry_run=False):
+        # В лог — одна сводка на папку; ошибки по отдельным файлам попадают только в отчёт
+        with self.report.operation("clean_temp_files", dry_run=dry_run) as op, \
+                self.controller.start("Очистка временных файлов") as task:
+            # Прогресс считает clean_folder по просмотренным файлам, удаления в него не добавляются
+            deleter = self.make_deleter(task, progress=None)
+            for folder in folders or temp_folders():
+                stats = clean_folder(folder, rules, dry_run=dry_run, stop_flag=task, progress=task, deleter=deleter,
+                                     on_error=lambda path, e: self.report.add(f"Ошибка при удалении {path}: {str(e)}",
+                                                                              kind="error"))
+                if dry_run:
+                    self.log(f"{folder}: можно удалить {stats.matched} файлов, {self.format_size(stats.reclaimable)}")
+                else:
+                    self.log(f"{folder}: удалено файлов {stats.files}, папок {stats.dirs}, "
+                             f"освобождено {self.format_size(stats.bytes_freed)}, пропущено {stats.skipped}, "
+                             f"занято другими программами {stats.in_use}, ошибок {stats.errors}")
+                op.fields["files_touched"] += stats.files + stats.dirs
+                op.fields["bytes_freed"] += stats.bytes_freed
+            op.fields["failures"] = deleter.result.failures
+            if not dry_run:
+                self.log(f"Итого: {deleter.result.summary()}")
+            self.log("Очистка временных файлов завершена")
 
     def empty_recycle_bin(self):
         self.log("Начало очистки корзины")
-        try:
-            send2trash.send2trash = lambda x: x
-            shutil.rmtree(os.path.expanduser("~/$Recycle.Bin"))
-            self.log("Корзина успешно очищена")
-        except Exception as e:
-            self.log(f"Ошибка при очистке корзины: {str(e)}")
-        finally:
-            send2trash.send2trash = send2trash._send2trash
-
-    def find_duplicates(self):
-        path = filedialog.askdirectory(title="Выберите директорию для поиска дубликатов")
+        if os.name == "nt":
+            try:
+                empty_windows_recycle_bin()
+                self.log("Корзина успешно очищена")
+            except Exception as e:
+                self.log(f"Ошибка при очистке корзины: {str(e)}")
+            return
+        # Корзина freedesktop/macOS — обычные папки: удаляем их содержимое безвозвратно
+        with self.report.operation("empty_recycle_bin") as op, self.controller.start("Очистка корзины") as task:
+            deleter = self.make_deleter(task, trash=False)
+            for folder in trash_folders():
+                clean_folder(folder, stop_flag=task, deleter=deleter,
+                             on_error=lambda path, e: self.report.add(f"Ошибка при удалении {path}: {str(e)}",
+                                                                      kind="error"))
+            op.fields.update(files_touched=deleter.result.files, bytes_freed=deleter.result.bytes_freed,
+                             failures=deleter.result.failures)
+        self.log(f"Корзина очищена: {deleter.result.summary()}")
+
+    def find_duplicates(self, path=None):
+        if path is None:
+            path = filedialog.askdirectory(title="Выберите директорию для поиска дубликатов")
         if not path:
             return
 
         self.log(f"Начало поиска дубликатов в {path}")
-        duplicates = defaultdict(list)
-        
-        start_time = time.time()
-        total_size = 0
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            futures = []
-            for dirpath, _, filenames in os.walk(path):
-                for filename in filenames:
-                    if self.stop_flag.is_set():
-                        break
-                    full_path = os.path.join(dirpath, filename)
-                    futures.append(executor.submit(self.process_file, full_path))
-            
-            for future in concurrent.futures.as_completed(futures):
-                if self.stop_flag.is_set():
-                    break
-                file_hash, file_path, file_size = future.result()
-                duplicates[file_hash].append(file_path)
-                total_size += file_size
-
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-        speed = total_size / elapsed_time / (1024 * 1024)  # MB/s
-
-        self.log(f"Обработано {total_size / (1024*1024):.2f} MB за {elapsed_time:.2f} секунд")
+        with self.report.operation("find_duplicates", root=path) as op, HashCache() as cache, \
+                self.controller.start("Поиск дубликатов") as task:
+            duplicates, stats = duplicates_engine.find_duplicates(
+                path, stop_flag=task, progress=task, cache=cache,
+                on_error=lambda file_path, e: self.log(f"Ошибка при чтении {file_path}: {str(e)}"))
+            op.fields.update(files_touched=stats.files_total, bytes_read=stats.bytes_read,
+                             bytes_avoided=stats.bytes_avoided, groups=stats.groups)
+        self.log_cache_stats(cache)
+
+        speed = stats.bytes_total / stats.elapsed / (1024 * 1024) if stats.elapsed else 0  # MB/s
+
+        self.log(f"Обработано {stats.bytes_total / (1024*1024):.2f} MB за {stats.elapsed:.2f} секунд")
         self.log(f"Средняя скорость: {speed:.2f} MB/s")
+        self.log(f"Этапы: файлов {stats.files_total}, совпадений по размеру {stats.size_candidates}, "
+                 f"по выборке {stats.sample_candidates}, полный хеш {stats.full_candidates}")
+        if stats.hardlinks:
+            self.log(f"Жёстких ссылок на уже учтённые файлы: {stats.hardlinks} (не хешировались)")
+        self.log(f"Прочитано {self.format_size(stats.bytes_read)}, "
+                 f"не пришлось читать {self.format_size(stats.bytes_avoided)}")
 
-        duplicates = {k: v for k, v in duplicates.items() if len(v) > 1}
         if duplicates:
             self.show_duplicates(duplicates)
         else:
             self.log("Дубликаты не найдены")
 
-    def process_file(self, path):
-        file_hash = self.hash_file(path)
-        file_size = os.path.getsize(path)
-        return file_hash, path, file_size
+    def find_similar_images(self, path=None):
+        if path is None:
+            path = filedialog.askdirectory(title="Выберите директорию для поиска похожих изображений")
+        if not path:
+            return
+
+        self.log(f"Начало поиска похожих изображений в {path}")
+        with self.report.operation("find_similar_images", root=path) as op, HashCache() as cache, \
+                self.controller.start("Поиск похожих изображений") as task:
+            groups, stats = similar.find_similar_images(
+                path, stop_flag=task, progress=task, cache=cache,
+                on_error=lambda file_path, e: self.report.add(f"Ошибка при чтении {file_path}: {str(e)}",
+                                                              kind="error"))
+            op.fields.update(files_touched=stats.images, groups=stats.groups)
+        self.log_cache_stats(cache)
+        self.log(f"Изображений: {stats.images}, из кеша: {stats.cached}, ошибок: {stats.errors}, "
+                 f"за {stats.elapsed:.2f} секунд")
+        if groups:
+            self.log(f"Групп похожих изображений: {stats.groups}, файлов в них: {stats.similar_files}")
+            self.show_similar_images(groups)
+        else:
+            self.log("Похожие изображения не найдены")
+
+    def query_live_index(self, request):
+        # None — если живой индекс не запущен или не может ответить на этот запрос
+        try:
+            return liveindex.query(request, timeout=5)
+        except RuntimeError:
+            return None
 
-    def hash_file(self, path):
-        h = hashlib.sha1()
-        with open(path, 'rb') as file:
-            while chunk := file.read(1024 * 1024):  # Read 1MB at a time
-                h.update(chunk)
-        return h.hexdigest()
+    def log_cache_stats(self, cache):
+        stats = cache.stats()
+        self.log(f"Кеш хешей: попаданий {stats['hits']}, промахов {stats['misses']}, "
+                 f"устарело {stats['invalidated']}, вытеснено {stats['evicted']}")
 
     def show_duplicates(self, duplicates):
         dup_window = ctk.CTkToplevel()
         dup_window.title("Найденные дубликаты")
-        dup_window.geometry("500x400")
-
-        listbox = ctk.CTkTextbox(dup_window)
-        listbox.pack(fill="both", expand=True, padx=10, pady=10)
-
-        for files in duplicates.values():
-            listbox.insert("end", "Группа дубликатов:\n")
-            for file in files:
-                listbox.insert("end", f"{file}\n")
-            listbox.insert("end", "\n")
-
-        delete_button = ctk.CTkButton(dup_window, text="Удалить выбранные", 
-                                      command=lambda: self.delete_selected_duplicates(listbox, duplicates))
-        delete_button.pack(pady=10)
-
-    def delete_selected_duplicates(self, listbox, duplicates):
-        selected = listbox.selection_get().split("\n")
-        to_delete = [file for file in selected if os.path.isfile(file)]
-
+        dup_window.geometry("800x500")
+
+        # Строка на файл; группы нумеруются по убыванию размера
+        model = RowModel(["group", "size", "path"], key="path")
+        for group, ((size, _), files) in enumerate(sorted(duplicates.items(), key=lambda item: item[0][0], reverse=True)):
+            model.extend((group, size, file) for file in files)
+        view = VirtualList(dup_window, model,
+                           lambda row_id, row: f"#{row[0] + 1}  {self.format_size(row[1])} - {row[2]}",
+                           sort_columns=[("Размер", "size", True), ("Путь", "path", False), ("Группа", "group", False)],
+                           filter_columns=["path"])
+        view.pack(fill="both", expand=True, padx=10, pady=10)
+
+        buttons = ctk.CTkFrame(dup_window)
+        buttons.pack(pady=10)
+        select_button = ctk.CTkButton(buttons, text="Отметить копии", command=lambda: self.select_copies(view))
+        select_button.pack(side="left", padx=5)
+        delete_button = ctk.CTkButton(buttons, text="Удалить выбранные", 
+                                      command=lambda: self.delete_selected_duplicates(view))
+        delete_button.pack(side="left", padx=5)
+        link_button = ctk.CTkButton(buttons, text="Заменить жёсткими ссылками",
+                                    command=lambda: self.replace_duplicates(duplicates, dedupe.HARDLINK))
+        link_button.pack(side="left", padx=5)
+        clone_button = ctk.CTkButton(buttons, text="Заменить клонами (reflink)",
+                                     command=lambda: self.replace_duplicates(duplicates, dedupe.REFLINK))
+        clone_button.pack(side="left", padx=5)
+
+    def show_similar_images(self, groups):
+        similar_window = ctk.CTkToplevel()
+        similar_window.title("Похожие изображения")
+        similar_window.geometry("800x500")
+
+        # Содержимое файлов в группе разное, поэтому только удаление, без замены ссылками;
+        # первым в группе идёт самый большой файл — обычно это исходник
+        model = RowModel(["group", "size", "path"], key="path")
+        for group, files in enumerate(groups):
+            model.extend((group, size, path) for path, size in files)
+        view = VirtualList(similar_window, model,
+                           lambda row_id, row: f"#{row[0] + 1}  {self.format_size(row[1])} - {row[2]}",
+                           sort_columns=[("Группа", "group", False), ("Размер", "size", True), ("Путь", "path", False)],
+                           filter_columns=["path"])
+        view.pack(fill="both", expand=True, padx=10, pady=10)
+
+        buttons = ctk.CTkFrame(similar_window)
+        buttons.pack(pady=10)
+        select_button = ctk.CTkButton(buttons, text="Отметить копии", command=lambda: self.select_copies(view))
+        select_button.pack(side="left", padx=5)
+        delete_button = ctk.CTkButton(buttons, text="Удалить выбранные",
+                                      command=lambda: self.delete_selected_duplicates(view))
+        delete_button.pack(side="left", padx=5)
+
+    def select_copies(self, view):
+        # Отмечаем всё, кроме первого файла каждой группы
+        model = view.model
+        seen = set()
+        copies = []
+        for row_id in sorted(model.ids()):
+            group = model.value(row_id, "group")
+            if group in seen:
+                copies.append(row_id)
+            seen.add(group)
+        model.select(copies)
+        view.refresh()
+
+    def delete_selected_duplicates(self, view):
+        model = view.model
+        to_delete = [(row[model.column("path")], row[model.column("size")]) for _, row in model.selected_rows()]
+        if not to_delete:
+            return
         if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить {len(to_delete)} файлов?"):
-            with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-                futures = [executor.submit(self.delete_file, file) for file in to_delete]
-                concurrent.futures.wait(futures)
-            self.log(f"Удалено {len(to_delete)} файлов")
-
-    def analyze_disk_space(self):
-        path = filedialog.askdirectory(title="Выберите директорию для анализа")
+            threading.Thread(target=self.run_delete, args=(view, "delete_duplicates", to_delete)).start()
+
+    def run_delete(self, view, operation, to_delete, on_deleted=None):
+        # Удаление идёт в фоне через общий Deleter; строки убираются из списка в потоке GUI по пути:
+        # пока идёт сканирование, render перезаписывает строки и их id меняются
+        with self.report.operation(operation) as op, self.controller.start("Удаление файлов") as task:
+            deleter = self.make_deleter(task)
+            deleted = deleter.delete(to_delete, on_deleted=on_deleted,
+                                     on_error=lambda path, e: self.report.add(f"Ошибка при удалении {path}: {str(e)}",
+                                                                              kind="error"))
+            op.fields.update(files_touched=deleter.result.files, bytes_freed=deleter.result.bytes_freed,
+                             failures=deleter.result.failures)
+        self.log(f"Удаление завершено: {deleter.result.summary()}")
+
+        def update():
+            view.model.remove_keys(deleted)
+            view.refresh()
+
+        view.after(0, update)
+
+    def replace_duplicates(self, duplicates, method):
+        # Пути сохраняются: в каждой группе первый файл остаётся, остальные становятся ссылками на него
+        count = sum(len(files) - 1 for files in duplicates.values())
+        if not messagebox.askyesno("Подтверждение", f"Заменить {count} копий ссылками на первый файл группы?"):
+            return
+        threading.Thread(target=self.run_dedupe, args=(list(duplicates.values()), method)).start()
+
+    def run_dedupe(self, groups, method):
+        with self.report.operation("replace_duplicates", method=method) as op, \
+                self.controller.start("Замена дубликатов ссылками") as task:
+            stats = dedupe.dedupe_groups(groups, method, stop_flag=task, progress=task,
+                                         on_error=lambda path, e: self.log(f"Ошибка при замене {path}: {str(e)}"))
+            op.fields.update(files_touched=stats.files, bytes_freed=stats.bytes_saved)
+        self.log(f"Заменено файлов: {stats.files}, освобождено {self.format_size(stats.bytes_saved)}, "
+                 f"изменились после поиска: {stats.changed}, ошибок: {stats.errors}")
+
+    def analyze_disk_space(self, path=None):
+        if path is None:
+            path = filedialog.askdirectory(title="Выберите директорию для анализа")
         if not path:
             return
 
-        self.log(f"Начало анализа дискового пространства в {path}")
-        total_size = 0
-        file_sizes = {}
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            futures = []
-            for dirpath, _, filenames in os.walk(path):
-                for filename in filenames:
-                    if self.stop_flag.is_set():
-                        break
-                    full_path = os.path.join(dirpath, filename)
-                    futures.append(executor.submit(self.get_file_size, full_path))
-            
-            for future in concurrent.futures.as_completed(futures):
-                if self.stop_flag.is_set():
-                    break
-                path, size = future.result()
-                total_size += size
-                file_sizes[path] = size
-
-        self.show_disk_analysis(total_size, file_sizes)
-
-    def get_file_size(self, path):
-        try:
-            size = os.path.getsize(path)
-            return path, size
-        except Exception as e:
-            self.log(f"Ошибка при получении размера файла {path}: {str(e)}")
-            return path, 0
-
-    def show_disk_analysis(self, total_size, file_sizes):
+        rescan = self.rescan
+        self.log(f"Начало {'полного ' if rescan else ''}анализа дискового пространства в {path}")
+        usage = DiskUsage(path)
+        done = threading.Event()
+        self.show_disk_analysis(usage, done)
+        with self.report.operation("analyze_disk_space", root=path) as op, \
+                self.controller.start("Анализ диска") as task:
+            analyze_disk(path, usage=usage, stop_flag=task, progress=task, on_error=self.log_walk_error,
+                         incremental=True, rescan=rescan)
+            op.fields.update(files_touched=usage.files, total_size=usage.total_size)
+        done.set()
+        self.log(f"Анализ завершен: {usage.files} файлов, {self.format_size(usage.total_size)}")
+        if usage.walk_stats.reused_dirs:
+            self.log(f"Без изменений с прошлого анализа: {usage.walk_stats.reused_dirs} папок, "
+                     f"перечитано: {usage.walk_stats.dirs}")
+
+    def log_walk_error(self, path, e):
+        self.log(f"Ошибка при чтении {path}: {str(e)}")
+
+    def refresh_live(self, widget, top, done, render, interval=500):
+        # Перерисовываем результаты, пока идёт сканирование, и один раз после его окончания
+        last_version = [-1]
+
+        def tick():
+            finished = done.is_set()
+            if top.version != last_version[0] or finished:
+                last_version[0] = top.version
+                render()
+            if not finished:
+                widget.after(interval, tick)
+
+        widget.after(0, tick)
+
+    def show_disk_analysis(self, usage, done):
         analysis_window = ctk.CTkToplevel()
         analysis_window.title("Анализ дискового пространства")
-        analysis_window.geometry("500x400")
-
-        ctk.CTkLabel(analysis_window, text=f"Общий размер: {self.format_size(total_size)}").pack(pady=10)
-
-        listbox = ctk.CTkTextbox(analysis_window)
-        listbox.pack(fill="both", expand=True, padx=10, pady=10)
+        analysis_window.geometry("800x550")
+
+        total_label = ctk.CTkLabel(analysis_window, text=f"Общий размер: {self.format_size(usage.total_size)}")
+        total_label.pack(pady=10)
+
+        tabview = ctk.CTkTabview(analysis_window)
+        tabview.pack(fill="both", expand=True, padx=10, pady=10)
+        files_tab = tabview.add("Файлы")
+        dirs_tab = tabview.add("Крупнейшие папки")
+        browse_tab = tabview.add("Обзор папок")
+
+        def format_entry(row_id, row):
+            return f"{self.format_size(row[1])} - {row[0]}"
+
+        sort_columns = [("Размер", "size", True), ("Путь", "path", False)]
+        files_model = RowModel(["path", "size"], key="path")
+        files_view = VirtualList(files_tab, files_model, format_entry, sort_columns, filter_columns=["path"])
+        files_view.pack(fill="both", expand=True)
+
+        dirs_model = RowModel(["path", "size", "files"], key="path")
+        dirs_view = VirtualList(dirs_tab, dirs_model, format_entry, sort_columns, filter_columns=["path"],
+                                on_activate=lambda row_id: open_dir(dirs_model, row_id))
+        dirs_view.pack(fill="both", expand=True)
+
+        current_label = ctk.CTkLabel(browse_tab, text="", anchor="w")
+        current_label.pack(fill="x")
+        # Строка с path=None — файлы, лежащие прямо в папке
+        browse_model = RowModel(["path", "size", "files"])
+        browse_view = VirtualList(
+            browse_tab, browse_model,
+            lambda row_id, row: format_entry(row_id, row) if row[0] is not None
+            else f"{self.format_size(row[1])} - (файлы в папке: {row[2]})",
+            sort_columns, filter_columns=["path"], on_activate=lambda row_id: open_dir(browse_model, row_id))
+        browse_view.pack(fill="both", expand=True)
+        current = [usage.tree.root.path]
+
+        def show_dir(path):
+            node = usage.tree.node(path)
+            if node is None:
+                return
+            current[0] = node.path
+            current_label.configure(text=f"{node.path} - {self.format_size(node.total_size)}, "
+                                         f"файлов: {node.total_files}")
+            rows = [(child.path, child.total_size, child.total_files) for child in usage.tree.children(node.path)]
+            if node.own_files:
+                rows.append((None, node.own_size, node.own_files))
+            browse_model.set_rows(rows)
+            browse_view.scroll_to(0)
+
+        def open_dir(model, row_id):
+            path = model.value(row_id, "path")
+            if path is not None:
+                show_dir(path)
+                tabview.set("Обзор папок")
+
+        def open_selected():
+            for row_id, row in browse_model.selected_rows():
+                open_dir(browse_model, row_id)
+                break
 
-        for path, size in sorted(file_sizes.items(), key=lambda x: x[1], reverse=True)[:100]:
-            listbox.insert("end", f"{self.format_size(size)} - {path}\n")
+        def go_up():
+            node = usage.tree.node(current[0])
+            if node is not None and node.parent is not None:
+                show_dir(node.parent.path)
+
+        browse_buttons = ctk.CTkFrame(browse_tab)
+        browse_buttons.pack(fill="x", pady=(10, 0))
+        ctk.CTkButton(browse_buttons, text="Открыть выбранную", command=open_selected).pack(side="left", padx=5)
+        ctk.CTkButton(browse_buttons, text="Вверх", command=go_up).pack(side="left", padx=5)
+
+        def render():
+            total_label.configure(text=f"Общий размер: {self.format_size(usage.total_size)}")
+            files_model.set_rows(usage.top_files.items())
+            files_view.refresh()
+            if done.is_set():
+                # Размеры папок известны только после окончания сканирования
+                dirs_model.set_rows((node.path, node.total_size, node.total_files)
+                                    for node in usage.tree.top_dirs(1000))
+                dirs_view.refresh()
+                show_dir(current[0])
+
+        self.refresh_live(files_view, usage.top_files, done, render)
 
     def format_size(self, size):
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size < 1024.0:
-                return f"{size:.2f} {unit}"
-            size /= 1024.0
+        return format_size(size)
 
     def analyze_installed_programs(self):
         self.log("Анализ установленных программ...")
+        if self.inventory is None:
+            self.log("Список программ доступен только в Windows (или в поддельном реестре PCCLEANER_INVENTORY)")
+            return
         programs = self.get_installed_programs()
         self.show_installed_programs(programs)
 
     def get_installed_programs(self):
-        programs = []
-        for hive in [winreg.HKEY_LOCAL_MACHINE, winreg.HKEY_CURRENT_USER]:
-            key_path = r"Software\Microsoft\Windows\CurrentVersion\Uninstall"
-            try:
-                key = winreg.OpenKey(hive, key_path)
-                for i in range(winreg.QueryInfoKey(key)[0]):
-                    try:
-                        subkey_name = winreg.EnumKey(key, i)
-                        subkey = winreg.OpenKey(key, subkey_name)
-                        display_name = winreg.QueryValueEx(subkey, "DisplayName")[0]
-                        uninstall_string = winreg.QueryValueEx(subkey, "UninstallString")[0]
-                        programs.append((display_name, uninstall_string))
-                    except WindowsError:
-                        continue
-            except WindowsError:
-                continue
+        # Повторные вызовы перечитывают только разделы реестра, изменившиеся с прошлого раза
+        programs = self.inventory.programs()
+        stats = self.inventory.stats
+        self.log(f"Программ: {len(programs)}, перечитано разделов: {stats.keys_read} из {stats.keys}, "
+                 f"за {stats.elapsed:.2f} секунд")
+        self.save_inventory()
         return programs
 
+    def save_inventory(self):
+        try:
+            self.inventory.save()
+        except OSError as e:
+            self.log(f"Не удалось сохранить кеш программ: {str(e)}")
+
     def show_installed_programs(self, programs):
         programs_window = ctk.CTkToplevel()
         programs_window.title("Установленные программы")
@@ -430,8 +678,8 @@ class PCCleaner:
         listbox = ctk.CTkTextbox(programs_window)
         listbox.pack(fill="both", expand=True, padx=10, pady=10)
 
-        for program, _ in sorted(programs):
-            listbox.insert("end", f"{program}\n")
+        for program in programs:
+            listbox.insert("end", f"{program.name}\n")
 
         uninstall_button = ctk.CTkButton(programs_window, text="Удалить выбранную программу", 
                                          command=lambda: self.uninstall_program(listbox, programs))
@@ -439,78 +687,92 @@ class PCCleaner:
 
     def uninstall_program(self, listbox, programs):
         selected = listbox.selection_get().split("\n")[0]
-        for program_name, uninstall_string in programs:
-            if program_name == selected:
-                if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить {program_name}?"):
+        for program in programs:
+            if program.name == selected:
+                if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить {program.name}?"):
                     try:
-                        subprocess.run(uninstall_string, shell=True, check=True)
-                        self.log(f"Программа {program_name} успешно удалена")
-                    except subprocess.CalledProcessError:
-                        self.log(f"Ошибка при удалении программы {program_name}")
+                        if self.inventory.uninstall(program):
+                            self.log(f"Программа {program.name} успешно удалена")
+                        else:
+                            self.log(f"Программа {program.name} всё ещё в списке установленных")
+                    except (subprocess.CalledProcessError, OSError):
+                        self.log(f"Ошибка при удалении программы {program.name}")
+                    # Список обновляется из кеша: перечитан только раздел удалённой программы
+                    programs[:] = self.inventory.cached_programs()
+                    self.save_inventory()
+                    listbox.delete("1.0", "end")
+                    for item in programs:
+                        listbox.insert("end", f"{item.name}\n")
                 break
 
     def export_report(self):
-        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
+        file_path = filedialog.asksaveasfilename(defaultextension=".ndjson",
+                                                 filetypes=[("NDJSON", "*.ndjson"), ("NDJSON gzip", "*.ndjson.gz")])
         if file_path:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.report_data, f, ensure_ascii=False, indent=4)
-            self.log(f"Отчет экспортирован в {file_path}")
+            count = self.report.export_ndjson(file_path)
+            self.log(f"Отчет экспортирован в {file_path} (событий: {count}, вытеснено: {self.report.dropped})")
 
-    def analyze_large_files(self):
-        path = filedialog.askdirectory(title="Выберите директорию для анализа больших файлов")
+    def analyze_large_files(self, path=None, k=TOP_FILES, min_size=LARGE_FILE_SIZE):
+        if path is None:
+            path = filedialog.askdirectory(title="Выберите директорию для анализа больших файлов")
         if not path:
             return
 
         self.log(f"Анализ больших файлов в {path}")
-        large_files = []
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            for root, _, files in os.walk(path):
-                if self.stop_flag.is_set():
-                    break
-                futures = [executor.submit(self.get_file_size, os.path.join(root, file)) for file in files]
-                for future in concurrent.futures.as_completed(futures):
-                    if self.stop_flag.is_set():
-                        break
-                    file_path, size = future.result()
-                    if size > 100 * 1024 * 1024:  # файлы больше 100 МБ
-                        large_files.append((file_path, size))
-
-        large_files.sort(key=lambda x: x[1], reverse=True)
-        self.show_large_files(large_files[:100])  # показываем топ-100 больших файлов
-
-    def show_large_files(self, large_files):
+        top = TopK(k, min_size)
+        done = threading.Event()
+        self.show_large_files(top, done)
+        indexed = self.query_live_index({"query": "large", "path": os.path.abspath(path), "limit": k,
+                                         "min_size": min_size})
+        if indexed is not None:
+            # Папку уже держит в памяти живой индекс (pccleaner daemon): ответ без обхода диска
+            top.push_many((item["path"], item["size"]) for item in indexed)
+            done.set()
+            self.log(f"Найдено больших файлов: {len(top)} (из живого индекса)")
+            return
+        with self.report.operation("analyze_large_files", root=path, min_size=min_size) as op, \
+                self.controller.start("Поиск больших файлов") as task:
+            find_large_files(path, top=top, stop_flag=task, progress=task, on_error=self.log_walk_error)
+            op.fields.update(files_touched=len(top))
+        done.set()
+        self.log(f"Найдено больших файлов: {len(top)}")
+
+    def show_large_files(self, top, done):
         large_files_window = ctk.CTkToplevel()
         large_files_window.title("Большие файлы")
-        large_files_window.geometry("600x400")
+        large_files_window.geometry("700x450")
 
-        listbox = ctk.CTkTextbox(large_files_window)
-        listbox.pack(fill="both", expand=True, padx=10, pady=10)
+        model = RowModel(["path", "size"], key="path")
+        view = VirtualList(large_files_window, model, lambda row_id, row: f"{self.format_size(row[1])} - {row[0]}",
+                           sort_columns=[("Размер", "size", True), ("Путь", "path", False)], filter_columns=["path"])
+        view.pack(fill="both", expand=True, padx=10, pady=10)
+        deleted = set()
+
+        def render():
+            # Удалённые во время сканирования файлы остаются в TopK, скрываем их здесь
+            model.set_rows((path, size) for path, size in top.items() if path not in deleted)
+            view.refresh()
 
-        for file_path, size in large_files:
-            listbox.insert("end", f"{self.format_size(size)} - {file_path}\n")
+        self.refresh_live(view, top, done, render)
 
-        delete_button = ctk.CTkButton(large_files_window, text="Удалить выбранный файл", 
-                                      command=lambda: self.delete_large_file(listbox, large_files))
+        delete_button = ctk.CTkButton(large_files_window, text="Удалить выбранные файлы", 
+                                      command=lambda: self.delete_large_file(view, deleted))
         delete_button.pack(pady=10)
 
-    def delete_large_file(self, listbox, large_files):
-        selected = listbox.selection_get().split("\n")[0]
-        selected_size, selected_name = selected.split(" - ")
-        for file_path, size in large_files:
-            if os.path.basename(file_path) == selected_name and self.format_size(size) == selected_size:
-                if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить файл {selected_name}?"):
-                    try:
-                        os.remove(file_path)
-                        self.log(f"Файл {selected_name} успешно удален")
-                        listbox.delete("1.0", "end")
-                        for f_path, f_size in large_files:
-                            if f_path != file_path:
-                                f_name = os.path.basename(f_path)
-                                listbox.insert("end", f"{self.format_size(f_size)} - {f_name}\n")
-                    except Exception as e:
-                        self.log(f"Ошибка при удалении файла {selected_name}: {str(e)}")
-                    break
+    def delete_large_file(self, view, deleted):
+        # Выделение хранится по id строк модели, путь берём из неё целиком, а не из текста списка
+        model = view.model
+        selected = model.selected_rows()
+        if not selected:
+            return
+        names = ", ".join(os.path.basename(row[0]) for _, row in selected[:3])
+        if len(selected) > 3:
+            names += f" и ещё {len(selected) - 3}"
+        if not messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить: {names}?"):
+            return
+        to_delete = [(file_path, size) for _, (file_path, size) in selected]
+        threading.Thread(target=self.run_delete, args=(view, "delete_large_file", to_delete),
+                         kwargs={"on_deleted": lambda path, size: deleted.add(path)}).start()
 
     def clean_and_optimize(self):
         self.clean_temp_files()
@@ -518,8 +780,9 @@ class PCCleaner:
         self.log("Очистка и оптимизация завершены")
 
     def stop_operations(self):
-        self.stop_flag.set()
-        self.log("Операции остановлены пользователем")
+        # Отменяются только идущие операции, следующие запустятся как обычно
+        if self.controller.cancel_all():
+            self.log("Операции остановлены пользователем")
 
 class PCCleanerApp(ctk.CTk):
     def __init__(self):
@@ -533,7 +796,7 @@ class PCCleanerApp(ctk.CTk):
 
         self.sidebar_frame = ctk.CTkFrame(self, width=140, corner_radius=0)
         self.sidebar_frame.grid(row=0, column=0, rowspan=4, sticky="nsew")
-        self.sidebar_frame.grid_rowconfigure(8, weight=1)
+        self.sidebar_frame.grid_rowconfigure(12, weight=1)
 
         self.logo_label = ctk.CTkLabel(self.sidebar_frame, text="Cum Cleaner v0.1", font=ctk.CTkFont(size=20, weight="bold"))
         self.logo_label.grid(row=0, column=0, padx=20, pady=(20, 10))
@@ -559,11 +822,24 @@ class PCCleanerApp(ctk.CTk):
         self.sidebar_button_7 = ctk.CTkButton(self.sidebar_frame, text="Экспорт отчета", command=self.export_report)
         self.sidebar_button_7.grid(row=7, column=0, padx=20, pady=10)
 
+        self.sidebar_button_8 = ctk.CTkButton(self.sidebar_frame, text="Похожие изображения", command=self.find_similar_images)
+        self.sidebar_button_8.grid(row=8, column=0, padx=20, pady=10)
+
+        self.stop_button = ctk.CTkButton(self.sidebar_frame, text="Остановить", fg_color="firebrick",
+                                         command=self.stop_operations)
+        self.stop_button.grid(row=9, column=0, padx=20, pady=10)
+
+        self.trash_switch = ctk.CTkSwitch(self.sidebar_frame, text="Удалять в корзину", command=self.toggle_trash)
+        self.trash_switch.grid(row=10, column=0, padx=20, pady=10)
+
+        self.rescan_switch = ctk.CTkSwitch(self.sidebar_frame, text="Полный анализ диска", command=self.toggle_rescan)
+        self.rescan_switch.grid(row=11, column=0, padx=20, pady=10)
+
         self.appearance_mode_label = ctk.CTkLabel(self.sidebar_frame, text="Appearance Mode:", anchor="w")
-        self.appearance_mode_label.grid(row=9, column=0, padx=20, pady=(10, 0))
+        self.appearance_mode_label.grid(row=13, column=0, padx=20, pady=(10, 0))
         self.appearance_mode_optionemenu = ctk.CTkOptionMenu(self.sidebar_frame, values=["Light", "Dark", "System"],
                                                                        command=self.change_appearance_mode_event)
-        self.appearance_mode_optionemenu.grid(row=10, column=0, padx=20, pady=(10, 10))
+        self.appearance_mode_optionemenu.grid(row=14, column=0, padx=20, pady=(10, 10))
 
         self.main_frame = ctk.CTkFrame(self, corner_radius=0)
         self.main_frame.grid(row=0, column=1, sticky="nsew")
@@ -574,14 +850,40 @@ class PCCleanerApp(ctk.CTk):
         self.log_label.grid(row=0, column=0, padx=20, pady=(20, 0), sticky="w")
 
         self.log_textbox = ctk.CTkTextbox(self.main_frame, width=200)
-        self.log_textbox.grid(row=1, column=0, padx=(20, 20), pady=(20, 20), sticky="nsew")
+        self.log_textbox.grid(row=1, column=0, padx=(20, 20), pady=(20, 0), sticky="nsew")
+
+        self.progress_label = ctk.CTkLabel(self.main_frame, text="", anchor="w", justify="left")
+        self.progress_label.grid(row=2, column=0, padx=20, pady=(5, 20), sticky="w")
 
-        self.cleaner = PCCleaner(self.log_textbox)
+        self.log_pipeline = LogPipeline()
+        self.log_pipeline.add_sink(TextboxLogSink(self.log_textbox))
+        self.cleaner = PCCleaner(self.log_pipeline)
+        self.pump_log()
+        self.poll_progress()
 
-        self.animated_gif = AnimatedGIF(self.sidebar_frame, "cat-girl.gif", size=(100, 100))
-        self.animated_gif.grid(row=11, column=0, padx=20, pady=20)
+        self.animated_gif = AnimatedGIF(self.sidebar_frame, "cat-girl.gif", size=(100, 100),
+                                        log_pipeline=self.log_pipeline)
+        self.animated_gif.grid(row=15, column=0, padx=20, pady=20)
         self.animated_gif.start()
 
+    def pump_log(self):
+        self.log_pipeline.pump()
+        self.after(100, self.pump_log)
+
+    def poll_progress(self):
+        self.progress_label.configure(text="\n".join(format_progress(progress)
+                                                     for progress in self.cleaner.controller.progress()))
+        self.after(500, self.poll_progress)
+
+    def stop_operations(self):
+        self.cleaner.stop_operations()
+
+    def toggle_trash(self):
+        self.cleaner.delete_settings["trash"] = bool(self.trash_switch.get())
+
+    def toggle_rescan(self):
+        self.cleaner.rescan = bool(self.rescan_switch.get())
+
     def clean_and_optimize(self):
         threading.Thread(target=self.cleaner.clean_and_optimize).start()
 
@@ -591,6 +893,9 @@ class PCCleanerApp(ctk.CTk):
     def analyze_disk_space(self):
         threading.Thread(target=self.cleaner.analyze_disk_space).start()
 
+    def find_similar_images(self):
+        threading.Thread(target=self.cleaner.find_similar_images).start()
+
     def analyze_installed_programs(self):
         threading.Thread(target=self.cleaner.analyze_installed_programs).start()
 
@@ -607,5 +912,7 @@ class PCCleanerApp(ctk.CTk):
         ctk.set_appearance_mode(new_appearance_mode)
 
 if __name__ == "__main__":
+    ctk.set_appearance_mode("Dark")
+    ctk.set_default_color_theme("blue")
     app = PCCleanerApp()
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,5 @@
+import sys
+
+from pccleaner.cli import main
+
+sys.exit(main())
@@ -0,0 +1,142 @@
+import heapq
+from itertools import chain
+
+from pccleaner.devices import plan_devices
+from pccleaner.dirtree import DirTree
+from pccleaner.incremental import DiskSnapshot, SNAPSHOT_FILES
+from pccleaner.topk import TopK
+from pccleaner.walker import walk_batches, walk_roots, WalkStats
+
+LARGE_FILE_SIZE = 100 * 1024 * 1024  # файлы больше 100 МБ
+TOP_FILES = 100
+
+
+class DiskUsage:
+    def __init__(self, root, k=TOP_FILES):
+        self.root = root
+        self.total_size = 0
+        self.files = 0
+        self.top_files = TopK(k)
+        self.tree = DirTree(root)
+        self.walk_stats = WalkStats()
+
+
+class MultiRootUsage:
+    # Сводный результат по нескольким корням: у каждого корня своё дерево (DiskUsage), топ файлов общий
+    def __init__(self, roots, k=TOP_FILES, budgets=None):
+        self.devices, self.skipped = plan_devices(roots, budgets)
+        self.roots = [root for device in self.devices for root in device.roots]
+        self.usages = {root: DiskUsage(root, k) for root in self.roots}
+        self.top_files = TopK(k)
+        self.walk_stats = WalkStats()
+
+    @property
+    def total_size(self):
+        return sum(usage.total_size for usage in self.usages.values())
+
+    @property
+    def files(self):
+        return sum(usage.files for usage in self.usages.values())
+
+    def top_dirs(self, n=100):
+        return heapq.nlargest(n, chain.from_iterable(usage.tree.top_dirs(n) for usage in self.usages.values()),
+                              key=lambda node: node.total_size)
+
+
+def as_roots(root):
+    return [root] if isinstance(root, str) else list(root)
+
+
+def analyze_disk(root, k=TOP_FILES, usage=None, stop_flag=None, on_error=None, incremental=False, progress=None,
+                 rescan=False):
+    # usage можно передать заранее, чтобы GUI показывал промежуточные результаты.
+    # В режиме incremental неизменённые с прошлого анализа папки не перечитываются;
+    # rescan читает всё заново, но снимок для следующих анализов всё равно обновляет.
+    if usage is None:
+        usage = DiskUsage(root, k)
+    snapshot = DiskSnapshot.load(root) if incremental and not rescan else None
+    if snapshot is not None and progress is not None:
+        progress.set_total(*snapshot.totals())
+    reused = {}
+    nlinks = {}
+    failed = set()
+    candidates = TopK(SNAPSHOT_FILES)
+
+    def reuse_dir(path, st):
+        nlinks[path] = st.st_nlink
+        entry = snapshot.reusable(path, st) if snapshot is not None else None
+        if entry is None:
+            return None
+        _, _, own_size, own_files, children = entry
+        reused[path] = (own_size, own_files)
+        usage.total_size += own_size
+        usage.files += own_files
+        if progress is not None:
+            progress.add(own_files, own_size)
+        files = snapshot.files.get(path, ())
+        usage.top_files.push_many(files)
+        candidates.push_many(files)
+        return children
+
+    def walk_error(path, e):
+        failed.add(path)
+        if on_error:
+            on_error(path, e)
+
+    for batch in walk_batches(root, include_dirs=True, stop_flag=stop_flag, on_error=walk_error,
+                              stats=usage.walk_stats, reuse_dir=reuse_dir if incremental else None):
+        files = [record for record in batch if not record.is_dir]
+        usage.top_files.push_many((record.path, record.size) for record in files)
+        candidates.push_many((record.path, record.size) for record in files)
+        size = sum(record.size for record in files)
+        usage.total_size += size
+        usage.files += len(files)
+        usage.tree.add_records(batch)
+        if progress is not None:
+            progress.add(len(files), size)
+
+    for path, (own_size, own_files) in reused.items():
+        node = usage.tree.node(path)
+        node.own_size += own_size
+        node.own_files += own_files
+    usage.tree.rollup()
+
+    if incremental and not (stop_flag is not None and stop_flag.is_set()):
+        for path in failed:
+            # Папку, которую не удалось прочитать, в следующий раз читаем заново
+            nlinks[path] = -1
+        DiskSnapshot.save(usage, nlinks, candidates.items())
+    return usage
+
+
+def analyze_roots(roots, k=TOP_FILES, usage=None, stop_flag=None, on_error=None, progress=None, budgets=None):
+    # Несколько корней за одну операцию, каждое устройство читается своим пулом потоков (walk_roots)
+    if usage is None:
+        usage = MultiRootUsage(roots, k, budgets)
+    for root, batch in walk_roots(usage.roots, include_dirs=True, stop_flag=stop_flag, on_error=on_error,
+                                  stats=usage.walk_stats, devices=usage.devices):
+        part = usage.usages[root]
+        files = [(record.path, record.size) for record in batch if not record.is_dir]
+        part.top_files.push_many(files)
+        usage.top_files.push_many(files)
+        size = sum(size for _, size in files)
+        part.total_size += size
+        part.files += len(files)
+        part.tree.add_records(batch)
+        if progress is not None:
+            progress.add(len(files), size)
+    for part in usage.usages.values():
+        part.tree.rollup()
+    return usage
+
+
+def find_large_files(root, k=TOP_FILES, min_size=LARGE_FILE_SIZE, top=None, stop_flag=None, on_error=None,
+                     progress=None, budgets=None):
+    # root — папка или список папок
+    if top is None:
+        top = TopK(k, min_size)
+    for _, batch in walk_roots(as_roots(root), stop_flag=stop_flag, on_error=on_error, budgets=budgets):
+        top.push_many((record.path, record.size) for record in batch if record.size >= top.min_size)
+        if progress is not None:
+            progress.add(len(batch), sum(record.size for record in batch))
+    return top
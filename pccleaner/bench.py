@@ -0,0 +1,200 @@
+import os
+import time
+import random
+import shutil
+import tempfile
+import threading
+
+import psutil
+
+from pccleaner import duplicates, hashing, inventory
+from pccleaner.analysis import analyze_disk, find_large_files
+from pccleaner.devices import plan_devices, total_workers
+from pccleaner.tempclean import clean_folder
+from pccleaner.walker import walk_batches
+
+ENGINES = ["walk", "disk", "large", "hash", "dupes", "inventory", "clean-temp"]
+
+
+class TreeSpec:
+    def __init__(self, files=10000, depth=3, fanout=8, median_size=16 * 1024, max_size=8 * 1024 * 1024,
+                 dup_ratio=0.1, seed=42):
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.median_size = median_size
+        self.max_size = max_size
+        self.dup_ratio = dup_ratio
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def generate_tree(root, spec):
+    # Синтетическое дерево: размеры по логнормальному распределению вокруг median_size,
+    # доля dup_ratio файлов — побайтовые копии уже созданных файлов.
+    rng = random.Random(spec.seed)
+    dirs = [root]
+    level = [root]
+    for depth in range(spec.depth):
+        next_level = []
+        for parent in level:
+            for i in range(spec.fanout):
+                path = os.path.join(parent, f"d{depth}_{i}")
+                os.makedirs(path, exist_ok=True)
+                next_level.append(path)
+        dirs.extend(next_level)
+        level = next_level
+
+    originals = []
+    total = 0
+    for i in range(spec.files):
+        path = os.path.join(rng.choice(dirs), f"f{i}.bin")
+        if originals and rng.random() < spec.dup_ratio:
+            shutil.copyfile(rng.choice(originals), path)
+        else:
+            size = min(int(rng.lognormvariate(0, 1.5) * spec.median_size), spec.max_size)
+            with open(path, "wb") as f:
+                f.write(rng.randbytes(size))
+            originals.append(path)
+        total += os.path.getsize(path)
+    return spec.files, total
+
+
+class Measurement:
+    def __init__(self, name, wall, files, size, read_calls, write_calls, peak_rss, extra=None):
+        self.name = name
+        self.wall = wall
+        self.files = files
+        self.bytes = size
+        # None — движок не работает с деревом файлов, скорость по нему не имеет смысла
+        self.files_per_s = None if files is None else files / wall if wall else 0.0
+        self.bytes_per_s = None if size is None else size / wall if wall else 0.0
+        self.read_syscalls = read_calls
+        self.write_syscalls = write_calls
+        self.peak_rss = peak_rss
+        self.extra = extra or {}
+
+    def as_dict(self):
+        data = {key: value for key, value in vars(self).items() if key != "extra"}
+        data.update(self.extra)
+        return data
+
+
+class _RssSampler(threading.Thread):
+    def __init__(self, process, interval=0.01):
+        super().__init__(daemon=True)
+        self.process = process
+        self.interval = interval
+        self.peak = process.memory_info().rss
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        info = self.process.memory_info()
+        # На Windows система сама знает пиковый рабочий набор
+        return max(self.peak, info.rss, getattr(info, "peak_wset", 0))
+
+
+def _io_counts(process):
+    try:
+        counters = process.io_counters()
+    except (AttributeError, psutil.Error):  # macOS не отдаёт счётчики ввода-вывода
+        return None, None
+    return counters.read_count, counters.write_count
+
+
+def measure(name, func, files, size):
+    # func() возвращает словарь дополнительных метрик или None
+    process = psutil.Process()
+    sampler = _RssSampler(process)
+    reads_before, writes_before = _io_counts(process)
+    sampler.start()
+    start = time.perf_counter()
+    extra = func() or {}
+    wall = time.perf_counter() - start
+    peak = sampler.stop()
+    reads_after, writes_after = _io_counts(process)
+    reads = reads_after - reads_before if reads_before is not None else None
+    writes = writes_after - writes_before if writes_before is not None else None
+    return Measurement(name, wall, files, size, reads, writes, peak, extra)
+
+
+def run_benchmarks(spec, engines=None, workers=(None,), modes=(duplicates.THREAD,), root=None):
+    engines = engines or ENGINES
+    own_root = root is None
+    root = root or tempfile.mkdtemp(prefix="pccleaner-bench-")
+    results = []
+    try:
+        tree = os.path.join(root, "tree")
+        os.makedirs(tree, exist_ok=True)
+        files, size = generate_tree(tree, spec)
+
+        if "walk" in engines:
+            def walk():
+                count = sum(len(batch) for batch in walk_batches(tree))
+                return {"records": count}
+            results.append(measure("walk", walk, files, size))
+
+        if "disk" in engines:
+            results.append(measure("disk", lambda: {"dirs": len(analyze_disk(tree).tree)}, files, size))
+
+        if "large" in engines:
+            results.append(measure("large", lambda: {"found": len(find_large_files(tree, min_size=spec.median_size))},
+                                   files, size))
+
+        if "hash" in engines:
+            paths = [record.path for batch in walk_batches(tree) for record in batch]
+            for backend in hashing.BACKENDS:
+                for use_mmap in (False, True):
+                    def hash_all():
+                        for path in paths:
+                            hashing.hash_file(path, backend, use_mmap=use_mmap)
+                        return {"backend": backend, "mmap": use_mmap}
+                    results.append(measure("hash", hash_all, files, size))
+
+        if "dupes" in engines:
+            # Без явного числа исполнителей их задают бюджеты устройств (как в find_duplicates)
+            budget = total_workers(plan_devices([tree])[0])
+            for mode in modes:
+                for count in workers:
+                    def dupes():
+                        groups, stats = duplicates.find_duplicates(tree, max_workers=count, mode=mode)
+                        return {"mode": mode, "io_workers": count or budget,
+                                "cpu_workers": count or min(budget, os.cpu_count()), "groups": len(groups),
+                                "bytes_read": stats.bytes_read, "bytes_avoided": stats.bytes_avoided}
+                    results.append(measure("dupes", dupes, files, size))
+
+        if "inventory" in engines:
+            # Поддельный реестр на spec.files / 10 программ: холодный проход, повторный из кеша
+            # и обновление после удаления одной программы
+            fake = inventory.generate_fake_inventory(os.path.join(root, "inventory"), max(spec.files // 10, 1),
+                                                     seed=spec.seed)
+            inv = inventory.Inventory(inventory.FileProvider(fake))
+            for name in ("cold", "warm"):
+                def enumerate_programs():
+                    count = len(inv.programs())
+                    return {"pass": name, "programs": count, "keys_read": inv.stats.keys_read}
+                results.append(measure("inventory", enumerate_programs, None, None))
+
+            def uninstall_one():
+                inv.uninstall(inv.cached_programs()[0])
+                return {"pass": "uninstall", "programs": len(inv.cached_programs())}
+            results.append(measure("inventory", uninstall_one, None, None))
+
+        if "clean-temp" in engines:
+            # Удаление портит дерево, поэтому оно идёт последним
+            def clean():
+                stats = clean_folder(tree)
+                return {"deleted": stats.files + stats.dirs, "bytes_freed": stats.bytes_freed, "errors": stats.errors}
+            results.append(measure("clean-temp", clean, files, size))
+    finally:
+        if own_root:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
@@ -0,0 +1,454 @@
+import os
+import sys
+import json
+import argparse
+import threading
+
+from pccleaner import dedupe, duplicates, hashing, inventory, liveindex, similar
+from pccleaner.deleter import Deleter
+from pccleaner.analysis import analyze_disk, analyze_roots, find_large_files, LARGE_FILE_SIZE, TOP_FILES
+from pccleaner.devices import parse_budgets, plan_devices
+from pccleaner.hashcache import HashCache
+from pccleaner.logsink import LogPipeline, StreamSink, FileSink, NDJSONSink
+from pccleaner.progress import OperationController, format_progress
+from pccleaner.scanfile import ScanSnapshot, default_scan_path, diff_snapshots
+from pccleaner.tempclean import CleanupRules, clean_folder, load_rules, temp_folders
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+AGE_UNITS = {"S": 1, "M": 60, "H": 3600, "D": 86400, "W": 7 * 86400}
+
+log_pipeline = LogPipeline()
+controller = OperationController()
+
+
+def parse_size(text):
+    # "100M", "1.5G", "4096" -> байты
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ""
+    number = text[:-1] if unit else text
+    try:
+        return int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"неверный размер: {text}")
+
+
+def parse_age(text):
+    # "90", "30m", "12h", "7d" -> секунды
+    text = text.strip().upper()
+    unit = text[-1:] if text[-1:] in AGE_UNITS else "S"
+    number = text[:-1] if text[-1:] in AGE_UNITS else text
+    try:
+        return float(number) * AGE_UNITS[unit]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"неверный возраст: {text}")
+
+
+def parse_device_workers(text):
+    try:
+        return parse_budgets(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def root_field(roots):
+    # Один корень — строкой, как раньше; несколько — списком
+    return roots[0] if len(roots) == 1 else roots
+
+
+def device_items(devices):
+    return [{"dev": device.dev, "kind": device.kind, "workers": device.workers, "roots": device.roots}
+            for device in devices]
+
+
+def report_error(path, e):
+    log_pipeline.emit(f"{path}: {e}", level="error")
+
+
+def emit(args, summary, key, item_type, items):
+    # json: один документ со списком в key; ndjson: по строке на элемент и итоговая строка.
+    # Итоговые поля в обоих форматах одинаковы, поэтому key не должен совпадать ни с одним из них
+    if key in summary:
+        raise ValueError(f"ключ списка {key} совпадает с полем итога")
+    out = sys.stdout
+    if args.format == "ndjson":
+        for item in items:
+            out.write(json.dumps({"type": item_type, **item}, ensure_ascii=False) + "\n")
+        out.write(json.dumps({"type": "summary", **summary}, ensure_ascii=False) + "\n")
+    else:
+        json.dump({**summary, key: list(items)}, out, ensure_ascii=False, indent=4)
+        out.write("\n")
+
+
+def make_deleter(args, task, progress=True):
+    # progress=False — прогресс уже считает вызывающий (clean_folder учитывает просмотренные файлы)
+    return Deleter(args.delete_workers, ops_per_s=args.max_iops, bytes_per_s=args.max_rate, trash=args.trash,
+                   stop_flag=task, progress=task if progress else None)
+
+
+def add_delete_options(parser):
+    parser.add_argument("--delete-workers", type=int, help="сколько файлов удалять параллельно")
+    parser.add_argument("--max-iops", type=float, help="не больше стольких удалений в секунду")
+    parser.add_argument("--max-rate", type=parse_size, help="не больше стольких байт в секунду, например 200M")
+    parser.add_argument("--trash", action="store_true", help="перемещать в корзину вместо удаления")
+
+
+def report_progress(interval, stopped):
+    # Раз в interval секунд пишем прогресс идущих операций в лог (stderr)
+    while not stopped.wait(interval):
+        for progress in controller.progress():
+            log_pipeline.emit(format_progress(progress), level="progress")
+
+
+def cmd_scan(args):
+    if args.incremental:
+        if len(args.root) > 1:
+            raise SystemExit("--incremental работает только с одной папкой")
+        with controller.start("scan") as task:
+            usage = analyze_disk(args.root[0], k=args.top, on_error=report_error, incremental=True,
+                                 rescan=args.rescan, stop_flag=task, progress=task)
+        root, dirs, top_dirs, extra = usage.tree.root.path, len(usage.tree), usage.tree.top_dirs(args.dirs), {}
+    else:
+        # Корни на разных устройствах читаются одновременно, каждое устройство — своим числом потоков
+        with controller.start("scan") as task:
+            usage = analyze_roots(args.root, k=args.top, on_error=report_error, stop_flag=task, progress=task,
+                                  budgets=args.device_workers)
+        root = root_field(usage.roots)
+        dirs = sum(len(part.tree) for part in usage.usages.values())
+        top_dirs = usage.top_dirs(args.dirs)
+        extra = {"devices": device_items(usage.devices), "skipped_roots": usage.skipped}
+    summary = {
+        "root": root,
+        "total_size": usage.total_size,
+        "files": usage.files,
+        "dirs": dirs,
+        "reused_dirs": usage.walk_stats.reused_dirs,
+        "top_dirs": [{"path": node.path, "size": node.total_size, "files": node.total_files} for node in top_dirs],
+        **extra,
+    }
+    emit(args, summary, "top_files", "file",
+         ({"path": path, "size": size} for path, size in usage.top_files.items()))
+
+
+def cmd_large(args):
+    with controller.start("large") as task:
+        top = find_large_files(args.root, k=args.top, min_size=args.min_size, on_error=report_error,
+                               stop_flag=task, progress=task, budgets=args.device_workers)
+    summary = {"root": root_field(args.root), "min_size": args.min_size, "count": len(top)}
+    emit(args, summary, "top_files", "file", ({"path": path, "size": size} for path, size in top.items()))
+
+
+def cmd_dupes(args):
+    options = dict(max_workers=args.workers, on_error=report_error,
+                   sample_backend=args.sample_hash, confirm=args.confirm,
+                   mode=args.mode, io_workers=args.io_workers, cpu_workers=args.cpu_workers,
+                   budgets=args.device_workers, min_size=args.min_size)
+    with controller.start("dupes") as task:
+        options.update(stop_flag=task, progress=task)
+        if args.no_cache:
+            groups, stats = duplicates.find_duplicates(args.root, **options)
+        else:
+            with HashCache() as cache:
+                groups, stats = duplicates.find_duplicates(args.root, cache=cache, **options)
+            log_pipeline.emit(f"кеш хешей: {cache.stats()}")
+    summary = {"root": root_field(args.root), **stats.as_dict()}
+    if args.replace:
+        # В каждой группе остаётся первый по алфавиту путь, остальные становятся ссылками на него
+        with controller.start(f"dupes --replace {args.replace}") as task:
+            replaced = dedupe.dedupe_groups([sorted(paths) for paths in groups.values()], args.replace,
+                                            stop_flag=task, on_error=report_error, progress=task)
+        summary["replaced"] = replaced.as_dict()
+    elif args.delete:
+        with controller.start("dupes --delete") as task:
+            deleter = make_deleter(args, task)
+            deleter.delete_paths((path for paths in groups.values() for path in sorted(paths)[1:]),
+                                 on_error=report_error)
+        summary["deleted"] = deleter.result.as_dict()
+    items = ({"size": size, "digest": digest, "paths": sorted(paths)}
+             for (size, digest), paths in sorted(groups.items(), key=lambda item: item[0][0], reverse=True))
+    emit(args, summary, "items", "group", items)
+
+
+def cmd_similar(args):
+    options = dict(algorithm=args.algorithm, threshold=args.threshold, max_workers=args.workers, mode=args.mode,
+                   on_error=report_error, budgets=args.device_workers)
+    with controller.start("similar") as task:
+        options.update(stop_flag=task, progress=task)
+        if args.no_cache:
+            groups, stats = similar.find_similar_images(args.root, **options)
+        else:
+            with HashCache() as cache:
+                groups, stats = similar.find_similar_images(args.root, cache=cache, **options)
+    summary = {"root": root_field(args.root), "algorithm": args.algorithm, "threshold": args.threshold, **stats.as_dict()}
+    emit(args, summary, "items", "group",
+         ({"files": [{"path": path, "size": size} for path, size in items]} for items in groups))
+
+
+def cmd_devices(args):
+    devices, skipped = plan_devices(args.root, args.device_workers)
+    emit(args, {"skipped_roots": skipped}, "devices", "device", device_items(devices))
+
+
+def cmd_clean_temp(args):
+    if args.rules:
+        targets = load_rules(args.rules)
+    else:
+        rules = CleanupRules(min_age=args.min_age, include=args.include, exclude=args.exclude,
+                             min_size=args.min_size, max_size=args.max_size, max_total=args.max_total,
+                             skip_in_use=not args.ignore_in_use)
+        targets = [(folder, rules) for folder in args.folders or temp_folders()]
+        if not targets:
+            raise SystemExit("TEMP и TMP не заданы: укажите папки явно")
+    results = []
+    with controller.start("clean-temp") as task:
+        deleter = make_deleter(args, task, progress=False)
+        for folder, rules in targets:
+            stats = clean_folder(folder, rules, dry_run=args.dry_run, on_error=report_error,
+                                 stop_flag=task, progress=task, deleter=deleter)
+            results.append({"folder": folder, "rules": rules.as_dict(), **stats.as_dict()})
+    summary = {
+        "dry_run": args.dry_run,
+        "files": sum(item["files"] for item in results),
+        "bytes_freed": sum(item["bytes_freed"] for item in results),
+        "reclaimable": sum(item["reclaimable"] for item in results),
+        "trash": args.trash,
+        "failures": deleter.result.failures,
+    }
+    emit(args, summary, "folders", "folder", results)
+
+
+def cmd_snapshot(args):
+    path = args.output or default_scan_path(args.root)
+    with controller.start("snapshot") as task:
+        if args.hashes:
+            with HashCache() as cache:
+                snapshot = ScanSnapshot.from_walk(args.root, stop_flag=task, on_error=report_error, progress=task,
+                                                  cache=cache)
+        else:
+            snapshot = ScanSnapshot.from_walk(args.root, stop_flag=task, on_error=report_error, progress=task)
+    snapshot.save(path)
+    summary = {"path": path, "root": snapshot.root, "files": len(snapshot), "dirs": len(snapshot.dir_names),
+               "total_size": snapshot.total_size, "hash_kind": snapshot.hash_kind}
+    top = sorted(snapshot.dir_totals().items(), key=lambda item: item[1], reverse=True)[:args.top]
+    emit(args, summary, "top_dirs", "dir", ({"path": path, "size": size} for path, size in top))
+
+
+def cmd_diff(args):
+    with ScanSnapshot.load(args.old) as old, ScanSnapshot.load(args.new) as new:
+        result = diff_snapshots(old, new)
+    top = args.top or None
+    summary = {**result.as_dict(),
+               "grown_dirs": [{"path": path, "delta": delta} for path, delta in result.grown_dirs[:top]]}
+    # Сначала изменения, сильнее всего повлиявшие на занятое место
+    changes = [{"change": "added", "path": path, "size": size} for path, size in result.added]
+    changes += [{"change": "removed", "path": path, "size": -size} for path, size in result.removed]
+    changes += [{"change": "changed", "path": path, "size": new_size - old_size, "old_size": old_size,
+                 "new_size": new_size} for path, old_size, new_size in result.changed]
+    changes.sort(key=lambda item: abs(item["size"]), reverse=True)
+    emit(args, summary, "changes", "change", changes[:top])
+
+
+def cmd_programs(args):
+    provider = inventory.FileProvider(args.fake) if args.fake else inventory.default_provider()
+    if provider is None:
+        raise SystemExit("реестр есть только в Windows; для проверки укажите --fake ПАПКА")
+    inv = inventory.Inventory(provider, None if args.no_cache else inventory.default_cache_path())
+    if args.startup:
+        items = inv.startup_items()
+        summary = {"provider": provider.name, "count": len(items)}
+        emit(args, summary, "startup", "startup", (item._asdict() for item in items))
+    else:
+        programs = inv.programs()
+        summary = {"provider": provider.name, "count": len(programs), **inv.stats.as_dict()}
+        emit(args, summary, "programs", "program", (program._asdict() for program in programs))
+    inv.save()
+
+
+def cmd_daemon(args):
+    # Держит индекс в памяти и отвечает на запросы query, пока не прервут (Ctrl+C)
+    with HashCache() as cache:
+        index = liveindex.LiveIndex(args.root, max_files=args.max_files, cache=cache, on_error=report_error,
+                                    watcher=liveindex.make_watcher(args.poll), budgets=args.device_workers)
+        index.start()
+        log_pipeline.emit(f"Живой индекс: {', '.join(index.roots)} ({index.watcher.kind})")
+        try:
+            liveindex.serve(index, threading.Event())
+        finally:
+            index.stop()
+
+
+def cmd_query(args):
+    request = {"query": args.query, "limit": args.top, "min_size": args.min_size}
+    if args.query in ("usage", "large"):
+        request["path"] = os.path.abspath(args.path) if args.path else None
+    try:
+        result = liveindex.query(request, timeout=args.timeout)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    if result is None:
+        raise SystemExit("живой индекс не запущен или не ответил (pccleaner daemon ПАПКА...)")
+    if args.query == "usage":
+        children = result.pop("children")
+        emit(args, result, "children", "dir", children)
+    elif args.query == "large":
+        emit(args, {"count": len(result)}, "top_files", "file", result)
+    elif args.query == "dupes":
+        groups = result.pop("groups")
+        emit(args, {**result, "groups": len(groups)}, "items", "group", groups)
+    else:
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=4)
+        sys.stdout.write("\n")
+
+
+def cmd_bench(args):
+    from pccleaner import bench
+
+    spec = bench.TreeSpec(files=args.files, depth=args.depth, fanout=args.fanout, median_size=args.median_size,
+                          max_size=args.max_size, dup_ratio=args.dup_ratio, seed=args.seed)
+    workers = [int(count) for count in args.workers.split(",")] if args.workers else [None]
+    results = bench.run_benchmarks(spec, engines=args.engines, workers=workers, modes=args.modes.split(","),
+                                   root=args.dir)
+    emit(args, {"spec": spec.as_dict()}, "results", "result", (result.as_dict() for result in results))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pccleaner", description="PC Cleaner без графического интерфейса")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json", help="формат вывода")
+    parser.add_argument("--log", help="дописывать лог в файл (.ndjson — построчный JSON)")
+    parser.add_argument("--progress", type=float, metavar="SECONDS", help="выводить прогресс с этим интервалом")
+    parser.add_argument("--device-workers", type=parse_device_workers, metavar="KIND=N,...",
+                        help="потоков на устройство по типу: hdd, ssd, nvme, network, unknown")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="анализ дискового пространства")
+    scan.add_argument("root", nargs="+")
+    scan.add_argument("--top", type=int, default=TOP_FILES, help="сколько крупных файлов показать")
+    scan.add_argument("--dirs", type=int, default=20, help="сколько крупных папок показать")
+    scan.add_argument("--incremental", action="store_true", help="не перечитывать неизменённые папки")
+    scan.add_argument("--rescan", action="store_true", help="с --incremental: прочитать всё заново и обновить снимок")
+    scan.set_defaults(func=cmd_scan)
+
+    large = commands.add_parser("large", help="поиск больших файлов")
+    large.add_argument("root", nargs="+")
+    large.add_argument("--top", type=int, default=TOP_FILES)
+    large.add_argument("--min-size", type=parse_size, default=LARGE_FILE_SIZE, help="например 100M или 2G")
+    large.set_defaults(func=cmd_large)
+
+    dupes = commands.add_parser("dupes", help="поиск дубликатов")
+    dupes.add_argument("root", nargs="+")
+    dupes.add_argument("--workers", type=int, default=None)
+    dupes.add_argument("--mode", choices=[duplicates.THREAD, duplicates.PROCESS], default=duplicates.THREAD,
+                       help="process — хешировать в отдельных процессах")
+    dupes.add_argument("--io-workers", type=int, help="исполнителей для чтения выборок")
+    dupes.add_argument("--cpu-workers", type=int, help="исполнителей для полного хеширования")
+    dupes.add_argument("--no-cache", action="store_true", help="не использовать кеш хешей")
+    dupes.add_argument("--min-size", type=parse_size, default=1,
+                       help="не сравнивать файлы меньше этого размера (по умолчанию пропускаются пустые)")
+    dupes.add_argument("--sample-hash", choices=sorted(hashing.BACKENDS), default=hashing.FAST_BACKEND,
+                       help="алгоритм для отбора кандидатов")
+    dupes.add_argument("--confirm", choices=sorted(hashing.BACKENDS) + [hashing.BYTES], default=hashing.STRONG_BACKEND,
+                       help="алгоритм полного хеша или bytes для побайтового сравнения")
+    action = dupes.add_mutually_exclusive_group()
+    action.add_argument("--replace", choices=dedupe.METHODS,
+                        help="заменить копии жёсткими ссылками или клонами (reflink) первого файла группы")
+    action.add_argument("--delete", action="store_true", help="удалить копии, оставив первый файл группы")
+    add_delete_options(dupes)
+    dupes.set_defaults(func=cmd_dupes)
+
+    images = commands.add_parser("similar", help="поиск похожих изображений (пересжатых, уменьшенных копий)")
+    images.add_argument("root", nargs="+")
+    images.add_argument("--algorithm", choices=similar.ALGORITHMS, default=similar.DHASH)
+    images.add_argument("--threshold", type=int, default=similar.DEFAULT_THRESHOLD,
+                        help="сколько из 64 бит хеша может различаться")
+    images.add_argument("--workers", type=int, default=None)
+    images.add_argument("--mode", choices=[duplicates.THREAD, duplicates.PROCESS], default=duplicates.PROCESS)
+    images.add_argument("--no-cache", action="store_true", help="не использовать кеш хешей")
+    images.set_defaults(func=cmd_similar)
+
+    devices = commands.add_parser("devices", help="как папки распределятся по устройствам и сколько потоков получат")
+    devices.add_argument("root", nargs="+")
+    devices.set_defaults(func=cmd_devices)
+
+    clean = commands.add_parser("clean-temp", help="очистка временных папок")
+    clean.add_argument("folders", nargs="*", help="по умолчанию TEMP/TMP")
+    clean.add_argument("--dry-run", action="store_true", help="только посчитать, сколько можно освободить")
+    clean.add_argument("--min-age", type=parse_age, default=0, help="не трогать файлы новее, например 7d или 12h")
+    clean.add_argument("--include", action="append", metavar="GLOB", help="удалять только подходящие, например *.log")
+    clean.add_argument("--exclude", action="append", metavar="GLOB", help="не трогать файлы и папки по шаблону")
+    clean.add_argument("--min-size", type=parse_size, default=0)
+    clean.add_argument("--max-size", type=parse_size, help="не трогать файлы крупнее")
+    clean.add_argument("--max-total", type=parse_size, help="освободить не больше")
+    clean.add_argument("--ignore-in-use", action="store_true", help="удалять и открытые другими программами файлы")
+    clean.add_argument("--rules", help="JSON со списком папок и правил вместо аргументов")
+    add_delete_options(clean)
+    clean.set_defaults(func=cmd_clean_temp)
+
+    snapshot = commands.add_parser("snapshot", help="сохранить полный результат сканирования в файл")
+    snapshot.add_argument("root")
+    snapshot.add_argument("-o", "--output", help="по умолчанию <config>/scans/<машина>-<дата>.pcscan")
+    snapshot.add_argument("--hashes", action="store_true", help="добавить известные из кеша хеши файлов")
+    snapshot.add_argument("--top", type=int, default=10, help="сколько самых больших папок показать")
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    diff = commands.add_parser("diff", help="сравнить два снимка без обращения к диску")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--top", type=int, default=100, help="сколько изменений и папок показать (0 — все)")
+    diff.set_defaults(func=cmd_diff)
+
+    programs = commands.add_parser("programs", help="установленные программы или автозагрузка")
+    programs.add_argument("--startup", action="store_true", help="показать автозагрузку")
+    programs.add_argument("--fake", metavar="DIR", help="поддельный реестр в папке (см. bench --engines inventory)")
+    programs.add_argument("--no-cache", action="store_true", help="не использовать кеш по времени записи разделов")
+    programs.set_defaults(func=cmd_programs)
+
+    daemon = commands.add_parser("daemon", help="держать индекс папок в памяти и обновлять его по событиям ФС")
+    daemon.add_argument("root", nargs="+")
+    daemon.add_argument("--max-files", type=int, default=liveindex.DEFAULT_MAX_FILES,
+                        help="сколько файлов помнить поимённо (мелкие сверх лимита остаются только в суммах папок)")
+    daemon.add_argument("--poll", action="store_true", help="опрашивать папки вместо inotify")
+    daemon.set_defaults(func=cmd_daemon)
+
+    query = commands.add_parser("query", help="запрос к запущенному живому индексу")
+    query.add_argument("query", choices=["usage", "large", "dupes", "status"])
+    query.add_argument("path", nargs="?", help="папка для usage и large (по умолчанию корни индекса)")
+    query.add_argument("--top", type=int, default=100, help="сколько папок или файлов показать")
+    query.add_argument("--min-size", type=parse_size, default=0)
+    query.add_argument("--timeout", type=float, default=30, help="сколько секунд ждать ответа индекса")
+    query.set_defaults(func=cmd_query)
+
+    bench = commands.add_parser("bench", help="замер скорости на синтетическом дереве")
+    bench.add_argument("--files", type=int, default=10000)
+    bench.add_argument("--depth", type=int, default=3)
+    bench.add_argument("--fanout", type=int, default=8)
+    bench.add_argument("--median-size", type=parse_size, default=16 * 1024)
+    bench.add_argument("--max-size", type=parse_size, default=8 * 1024 * 1024)
+    bench.add_argument("--dup-ratio", type=float, default=0.1)
+    bench.add_argument("--seed", type=int, default=42)
+    bench.add_argument("--workers", help="список для поиска дубликатов, например 1,4,8")
+    bench.add_argument("--modes", default=duplicates.THREAD, help="режимы поиска дубликатов, например thread,process")
+    bench.add_argument("--engines", nargs="+", choices=["walk", "disk", "large", "hash", "dupes", "inventory",
+                                                     "clean-temp"])
+    bench.add_argument("--dir", help="где создать дерево (по умолчанию временная папка, удаляется)")
+    bench.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sys.stdout.reconfigure(errors="backslashreplace")
+    log_pipeline.add_sink(StreamSink(sys.stderr))
+    if args.log:
+        log_pipeline.add_sink(NDJSONSink(args.log) if args.log.endswith(".ndjson") else FileSink(args.log))
+    log_pipeline.start()
+    stopped = threading.Event()
+    if args.progress:
+        threading.Thread(target=report_progress, args=(args.progress, stopped), daemon=True).start()
+    try:
+        args.func(args)
+    except KeyboardInterrupt:
+        controller.cancel_all()
+        return 130
+    finally:
+        stopped.set()
+        log_pipeline.stop()
+    return 0
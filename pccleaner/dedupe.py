@@ -0,0 +1,175 @@
+import os
+import sys
+import uuid
+import errno
+import shutil
+from collections import defaultdict
+
+from pccleaner.hashing import partition_identical
+from pccleaner.progress import Cancelled
+
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+METHODS = [HARDLINK, REFLINK]
+FICLONE = 0x40049409  # ioctl Linux для клонирования файла (btrfs, XFS, bcachefs)
+
+
+class DedupeStats:
+    def __init__(self):
+        self.files = 0
+        self.bytes_saved = 0
+        self.already_linked = 0
+        self.changed = 0
+        self.errors = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def clone_file(src, dst):
+    # Копия, разделяющая блоки с исходным файлом (copy-on-write); dst не должен существовать
+    if sys.platform.startswith("linux"):
+        import fcntl
+        with open(src, "rb") as source, open(dst, "xb") as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    elif sys.platform == "darwin":
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), dst)
+    else:
+        raise OSError(errno.EOPNOTSUPP, "клонирование файлов не поддерживается", dst)
+
+
+def _temp_path(target):
+    folder, name = os.path.split(target)
+    return os.path.join(folder, f".{name}.{uuid.uuid4().hex[:8]}.pccleaner-tmp")
+
+
+def _remove_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _prepare(keep, target, method):
+    # Временный файл рядом с заменяемым: потом os.replace подменяет его атомарно
+    tmp = _temp_path(target)
+    try:
+        if method == HARDLINK:
+            os.link(keep, tmp)
+        else:
+            clone_file(keep, tmp)
+            # У клона свой inode: права и время оставляем от заменяемого файла
+            shutil.copystat(target, tmp)
+    except BaseException:
+        _remove_quietly(tmp)
+        raise
+    return tmp
+
+
+class PartialReplaceError(OSError):
+    # Переименование прервалось на filename; replaced — цели, которые уже заменены
+    def __init__(self, replaced, error, target):
+        super().__init__(error.errno, error.strerror or str(error), target)
+        self.replaced = replaced
+
+
+def replace_group(keep, targets, method=HARDLINK):
+    # Сначала готовим временные файлы для всей группы, и только если это удалось везде —
+    # переименовываем. Ошибка на первом шаге не оставляет группу наполовину заменённой;
+    # ошибка при переименовании (каждое атомарно, но вся группа — нет) убирает оставшиеся
+    # временные файлы и сообщает, какие цели уже заменены. Возвращает заменённые пути.
+    prepared = []
+    try:
+        for target in targets:
+            prepared.append((_prepare(keep, target, method), target))
+    except BaseException:
+        for tmp, _ in prepared:
+            _remove_quietly(tmp)
+        raise
+    replaced = []
+    try:
+        for tmp, target in prepared:
+            os.replace(tmp, target)
+            replaced.append(target)
+    except BaseException as e:
+        for tmp, _ in prepared[len(replaced):]:
+            _remove_quietly(tmp)
+        if isinstance(e, OSError):
+            raise PartialReplaceError(replaced, e, prepared[len(replaced)][1]) from e
+        raise
+    return replaced
+
+
+def dedupe_groups(groups, method=HARDLINK, verify=True, stop_flag=None, on_error=None, progress=None):
+    # groups: списки путей с одинаковым содержимым, первый путь в группе остаётся как есть,
+    # остальные заменяются жёсткой ссылкой или клоном. verify — перед заменой сверить
+    # содержимое ещё раз: файл мог измениться после поиска дубликатов.
+    if method not in METHODS:
+        raise ValueError(f"неизвестный способ замены: {method}")
+    stats = DedupeStats()
+
+    def failed(path, e):
+        stats.errors += 1
+        if on_error:
+            on_error(path, e)
+
+    for paths in groups:
+        if stop_flag is not None and stop_flag.is_set():
+            break
+        by_device = defaultdict(list)
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                failed(path, e)
+                continue
+            by_device[st.st_dev].append((path, st))
+
+        # Ссылки и клоны возможны только в пределах одной файловой системы
+        for members in by_device.values():
+            keep, keep_st = members[0]
+            targets = []
+            for path, st in members[1:]:
+                if st.st_ino and st.st_ino == keep_st.st_ino:
+                    stats.already_linked += 1
+                elif st.st_size != keep_st.st_size:
+                    stats.changed += 1
+                else:
+                    targets.append((path, st))
+            if not targets:
+                continue
+            if verify:
+                try:
+                    identical = partition_identical([keep] + [path for path, _ in targets], stop_flag=stop_flag)
+                except Cancelled:
+                    break
+                except OSError as e:
+                    failed(keep, e)
+                    continue
+                same = next((group for group in identical if keep in group), [])
+                stats.changed += sum(1 for path, _ in targets if path not in same)
+                targets = [(path, st) for path, st in targets if path in same]
+                if not targets:
+                    continue
+            try:
+                replaced = set(replace_group(keep, [path for path, _ in targets], method))
+            except PartialReplaceError as e:
+                failed(e.filename, e)
+                replaced = set(e.replaced)
+            except OSError as e:
+                failed(keep, e)
+                continue
+            for path, st in targets:
+                if path not in replaced:
+                    continue
+                stats.files += 1
+                # Место освобождается, только если у заменённого файла не было других ссылок
+                saved = st.st_size if method == REFLINK or st.st_nlink <= 1 else 0
+                stats.bytes_saved += saved
+                if progress is not None:
+                    progress.add(1, saved)
+    return stats
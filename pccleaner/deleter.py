@@ -0,0 +1,184 @@
+import os
+import time
+import errno
+import threading
+import concurrent.futures
+
+from pccleaner.progress import format_size
+
+CHUNK_PER_WORKER = 16  # сколько удалений на поток отдаём пулу за раз, между порциями проверяем отмену
+MAX_EXAMPLES = 5  # сколько путей запоминать для каждого вида ошибки
+# SHERB_NOCONFIRMATION | SHERB_NOPROGRESSUI | SHERB_NOSOUND
+SHERB_QUIET = 0x7
+
+
+class DeleteResult:
+    # Итог удаления: failures — число ошибок по коду errno, examples — первые пути для каждого кода
+    def __init__(self, trash=False):
+        self.trash = trash
+        self.files = 0
+        self.bytes_freed = 0
+        self.missing = 0
+        self.failures = {}
+        self.examples = {}
+
+    @property
+    def errors(self):
+        return sum(self.failures.values())
+
+    def add_failure(self, path, e):
+        code = error_code(e)
+        self.failures[code] = self.failures.get(code, 0) + 1
+        examples = self.examples.setdefault(code, [])
+        if len(examples) < MAX_EXAMPLES:
+            examples.append(path)
+
+    def as_dict(self):
+        return {"trash": self.trash, "files": self.files, "bytes_freed": self.bytes_freed, "missing": self.missing,
+                "errors": self.errors, "failures": dict(self.failures), "examples": dict(self.examples)}
+
+    def summary(self):
+        action = "перемещено в корзину" if self.trash else "удалено"
+        text = f"{action} файлов: {self.files}, {format_size(self.bytes_freed)}"
+        if self.failures:
+            text += ", ошибок: " + ", ".join(f"{code} {count}" for code, count in
+                                             sorted(self.failures.items(), key=lambda item: -item[1]))
+        return text
+
+
+def error_code(e):
+    # Имя errno (EACCES, EBUSY...), для ошибок Windows без errno — номер winerror
+    if getattr(e, "errno", None):
+        return errno.errorcode.get(e.errno, str(e.errno))
+    winerror = getattr(e, "winerror", None)
+    if winerror:
+        return f"WinError {winerror}"
+    return type(e).__name__
+
+
+class RateLimiter:
+    # Два «ведра с токенами»: операций в секунду и байт в секунду. Запас — не больше секунды работы,
+    # крупный файл может увести счёт байт в минус, тогда следующие удаления подождут.
+    def __init__(self, ops_per_s=None, bytes_per_s=None, stop_flag=None):
+        self.ops_per_s = ops_per_s
+        self.bytes_per_s = bytes_per_s
+        self.stop_flag = stop_flag
+        self._ops = float(ops_per_s or 0)
+        self._bytes = float(bytes_per_s or 0)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.ops_per_s or self.bytes_per_s)
+
+    def _refill(self, now):
+        elapsed = now - self._last
+        self._last = now
+        if self.ops_per_s:
+            self._ops = min(self._ops + elapsed * self.ops_per_s, self.ops_per_s)
+        if self.bytes_per_s:
+            self._bytes = min(self._bytes + elapsed * self.bytes_per_s, self.bytes_per_s)
+
+    def acquire(self, size=0):
+        # False — если ожидание прервано отменой
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                wait = 0.0
+                if self.ops_per_s and self._ops < 1:
+                    wait = (1 - self._ops) / self.ops_per_s
+                if self.bytes_per_s and self._bytes < 0:
+                    wait = max(wait, -self._bytes / self.bytes_per_s)
+                if wait <= 0:
+                    if self.ops_per_s:
+                        self._ops -= 1
+                    if self.bytes_per_s:
+                        self._bytes -= size
+                    return True
+            if self.stop_flag is not None and self.stop_flag.is_set():
+                return False
+            time.sleep(min(wait, 0.2))
+
+
+class Deleter:
+    # Общий исполнитель удалений для GUI и CLI: пул потоков, ограничение скорости
+    # (ops_per_s, bytes_per_s) и режим «в корзину» через send2trash. Колбэки и счётчики
+    # вызываются в потоке, который вызвал delete, поэтому их не нужно защищать блокировками.
+    def __init__(self, max_workers=None, ops_per_s=None, bytes_per_s=None, trash=False, stop_flag=None,
+                 progress=None):
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.limiter = RateLimiter(ops_per_s, bytes_per_s, stop_flag)
+        self.trash = trash
+        self.stop_flag = stop_flag
+        self.progress = progress
+        self.result = DeleteResult(trash)
+        self._remove = os.unlink
+        if trash:
+            from send2trash import send2trash
+            self._remove = send2trash
+
+    def _stopped(self):
+        return self.stop_flag is not None and self.stop_flag.is_set()
+
+    def _delete_one(self, item):
+        path, size = item
+        if self._stopped() or not self.limiter.acquire(size):
+            return False
+        try:
+            self._remove(path)
+        except OSError as e:
+            return e
+        return None
+
+    def delete(self, items, on_deleted=None, on_error=None):
+        # items: пары (путь, размер). Возвращает удалённые пути; отсутствующие файлы
+        # считаются в missing и ошибкой не являются.
+        items = list(items)
+        deleted = []
+        chunk = self.max_workers * CHUNK_PER_WORKER
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for start in range(0, len(items), chunk):
+                if self._stopped():
+                    break
+                part = items[start:start + chunk]
+                for (path, size), outcome in zip(part, executor.map(self._delete_one, part)):
+                    if outcome is None:
+                        self.result.files += 1
+                        self.result.bytes_freed += size
+                        deleted.append(path)
+                        if self.progress is not None:
+                            self.progress.add(1, size)
+                        if on_deleted:
+                            on_deleted(path, size)
+                    elif outcome is False:
+                        continue
+                    elif isinstance(outcome, FileNotFoundError) and not os.path.lexists(path):
+                        self.result.missing += 1
+                    else:
+                        self.result.add_failure(path, outcome)
+                        if on_error:
+                            on_error(path, outcome)
+        return deleted
+
+    def delete_paths(self, paths, on_deleted=None, on_error=None):
+        # Для путей без известного размера: размер берётся из lstat, пропавшие файлы считаются в missing
+        items = []
+        for path in paths:
+            try:
+                items.append((path, os.lstat(path).st_size))
+            except FileNotFoundError:
+                self.result.missing += 1
+            except OSError as e:
+                self.result.add_failure(path, e)
+                if on_error:
+                    on_error(path, e)
+        return self.delete(items, on_deleted, on_error)
+
+
+def empty_windows_recycle_bin():
+    # Корзину Windows очищает сама оболочка; HRESULT 0x8000FFFF — корзина уже пуста
+    import ctypes
+    result = ctypes.windll.shell32.SHEmptyRecycleBinW(None, None, SHERB_QUIET) & 0xFFFFFFFF
+    if result not in (0, 1, 0x8000FFFF):
+        raise OSError(f"SHEmptyRecycleBinW вернул 0x{result:08X}")
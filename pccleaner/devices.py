@@ -0,0 +1,127 @@
+import os
+import sys
+from collections import namedtuple
+
+HDD = "hdd"
+SSD = "ssd"
+NVME = "nvme"
+NETWORK = "network"
+UNKNOWN = "unknown"
+KINDS = [HDD, SSD, NVME, NETWORK, UNKNOWN]
+# Сколько потоков одновременно читают одно устройство: диску с головками параллельные запросы
+# только добавляют перемещений головки, NVMe и сетевым дискам нужна глубокая очередь
+DEVICE_WORKERS = {HDD: 2, SSD: 8, NVME: 16, NETWORK: 16, UNKNOWN: 4}
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "afs", "ceph", "glusterfs",
+                       "fuse.glusterfs", "davfs", "fuse.rclone"}
+MEMORY_FILESYSTEMS = {"tmpfs", "ramfs"}
+DRIVE_REMOTE = 4  # GetDriveTypeW
+
+Device = namedtuple("Device", "dev kind workers roots")
+
+
+def _mount_info(path):
+    # (тип ФС, источник) точки монтирования, содержащей path, по /proc/self/mountinfo
+    best = None
+    try:
+        with open("/proc/self/mountinfo", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                left, _, right = line.partition(" - ")
+                mount_point = left.split()[4].replace("\\040", " ")
+                if path == mount_point or path.startswith(mount_point.rstrip("/") + "/"):
+                    if best is None or len(mount_point) > len(best[0]):
+                        fstype, source = (right.split() + ["", ""])[:2]
+                        best = (mount_point, fstype, source)
+    except OSError:
+        return None, None
+    return (best[1], best[2]) if best else (None, None)
+
+
+def _sysfs_kind(major, minor):
+    # Раздел наследует очередь (и признак rotational) от своего диска
+    base = os.path.realpath(f"/sys/dev/block/{major}:{minor}")
+    if not os.path.isdir(base):
+        return None
+    if os.path.exists(os.path.join(base, "partition")):
+        base = os.path.dirname(base)
+    try:
+        with open(os.path.join(base, "queue", "rotational")) as f:
+            rotational = f.read().strip() == "1"
+    except OSError:
+        return None
+    if rotational:
+        return HDD
+    return NVME if os.path.basename(base).startswith("nvme") else SSD
+
+
+def device_kind(path, st_dev=None):
+    path = os.path.abspath(path)
+    if st_dev is None:
+        st_dev = os.stat(path).st_dev
+    if os.name == "nt":
+        import ctypes
+        drive = os.path.splitdrive(path)[0] + "\\"
+        if path.startswith("\\\\") or ctypes.windll.kernel32.GetDriveTypeW(drive) == DRIVE_REMOTE:
+            return NETWORK
+        return UNKNOWN
+    if not sys.platform.startswith("linux"):
+        return UNKNOWN
+    fstype, source = _mount_info(path)
+    if fstype in NETWORK_FILESYSTEMS:
+        return NETWORK
+    if fstype in MEMORY_FILESYSTEMS:
+        return SSD
+    kind = _sysfs_kind(os.major(st_dev), os.minor(st_dev))
+    if kind is None and source and source.startswith("/dev/"):
+        # btrfs, ZFS и т. п. выдают анонимный st_dev: устройство ищем по источнику монтирования
+        try:
+            rdev = os.stat(source).st_rdev
+        except OSError:
+            rdev = 0
+        if rdev:
+            kind = _sysfs_kind(os.major(rdev), os.minor(rdev))
+    return kind or UNKNOWN
+
+
+def parse_budgets(text):
+    # "hdd=1,nvme=32" -> {"hdd": 1, "nvme": 32}
+    budgets = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        kind, _, value = item.partition("=")
+        if kind not in KINDS:
+            raise ValueError(f"неизвестный тип устройства: {kind}")
+        budgets[kind] = max(int(value), 1)
+    return budgets
+
+
+def plan_devices(roots, budgets=None):
+    # Корни группируются по st_dev; корень внутри другого корня на том же устройстве отбрасывается,
+    # чтобы не считать одни и те же файлы дважды (обход не переходит на другие устройства,
+    # поэтому вложенная точка монтирования остаётся отдельным корнем).
+    # Возвращает (устройства, отброшенные корни).
+    budgets = {**DEVICE_WORKERS, **(budgets or {})}
+    by_dev = {}
+    skipped = []
+    for root in sorted(dict.fromkeys(os.path.abspath(root) for root in roots)):
+        try:
+            dev = os.stat(root).st_dev
+        except OSError:
+            dev = None  # ошибку чтения корня сообщит обход
+        kept = by_dev.setdefault(dev, [])
+        if any(root == outer or root.startswith(outer.rstrip(os.sep) + os.sep) for outer in kept):
+            skipped.append(root)
+            continue
+        kept.append(root)
+    devices = []
+    for dev, dev_roots in by_dev.items():
+        kind = UNKNOWN
+        if dev is not None:
+            try:
+                kind = device_kind(dev_roots[0], dev)
+            except OSError:
+                pass
+        devices.append(Device(dev, kind, budgets[kind], dev_roots))
+    return devices, skipped
+
+
+def total_workers(devices):
+    return sum(device.workers for device in devices)
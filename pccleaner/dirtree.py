@@ -0,0 +1,83 @@
+import os
+
+
+class DirNode:
+    __slots__ = ("path", "parent", "children", "mtime_ns", "own_size", "own_files", "total_size", "total_files")
+
+    def __init__(self, path, parent=None, mtime_ns=0):
+        self.path = path
+        self.parent = parent
+        self.children = []
+        self.mtime_ns = mtime_ns
+        self.own_size = 0
+        self.own_files = 0
+        self.total_size = 0
+        self.total_files = 0
+
+    @property
+    def name(self):
+        return os.path.basename(self.path) or self.path
+
+
+class DirTree:
+    # Дерево каталогов с размерами поддеревьев (как du). Узлы хранятся в порядке обхода,
+    # родитель всегда раньше детей, поэтому суммы считаются одним проходом с конца.
+    def __init__(self, root, mtime_ns=0):
+        self.root = DirNode(os.path.abspath(root), mtime_ns=mtime_ns)
+        self._nodes = [self.root]
+        self._index = {self.root.path: self.root}
+        self._by_size = None
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def nodes(self):
+        return iter(self._nodes)
+
+    def add_dir(self, path, mtime_ns=0):
+        node = self._index.get(path)
+        if node is not None:
+            node.mtime_ns = mtime_ns
+            return node
+        parent = self._index[os.path.dirname(path)]
+        node = DirNode(path, parent, mtime_ns)
+        parent.children.append(node)
+        self._nodes.append(node)
+        self._index[path] = node
+        return node
+
+    def add_records(self, records):
+        index = self._index
+        for record in records:
+            if record.is_dir:
+                self.add_dir(record.path, record.mtime_ns)
+            else:
+                node = index[os.path.dirname(record.path)]
+                node.own_size += record.size
+                node.own_files += 1
+        self._by_size = None
+
+    def rollup(self):
+        for node in self._nodes:
+            node.total_size = node.own_size
+            node.total_files = node.own_files
+        for node in reversed(self._nodes):
+            if node.parent is not None:
+                node.parent.total_size += node.total_size
+                node.parent.total_files += node.total_files
+        self._by_size = None
+
+    def node(self, path):
+        return self._index.get(os.path.abspath(path))
+
+    def children(self, path):
+        node = self.node(path)
+        if node is None:
+            return []
+        return sorted(node.children, key=lambda child: child.total_size, reverse=True)
+
+    def top_dirs(self, n=100):
+        # Сортировка один раз, дальше запросы — просто срез
+        if self._by_size is None:
+            self._by_size = sorted(self._nodes, key=lambda node: node.total_size, reverse=True)
+        return self._by_size[:n]
@@ -0,0 +1,395 @@
+import os
+import time
+import queue
+import multiprocessing
+import concurrent.futures
+from collections import defaultdict
+
+from pccleaner.hashing import (hash_file, hash_sample, partition_identical, sample_covers_file,
+                               BYTES, FAST_BACKEND, SAMPLE_SIZE, STRONG_BACKEND)
+from pccleaner.devices import plan_devices, total_workers
+from pccleaner.progress import Cancelled
+from pccleaner.walker import walk_roots
+
+THREAD = "thread"
+PROCESS = "process"
+# Сколько файлов отдаём исполнителю за раз: в процессы дороже передавать, поэтому пачки крупнее
+BATCH_SIZE = {THREAD: 32, PROCESS: 256}
+# Сколько пачек на исполнителя может быть отправлено и ещё не обработано
+MAX_PENDING_PER_WORKER = 4
+POLL_INTERVAL = 0.2
+
+_worker_stop = None
+
+
+class DuplicateStats:
+    def __init__(self):
+        self.files_total = 0
+        self.bytes_total = 0
+        self.size_candidates = 0
+        self.sample_candidates = 0
+        self.full_candidates = 0
+        self.duplicate_files = 0
+        self.groups = 0
+        self.bytes_read_sample = 0
+        self.bytes_read_full = 0
+        self.hardlinks = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+    @property
+    def bytes_read(self):
+        return self.bytes_read_sample + self.bytes_read_full
+
+    @property
+    def bytes_avoided(self):
+        return max(self.bytes_total - self.bytes_read, 0)
+
+    def as_dict(self):
+        data = dict(vars(self))
+        data["bytes_read"] = self.bytes_read
+        data["bytes_avoided"] = self.bytes_avoided
+        return data
+
+
+def _init_worker(stop_event):
+    global _worker_stop
+    _worker_stop = stop_event
+
+
+def _hash_batch(batch, task, backend, stop_flag=None):
+    # Выполняется в потоке или в отдельном процессе; возвращает [(digest, error), ...]
+    # в порядке batch, при отмене список может быть короче
+    if stop_flag is None:
+        stop_flag = _worker_stop
+    results = []
+    for path, size in batch:
+        if stop_flag is not None and stop_flag.is_set():
+            break
+        try:
+            if task == "sample":
+                digest = hash_sample(path, size, backend)
+            else:
+                digest = hash_file(path, backend, stop_flag=stop_flag)
+        except Cancelled:
+            break
+        except OSError as e:
+            results.append((None, e))
+            continue
+        results.append((digest, None))
+    return results
+
+
+def _confirm_batch(groups, stop_flag=None):
+    if stop_flag is None:
+        stop_flag = _worker_stop
+    results = []
+    for paths in groups:
+        if stop_flag is not None and stop_flag.is_set():
+            break
+        try:
+            results.append((partition_identical(paths, stop_flag=stop_flag), None))
+        except Cancelled:
+            break
+        except OSError as e:
+            results.append((None, e))
+    return results
+
+
+class _Executor:
+    # Пул потоков или процессов с общей отменой: в процессы stop_flag передаётся
+    # через multiprocessing.Event, который проверяется между файлами.
+    # Окно ограничено: пока в работе max_pending пачек, submit сам обрабатывает готовые
+    # результаты, поэтому ни задачи, ни результаты не копятся в памяти.
+    def __init__(self, mode, workers, stop_flag):
+        self.mode = mode
+        self.stop_flag = stop_flag
+        self.max_pending = workers * MAX_PENDING_PER_WORKER
+        self._in_flight = 0
+        self._done = queue.SimpleQueue()
+        if mode == PROCESS:
+            # Не fork: процессы создаются при первой задаче, когда уже работают потоки обхода и лога,
+            # и форк мог бы унести в дочерний процесс чужую захваченную блокировку
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+            self.worker_stop = context.Event()
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(self.worker_stop,))
+        else:
+            self.worker_stop = stop_flag
+            self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def cancelled(self):
+        if self.stop_flag is not None and self.stop_flag.is_set():
+            if self.mode == PROCESS:
+                self.worker_stop.set()
+            return True
+        return False
+
+    def submit(self, handler, fn, *args):
+        # handler(результат) вызывается в потоке, который вызывает submit/poll/join
+        while self._in_flight >= self.max_pending:
+            if self.cancelled():
+                return
+            self._process(POLL_INTERVAL)
+        if self.cancelled():
+            return
+        if self.mode != PROCESS:
+            args += (self.worker_stop,)
+        future = self.pool.submit(fn, *args)
+        self._in_flight += 1
+        future.add_done_callback(lambda future: self._done.put((handler, future)))
+
+    def _process(self, timeout=None):
+        # Обрабатывает всё готовое; timeout — сколько ждать, если готового нет
+        try:
+            item = self._done.get(timeout=timeout) if timeout else self._done.get_nowait()
+        except queue.Empty:
+            return
+        while True:
+            handler, future = item
+            self._in_flight -= 1
+            handler(future.result())
+            try:
+                item = self._done.get_nowait()
+            except queue.Empty:
+                return
+
+    def poll(self):
+        self._process()
+
+    def join(self):
+        while self._in_flight and not self.cancelled():
+            self._process(POLL_INTERVAL)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _Search:
+    # Конвейер: обход -> выборочный хеш -> полный хеш. Файл уходит на хеширование, как только
+    # у него появляется пара по размеру (затем по выборке), а не после обхода всего дерева.
+    # Файлы храним кортежами (path, size, dev, ino, mtime_ns).
+    def __init__(self, stats, cache, on_error, sample_backend, confirm, sample_executor, full_executor,
+                 progress=None):
+        self.stats = stats
+        self.progress = progress
+        self.cache = cache
+        self.on_error = on_error
+        self.sample_backend = sample_backend
+        self.confirm = confirm
+        self.sample_executor = sample_executor
+        self.full_executor = full_executor
+        # размер -> единственный файл такого размера или None, если файлов уже несколько
+        self.by_size = {}
+        # (dev, ino) файлов-кандидатов: жёсткие ссылки на уже учтённый файл не хешируем
+        self.inodes = set()
+        self.sampled = defaultdict(list)
+        self.hashed = defaultdict(list)
+        self.confirmed = {}
+        self._sample_batch = []
+        self._full_batch = []
+
+    def add(self, file):
+        size = file[1]
+        first = self.by_size.get(size, False)
+        if first is False:
+            self.by_size[size] = file
+            return
+        if first is not None:
+            self.by_size[size] = None
+            self._sample(first)
+        self._sample(file)
+
+    def _sample(self, file):
+        # У жёстких ссылок один размер, поэтому хватает проверять только кандидатов
+        path, size, dev, ino, mtime_ns = file
+        if ino:
+            if (dev, ino) in self.inodes:
+                self.stats.hardlinks += 1
+                return
+            self.inodes.add((dev, ino))
+        self.stats.size_candidates += 1
+        digest = self._cached(file, f"sample:{self.sample_backend}")
+        if digest is not None:
+            self._on_sampled(file, digest)
+            return
+        self._queued(min(file[1], 2 * SAMPLE_SIZE))
+        self._sample_batch.append(file)
+        if len(self._sample_batch) >= BATCH_SIZE[self.sample_executor.mode]:
+            self.flush_samples()
+
+    def flush_samples(self):
+        batch, self._sample_batch = self._sample_batch, []
+        if batch:
+            self.sample_executor.submit(lambda results: self._sample_done(batch, results),
+                                        _hash_batch, [file[:2] for file in batch], "sample", self.sample_backend)
+
+    def _sample_done(self, batch, results):
+        kind = f"sample:{self.sample_backend}"
+        self._processed(sum(min(file[1], 2 * SAMPLE_SIZE) for file in batch))
+        for file, (digest, error) in zip(batch, results):
+            if self._failed(file, error):
+                continue
+            self.stats.bytes_read_sample += min(file[1], 2 * SAMPLE_SIZE)
+            self._store(file, kind, digest)
+            self._on_sampled(file, digest)
+
+    def _needs_full(self, size):
+        # Маленький файл уже прочитан целиком нужным алгоритмом, полный хеш не нужен
+        return not (sample_covers_file(size) and self.sample_backend == self.confirm)
+
+    def _on_sampled(self, file, digest):
+        key = (file[1], digest)
+        group = self.sampled[key]
+        group.append(file)
+        if self.confirm == BYTES or not self._needs_full(file[1]):
+            # Побайтовое сравнение требует полных групп и идёт после обхода
+            return
+        if len(group) == 2:
+            self._full(key, group[0])
+        if len(group) >= 2:
+            self._full(key, file)
+
+    def _full(self, key, file):
+        digest = self._cached(file, f"full:{self.confirm}")
+        if digest is not None:
+            self.hashed[(key, digest)].append(file)
+            return
+        self._queued(file[1])
+        self._full_batch.append((key, file))
+        if len(self._full_batch) >= BATCH_SIZE[self.full_executor.mode]:
+            self.flush_full()
+
+    def flush_full(self):
+        batch, self._full_batch = self._full_batch, []
+        if batch:
+            self.full_executor.submit(lambda results: self._full_done(batch, results),
+                                      _hash_batch, [file[:2] for _, file in batch], "full", self.confirm)
+
+    def _full_done(self, batch, results):
+        kind = f"full:{self.confirm}"
+        self._processed(sum(file[1] for _, file in batch))
+        for (key, file), (digest, error) in zip(batch, results):
+            if self._failed(file, error):
+                continue
+            self.stats.bytes_read_full += file[1]
+            self._store(file, kind, digest)
+            self.hashed[(key, digest)].append(file)
+
+    def confirm_bytes(self):
+        # Побайтовое подтверждение: каждая группа кандидатов делится по фактическому содержимому
+        groups = [(key, files) for key, files in self.sampled.items() if len(files) > 1]
+        size = max(BATCH_SIZE[self.full_executor.mode] // 32, 1)
+        for start in range(0, len(groups), size):
+            batch = groups[start:start + size]
+            self._queued(sum(key[0] * len(files) for key, files in batch))
+            self.full_executor.submit(lambda results, batch=batch: self._confirm_done(batch, results),
+                                      _confirm_batch, [[file[0] for file in files] for _, files in batch])
+
+    def _confirm_done(self, batch, results):
+        self._processed(sum(key[0] * len(files) for key, files in batch))
+        for ((size, digest), files), (identical, error) in zip(batch, results):
+            if self._failed(files[0], error):
+                continue
+            self.stats.bytes_read_full += size * len(files)
+            for i, paths in enumerate(identical):
+                self.confirmed[(size, f"{BYTES}:{digest}:{i}")] = paths
+
+    def _queued(self, size):
+        # Объём хеширования растёт по ходу обхода, вместе с ним уточняется ETA
+        if self.progress is not None:
+            self.progress.add_total(size=size)
+
+    def _processed(self, size):
+        if self.progress is not None:
+            self.progress.add(size=size)
+
+    def _cached(self, file, kind):
+        if self.cache is None:
+            return None
+        path, size, dev, ino, mtime_ns = file
+        return self.cache.get(dev, ino, size, mtime_ns, kind)
+
+    def _store(self, file, kind, digest):
+        if self.cache is not None:
+            path, size, dev, ino, mtime_ns = file
+            self.cache.put(dev, ino, size, mtime_ns, kind, digest)
+
+    def _failed(self, file, error):
+        if error is None:
+            return False
+        self.stats.errors += 1
+        if self.on_error:
+            self.on_error(file[0], error)
+        return True
+
+    def duplicates(self):
+        duplicates = {}
+        for (size, digest), files in self.sampled.items():
+            if len(files) < 2:
+                continue
+            self.stats.sample_candidates += len(files)
+            if self._needs_full(size):
+                self.stats.full_candidates += len(files)
+            else:
+                duplicates[(size, digest)] = [file[0] for file in files]
+        for ((size, _), digest), files in self.hashed.items():
+            if len(files) > 1:
+                duplicates[(size, digest)] = [file[0] for file in files]
+        duplicates.update(self.confirmed)
+        # Файлы приходят из нескольких потоков обхода; порядок в группе фиксируем, чтобы «первый» был стабильным
+        return {key: sorted(paths) for key, paths in duplicates.items()}
+
+
+def find_duplicates(root, stop_flag=None, max_workers=None, on_error=None, cache=None,
+                    sample_backend=FAST_BACKEND, confirm=STRONG_BACKEND,
+                    mode=THREAD, io_workers=None, cpu_workers=None, progress=None, budgets=None, min_size=1):
+    # root — папка или список папок (обход по устройствам, см. walk_roots).
+    # confirm: алгоритм полного хеша или BYTES для побайтового сравнения.
+    # mode=PROCESS хеширует в отдельных процессах (обход GIL на множестве мелких файлов);
+    # io_workers — для чтения выборок, cpu_workers — для полного хеширования. По умолчанию
+    # их столько, сколько в сумме допускают бюджеты устройств: на одном HDD — 2, а не по числу ядер.
+    # progress (Task): файлы считаются при обходе, байты — по мере хеширования.
+    # Файлы меньше min_size не сравниваются: пустые __init__.py и метки вроде .gitkeep одинаковы,
+    # но не копии друг друга, а удаление или замена ссылкой ничего не освобождает.
+    stats = DuplicateStats()
+    start_time = time.time()
+    devices, _ = plan_devices([root] if isinstance(root, str) else root, budgets)
+    io_workers = io_workers or max_workers or total_workers(devices)
+    cpu_workers = cpu_workers or max_workers or min(total_workers(devices), os.cpu_count())
+
+    sample_executor = _Executor(mode, io_workers, stop_flag)
+    full_executor = _Executor(mode, cpu_workers, stop_flag)
+    search = _Search(stats, cache, on_error, sample_backend, confirm, sample_executor, full_executor, progress)
+    try:
+        # Хеширование идёт параллельно с обходом; уникальные по размеру файлы не читаются вовсе
+        for _, batch in walk_roots(None, with_inode=True, stop_flag=stop_flag, on_error=on_error, devices=devices):
+            for record in batch:
+                stats.files_total += 1
+                stats.bytes_total += record.size
+                if record.size < min_size:
+                    continue
+                search.add((record.path, record.size, record.dev, record.inode, record.mtime_ns))
+            if progress is not None:
+                progress.add(files=len(batch))
+            sample_executor.poll()
+            full_executor.poll()
+        search.flush_samples()
+        sample_executor.join()
+        if confirm == BYTES:
+            search.confirm_bytes()
+        search.flush_full()
+        full_executor.join()
+    finally:
+        sample_executor.shutdown()
+        full_executor.shutdown()
+
+    if cache is not None:
+        cache.flush()
+
+    duplicates = search.duplicates()
+    stats.groups = len(duplicates)
+    stats.duplicate_files = sum(len(paths) for paths in duplicates.values())
+    stats.elapsed = time.time() - start_time
+    return duplicates, stats
@@ -0,0 +1,84 @@
+import os
+import json
+import hashlib
+
+from pccleaner.config import user_config_dir
+
+DEFAULT_DURATION = 100  # мс; как в браузерах, для кадров без длительности или с длительностью меньше MIN_DURATION
+MIN_DURATION = 20
+
+
+def cache_path(path, size):
+    # Один файл на пару «исходник + размер»; время изменения исходника хранится внутри
+    folder = os.path.join(user_config_dir(), "gif-cache")
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(folder, f"{name}-{digest}-{size[0]}x{size[1]}.png")
+
+
+def frame_duration(info):
+    duration = info.get("duration") or 0
+    return duration if duration >= MIN_DURATION else DEFAULT_DURATION
+
+
+def decode_frames(path, size):
+    # Кадры GIF в RGBA, уменьшенные до size, и длительность каждого кадра в мс
+    from PIL import Image
+
+    frames, durations = [], []
+    with Image.open(path) as image:
+        for index in range(getattr(image, "n_frames", 1)):
+            image.seek(index)
+            frames.append(image.convert("RGBA").resize(size, Image.LANCZOS))
+            durations.append(frame_duration(image.info))
+    return frames, durations
+
+
+def _load_strip(cache_file, mtime_ns, size):
+    # Кеш — PNG-лента из кадров одного размера, сверху вниз; в текстовом блоке — mtime исходника и длительности
+    from PIL import Image
+
+    with Image.open(cache_file) as strip:
+        meta = json.loads(strip.text.get("pccleaner", "{}"))
+        if meta.get("mtime_ns") != mtime_ns or tuple(meta.get("size", ())) != tuple(size):
+            return None
+        strip.load()
+        width, height = size
+        durations = meta["durations"]
+        frames = [strip.crop((0, i * height, width, (i + 1) * height)) for i in range(len(durations))]
+    return frames, durations
+
+
+def _save_strip(cache_file, frames, durations, mtime_ns, size):
+    from PIL import Image, PngImagePlugin
+
+    width, height = size
+    strip = Image.new("RGBA", (width, height * len(frames)))
+    for i, frame in enumerate(frames):
+        strip.paste(frame, (0, i * height))
+    info = PngImagePlugin.PngInfo()
+    info.add_text("pccleaner", json.dumps({"mtime_ns": mtime_ns, "size": list(size), "durations": durations}))
+    tmp = cache_file + ".tmp"
+    strip.save(tmp, format="PNG", pnginfo=info)
+    os.replace(tmp, cache_file)
+
+
+def load_frames(path, size):
+    # Уменьшенные кадры из кеша; если исходник изменился или кеша нет — декодируем и сохраняем заново.
+    # Вызывается в фоновом потоке: только Pillow, без Tk.
+    size = tuple(size)
+    mtime_ns = os.stat(path).st_mtime_ns
+    cache_file = cache_path(path, size)
+    try:
+        cached = _load_strip(cache_file, mtime_ns, size)
+    except (OSError, ValueError, KeyError):
+        cached = None
+    if cached is not None:
+        return cached
+    frames, durations = decode_frames(path, size)
+    try:
+        _save_strip(cache_file, frames, durations, mtime_ns, size)
+    except OSError:
+        pass  # без кеша анимация всё равно работает
+    return frames, durations
@@ -0,0 +1,133 @@
+import os
+import time
+import sqlite3
+import threading
+
+from pccleaner.config import user_config_dir
+
+DEFAULT_MAX_ENTRIES = 2_000_000
+DEFAULT_MAX_AGE = 90 * 24 * 3600  # запись, которую не видели 90 дней, считаем устаревшей
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    seen INTEGER NOT NULL,
+    PRIMARY KEY (dev, ino, kind)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hashes_seen ON hashes (seen);
+"""
+
+
+def default_cache_path():
+    return os.path.join(user_config_dir(), "hashcache.sqlite3")
+
+
+class HashCache:
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.writes = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._seen = []
+        self._now = int(time.time())
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def get(self, dev, ino, size, mtime_ns, kind):
+        if not ino:
+            # Без номера inode файл не опознать, такие файлы не кешируем
+            self.misses += 1
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, digest FROM hashes WHERE dev = ? AND ino = ? AND kind = ?",
+                (dev, ino, kind)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if row[0] != size or row[1] != mtime_ns:
+                # Файл изменился или inode переиспользован: запись перезапишется при put
+                self.invalidated += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._seen.append((self._now, dev, ino, kind))
+            if len(self._seen) >= 10000:
+                self._flush_locked()
+            return row[2]
+
+    def put(self, dev, ino, size, mtime_ns, kind, digest):
+        if not ino:
+            return
+        with self._lock:
+            self._pending.append((dev, ino, kind, size, mtime_ns, digest, self._now))
+            if len(self._pending) >= 10000:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._pending:
+            self._db.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)", self._pending)
+            self.writes += len(self._pending)
+            self._pending = []
+        if self._seen:
+            self._db.executemany("UPDATE hashes SET seen = ? WHERE dev = ? AND ino = ? AND kind = ?", self._seen)
+            self._seen = []
+        self._db.commit()
+
+    def prune(self):
+        with self._lock:
+            self._flush_locked()
+            cur = self._db.execute("DELETE FROM hashes WHERE seen < ?", (self._now - self.max_age,))
+            self.evicted += cur.rowcount
+            count = self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+            if count > self.max_entries:
+                cur = self._db.execute(
+                    "DELETE FROM hashes WHERE (dev, ino, kind) IN "
+                    "(SELECT dev, ino, kind FROM hashes ORDER BY seen LIMIT ?)",
+                    (count - self.max_entries,))
+                self.evicted += cur.rowcount
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._pending = []
+            self._seen = []
+            self._db.execute("DELETE FROM hashes")
+            self._db.commit()
+
+    def close(self):
+        self.prune()
+        with self._lock:
+            self._db.close()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "writes": self.writes,
+            "evicted": self.evicted,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,140 @@
+import os
+import mmap
+import hashlib
+import threading
+from collections import defaultdict
+
+from pccleaner.progress import Cancelled
+
+try:
+    import xxhash
+except ImportError:  # xxhash необязателен, без него быстрым считается BLAKE2
+    xxhash = None
+
+CHUNK_SIZE = 1024 * 1024  # полный хеш читаем по 1 МБ
+SAMPLE_SIZE = 64 * 1024  # сколько байт берём с начала и с конца файла
+MMAP_THRESHOLD = 64 * 1024 * 1024  # файлы больше этого по умолчанию читаются через mmap
+MAX_COMPARE_FILES = 64  # больше открытых файлов при побайтовом сравнении не держим
+
+BACKENDS = {
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "blake2b": lambda: hashlib.blake2b(digest_size=16),
+}
+if xxhash is not None:
+    BACKENDS["xxh3"] = xxhash.xxh3_128
+
+# Для отбора кандидатов криптостойкость не нужна, для подтверждения — нужна (или побайтовое сравнение)
+FAST_BACKEND = "xxh3" if xxhash is not None else "blake2b"
+STRONG_BACKEND = "sha1"
+BYTES = "bytes"
+
+_local = threading.local()
+
+
+def new_hasher(backend):
+    try:
+        return BACKENDS[backend]()
+    except KeyError:
+        raise ValueError(f"неизвестный алгоритм хеширования: {backend}")
+
+
+def get_buffer(size=CHUNK_SIZE):
+    # Один буфер на поток, чтобы не создавать новый bytes на каждый блок
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None or len(buffer) < size:
+        buffer = _local.buffer = bytearray(size)
+    return buffer
+
+
+def _check(stop_flag):
+    # Отмена посреди большого файла: частичный хеш не возвращаем, чтобы он не попал в кеш
+    if stop_flag is not None and stop_flag.is_set():
+        raise Cancelled()
+
+
+def hash_file(path, backend=STRONG_BACKEND, chunk_size=CHUNK_SIZE, use_mmap=None, stop_flag=None):
+    h = new_hasher(backend)
+    with open(path, 'rb', buffering=0) as file:
+        size = os.fstat(file.fileno()).st_size
+        if use_mmap is None:
+            use_mmap = size >= MMAP_THRESHOLD
+        if use_mmap and size:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for offset in range(0, size, chunk_size):
+                        _check(stop_flag)
+                        h.update(view[offset:offset + chunk_size])
+                finally:
+                    view.release()
+        else:
+            buffer = get_buffer(chunk_size)
+            view = memoryview(buffer)[:chunk_size]
+            while count := file.readinto(view):
+                _check(stop_flag)
+                h.update(view[:count])
+    return h.hexdigest()
+
+
+def hash_sample(path, size, backend=STRONG_BACKEND, sample_size=SAMPLE_SIZE):
+    # Начало и конец файла: этого обычно хватает, чтобы развести файлы одного размера
+    h = new_hasher(backend)
+    view = memoryview(get_buffer(2 * sample_size))
+    with open(path, 'rb', buffering=0) as file:
+        if sample_covers_file(size, sample_size):
+            count = _read_full(file, view[:size])
+            h.update(view[:count])
+        else:
+            count = _read_full(file, view[:sample_size])
+            file.seek(size - sample_size)
+            count += _read_full(file, view[count:count + sample_size])
+            h.update(view[:count])
+    return h.hexdigest()
+
+
+def _read_full(file, view):
+    total = 0
+    while total < len(view):
+        count = file.readinto(view[total:])
+        if not count:
+            break
+        total += count
+    return total
+
+
+def sample_covers_file(size, sample_size=SAMPLE_SIZE):
+    return size <= 2 * sample_size
+
+
+def partition_identical(paths, chunk_size=256 * 1024, stop_flag=None):
+    # Побайтовое сравнение: читаем файлы одновременно и делим группу по содержимому блоков.
+    # Возвращает только группы из двух и более одинаковых файлов.
+    if len(paths) > MAX_COMPARE_FILES:
+        by_hash = defaultdict(list)
+        for path in paths:
+            by_hash[hash_file(path, stop_flag=stop_flag)].append(path)
+        return [group for group in by_hash.values() if len(group) > 1]
+
+    files = {}
+    try:
+        for path in paths:
+            files[path] = open(path, 'rb')
+        result = []
+        active = [list(paths)]
+        while active:
+            _check(stop_flag)
+            next_active = []
+            for group in active:
+                by_chunk = defaultdict(list)
+                for path in group:
+                    by_chunk[files[path].read(chunk_size)].append(path)
+                for chunk, members in by_chunk.items():
+                    if len(members) < 2:
+                        continue
+                    (next_active if chunk else result).append(members)
+            active = next_active
+        return result
+    finally:
+        for file in files.values():
+            file.close()
@@ -0,0 +1,84 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+
+from pccleaner.config import user_config_dir
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILES = 1000  # сколько крупных файлов запоминаем для восстановления топа
+FULL_RESCAN_AGE = 7 * 86400  # снимок старше недели не используем: файлы могли вырасти без смены mtime папки
+
+
+def snapshot_path(root):
+    root = os.path.normcase(os.path.abspath(root))
+    name = hashlib.sha1(root.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    folder = os.path.join(user_config_dir(), "disk-snapshots")
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, name + ".json.gz")
+
+
+class DiskSnapshot:
+    # Состояние прошлого анализа: для каждой папки mtime, число ссылок (на POSIX это
+    # 2 + число подпапок), собственный размер и подпапки. Неизменённую папку при повторном
+    # анализе можно не читать. Изменение содержимого файла без переименования mtime папки
+    # не меняет, поэтому для точной картины нужен полный анализ (incremental=False).
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.dirs = {}
+        self.files = {}
+
+    def reusable(self, path, st):
+        entry = self.dirs.get(path)
+        if entry is None or entry[0] != st.st_mtime_ns or entry[1] != st.st_nlink:
+            return None
+        return entry
+
+    def totals(self):
+        # Число файлов и размер по прошлому анализу — оценка объёма для ETA
+        return (sum(entry[3] for entry in self.dirs.values()),
+                sum(entry[2] for entry in self.dirs.values()))
+
+    @classmethod
+    def load(cls, root, max_age=FULL_RESCAN_AGE):
+        path = snapshot_path(root)
+        try:
+            if max_age is not None and time.time() - os.stat(path).st_mtime > max_age:
+                return None
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != SNAPSHOT_VERSION or data.get("root") != os.path.abspath(root):
+            return None
+        snapshot = cls(root)
+        paths = []
+        for dir_path, parent, mtime_ns, nlink, own_size, own_files in data["dirs"]:
+            paths.append(dir_path)
+            snapshot.dirs[dir_path] = (mtime_ns, nlink, own_size, own_files, [])
+            if parent >= 0:
+                snapshot.dirs[paths[parent]][4].append(dir_path)
+        for file_path, size in data["files"]:
+            snapshot.files.setdefault(os.path.dirname(file_path), []).append((file_path, size))
+        return snapshot
+
+    @staticmethod
+    def save(usage, nlinks, top_files):
+        index = {}
+        dirs = []
+        for node in usage.tree.nodes():
+            index[node.path] = len(dirs)
+            parent = index[node.parent.path] if node.parent is not None else -1
+            dirs.append([node.path, parent, node.mtime_ns, nlinks.get(node.path, 0), node.own_size, node.own_files])
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "root": usage.tree.root.path,
+            "dirs": dirs,
+            "files": top_files,
+        }
+        path = snapshot_path(usage.tree.root.path)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=1) as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
@@ -0,0 +1,464 @@
+import os
+import json
+import shutil
+import time
+import random
+import subprocess
+import threading
+import concurrent.futures
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+from pccleaner.config import user_config_dir
+
+try:
+    import winreg
+except ImportError:  # не Windows: остаётся файловый поставщик
+    winreg = None
+
+UNINSTALL_KEY = r"Software\Microsoft\Windows\CurrentVersion\Uninstall"
+UNINSTALL_KEY_WOW64 = r"Software\WOW6432Node\Microsoft\Windows\CurrentVersion\Uninstall"
+RUN_KEY = r"Software\Microsoft\Windows\CurrentVersion\Run"
+STARTUP_FOLDER = "folder"
+MAX_WORKERS = 8
+CACHE_VERSION = 1
+
+# key — идентификатор подраздела внутри source, по нему программа перечитывается точечно
+Program = namedtuple("Program", "source key name uninstall_string version publisher")
+StartupItem = namedtuple("StartupItem", "source name command")
+
+
+class InventoryProvider(ABC):
+    # Откуда берутся программы и автозагрузка. Источник (source) — раздел со списком программ
+    # или место автозагрузки; stamp — время последней записи раздела (для папки — mtime),
+    # по нему кеш решает, что перечитывать. Все методы вызываются из нескольких потоков.
+    name = None
+
+    @abstractmethod
+    def program_sources(self):
+        ...
+
+    @abstractmethod
+    def source_stamp(self, source):
+        # None — источника нет
+        ...
+
+    @abstractmethod
+    def program_keys(self, source):
+        ...
+
+    @abstractmethod
+    def program_stamp(self, source, key):
+        ...
+
+    @abstractmethod
+    def read_program(self, source, key):
+        # None — подраздел исчез или это не программа (нет имени или команды удаления)
+        ...
+
+    @abstractmethod
+    def uninstall(self, program):
+        ...
+
+    @abstractmethod
+    def startup_sources(self):
+        ...
+
+    @abstractmethod
+    def read_startup(self, source):
+        ...
+
+    @abstractmethod
+    def disable_startup(self, item):
+        ...
+
+
+def _folder_startup(folder, source):
+    try:
+        names = sorted(os.listdir(folder))
+    except FileNotFoundError:
+        return []
+    return [StartupItem(source, name, os.path.join(folder, name)) for name in names]
+
+
+def _mtime(folder):
+    try:
+        return os.stat(folder).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class WinregProvider(InventoryProvider):
+    # Реестр Windows. Каждый раздел открывается через with и закрывается сразу после чтения;
+    # winreg отпускает GIL на время системных вызовов, поэтому подразделы читаются параллельно.
+    name = "winreg"
+
+    def __init__(self):
+        self.hives = {"HKLM": winreg.HKEY_LOCAL_MACHINE, "HKCU": winreg.HKEY_CURRENT_USER}
+        self.startup_folder = os.path.join(os.getenv("APPDATA", ""), "Microsoft", "Windows", "Start Menu",
+                                           "Programs", "Startup")
+
+    def _open(self, source, key=None, access=None):
+        hive, _, path = source.partition("\\")
+        if key:
+            path = path + "\\" + key
+        return winreg.OpenKey(self.hives[hive], path, 0, access or winreg.KEY_READ)
+
+    def program_sources(self):
+        return ["HKLM\\" + UNINSTALL_KEY, "HKLM\\" + UNINSTALL_KEY_WOW64, "HKCU\\" + UNINSTALL_KEY]
+
+    def source_stamp(self, source):
+        if source == STARTUP_FOLDER:
+            return _mtime(self.startup_folder)
+        try:
+            with self._open(source) as key:
+                return winreg.QueryInfoKey(key)[2]
+        except OSError:
+            return None
+
+    def program_keys(self, source):
+        try:
+            with self._open(source) as key:
+                return [winreg.EnumKey(key, i) for i in range(winreg.QueryInfoKey(key)[0])]
+        except OSError:
+            return []
+
+    def program_stamp(self, source, key):
+        try:
+            with self._open(source, key) as subkey:
+                return winreg.QueryInfoKey(subkey)[2]
+        except OSError:
+            return None
+
+    def read_program(self, source, key):
+        try:
+            with self._open(source, key) as subkey:
+                values = {}
+                for name in ("DisplayName", "UninstallString", "DisplayVersion", "Publisher"):
+                    try:
+                        values[name] = winreg.QueryValueEx(subkey, name)[0]
+                    except OSError:
+                        values[name] = None
+        except OSError:
+            return None
+        if not values["DisplayName"] or not values["UninstallString"]:
+            return None
+        return Program(source, key, values["DisplayName"], values["UninstallString"], values["DisplayVersion"],
+                       values["Publisher"])
+
+    def uninstall(self, program):
+        subprocess.run(program.uninstall_string, shell=True, check=True)
+
+    def startup_sources(self):
+        return [STARTUP_FOLDER, "HKCU\\" + RUN_KEY, "HKLM\\" + RUN_KEY]
+
+    def read_startup(self, source):
+        if source == STARTUP_FOLDER:
+            return _folder_startup(self.startup_folder, source)
+        try:
+            with self._open(source) as key:
+                items = []
+                for i in range(winreg.QueryInfoKey(key)[1]):
+                    name, value, _ = winreg.EnumValue(key, i)
+                    items.append(StartupItem(source, name, value))
+                return items
+        except OSError:
+            return []
+
+    def disable_startup(self, item):
+        if item.source == STARTUP_FOLDER:
+            os.remove(item.command)
+            return
+        with self._open(item.source, access=winreg.KEY_SET_VALUE) as key:
+            winreg.DeleteValue(key, item.name)
+
+
+class FileProvider(InventoryProvider):
+    # Поддельный реестр в папке, чтобы инвентарь работал и замерялся не на Windows:
+    #   uninstall/<раздел>/<подраздел>/values.json — значения программы (mtime файла — время записи)
+    #   run/<раздел>.json — {имя: команда}
+    #   startup/ — файлы папки автозагрузки
+    # Источники называются относительными путями ("uninstall/HKLM", "run/HKCU"); время записи
+    # источника программ — mtime его папки, оно меняется при добавлении и удалении подразделов.
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.name = f"file:{self.root}"
+
+    def _path(self, source, *parts):
+        if source == STARTUP_FOLDER:
+            return os.path.join(self.root, "startup", *parts)
+        return os.path.join(self.root, *source.split("/"), *parts)
+
+    def _list(self, folder):
+        try:
+            return sorted(os.listdir(os.path.join(self.root, folder)))
+        except FileNotFoundError:
+            return []
+
+    def program_sources(self):
+        return ["uninstall/" + name for name in self._list("uninstall")]
+
+    def source_stamp(self, source):
+        if source.startswith("run/"):
+            return _mtime(self._path(source) + ".json")
+        return _mtime(self._path(source))
+
+    def program_keys(self, source):
+        try:
+            return sorted(os.listdir(self._path(source)))
+        except FileNotFoundError:
+            return []
+
+    def program_stamp(self, source, key):
+        return _mtime(self._path(source, key, "values.json"))
+
+    def read_program(self, source, key):
+        try:
+            with open(self._path(source, key, "values.json"), encoding="utf-8") as f:
+                values = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not values.get("DisplayName") or not values.get("UninstallString"):
+            return None
+        return Program(source, key, values["DisplayName"], values["UninstallString"], values.get("DisplayVersion"),
+                       values.get("Publisher"))
+
+    def uninstall(self, program):
+        shutil.rmtree(self._path(program.source, program.key))
+
+    def startup_sources(self):
+        return [STARTUP_FOLDER] + ["run/" + name[:-5] for name in self._list("run") if name.endswith(".json")]
+
+    def read_startup(self, source):
+        if source == STARTUP_FOLDER:
+            return _folder_startup(self._path(source), source)
+        try:
+            with open(self._path(source) + ".json", encoding="utf-8") as f:
+                values = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return [StartupItem(source, name, command) for name, command in values.items()]
+
+    def disable_startup(self, item):
+        if item.source == STARTUP_FOLDER:
+            os.remove(item.command)
+            return
+        path = self._path(item.source) + ".json"
+        with open(path, encoding="utf-8") as f:
+            values = json.load(f)
+        del values[item.name]
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(values, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def generate_fake_inventory(root, programs=500, run_values=20, startup_files=5, seed=42):
+    # Папка для FileProvider с programs программами в двух источниках
+    rng = random.Random(seed)
+    for i in range(programs):
+        folder = os.path.join(root, "uninstall", rng.choice(["HKLM", "HKCU"]), f"{{{i:08d}-fake}}")
+        os.makedirs(folder, exist_ok=True)
+        values = {"DisplayName": f"Program {i}", "UninstallString": f"uninstall.exe /id {i}",
+                  "DisplayVersion": f"{rng.randint(1, 20)}.{rng.randint(0, 9)}", "Publisher": f"Vendor {i % 37}"}
+        with open(os.path.join(folder, "values.json"), "w", encoding="utf-8") as f:
+            json.dump(values, f)
+    os.makedirs(os.path.join(root, "run"), exist_ok=True)
+    for source in ("HKCU", "HKLM"):
+        with open(os.path.join(root, "run", source + ".json"), "w", encoding="utf-8") as f:
+            json.dump({f"{source} autorun {i}": f"autorun{i}.exe" for i in range(run_values)}, f)
+    os.makedirs(os.path.join(root, "startup"), exist_ok=True)
+    for i in range(startup_files):
+        open(os.path.join(root, "startup", f"shortcut{i}.lnk"), "wb").close()
+    return root
+
+
+def default_provider():
+    # На Windows — реестр; иначе поддельный реестр из PCCLEANER_INVENTORY, если он задан
+    if winreg is not None:
+        return WinregProvider()
+    root = os.environ.get("PCCLEANER_INVENTORY")
+    return FileProvider(root) if root else None
+
+
+def default_cache_path():
+    return os.path.join(user_config_dir(), "inventory-cache.json")
+
+
+class InventoryStats:
+    def __init__(self):
+        self.sources = 0
+        self.sources_reused = 0
+        self.keys = 0
+        self.keys_read = 0
+        self.keys_reused = 0
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class Inventory:
+    # Кеш программ и автозагрузки поверх поставщика. Повторный запрос перечитывает только
+    # подразделы, у которых изменилось время последней записи; источник автозагрузки
+    # перечитывается целиком, только если изменился он сам. После удаления программы или
+    # отключения автозагрузки обновляется одна запись, а не весь список.
+    def __init__(self, provider, cache_path=None, max_workers=MAX_WORKERS):
+        self.provider = provider
+        self.cache_path = cache_path
+        self.max_workers = max_workers
+        self.stats = InventoryStats()
+        self._programs = {}  # source -> {"stamp": ..., "keys": {key: [stamp, Program]}}
+        self._startup = {}  # source -> {"stamp": ..., "items": [StartupItem]}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CACHE_VERSION or data.get("provider") != self.provider.name:
+            return
+        try:
+            programs, startup = {}, {}
+            for source, entry in data.get("programs", {}).items():
+                # None — подраздел без программы (обновление, запись без DisplayName)
+                keys = {key: [stamp, Program(*fields) if fields else None]
+                        for key, (stamp, fields) in entry["keys"].items()}
+                programs[source] = {"stamp": entry["stamp"], "keys": keys}
+            for source, entry in data.get("startup", {}).items():
+                startup[source] = {"stamp": entry["stamp"], "items": [StartupItem(*item) for item in entry["items"]]}
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return  # испорченный кеш просто не используется
+        self._programs, self._startup = programs, startup
+
+    def save(self):
+        if not self.cache_path or not self._dirty:
+            return
+        with self._lock:
+            data = {
+                "version": CACHE_VERSION,
+                "provider": self.provider.name,
+                "programs": {source: {"stamp": entry["stamp"],
+                                      "keys": {key: [stamp, list(program) if program else None]
+                                               for key, (stamp, program) in entry["keys"].items()}}
+                             for source, entry in self._programs.items()},
+                "startup": {source: {"stamp": entry["stamp"], "items": [list(item) for item in entry["items"]]}
+                            for source, entry in self._startup.items()},
+            }
+            self._dirty = False
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.cache_path)
+
+    def _read_key(self, source, key, cached):
+        stamp = self.provider.program_stamp(source, key)
+        if stamp is None:
+            return key, None, None, False
+        if cached is not None and cached[0] == stamp:
+            return key, stamp, cached[1], False
+        return key, stamp, self.provider.read_program(source, key), True
+
+    def programs(self):
+        # Список программ по имени; подразделы проверяются параллельно
+        start = time.perf_counter()
+        stats = InventoryStats()
+        sources = self.provider.program_sources()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for source in sources:
+                stats.sources += 1
+                stamp = self.provider.source_stamp(source)
+                cached = self._programs.get(source)
+                if stamp is None:
+                    if self._programs.pop(source, None) is not None:
+                        self._dirty = True
+                    continue
+                old_keys = cached["keys"] if cached else {}
+                if cached and cached["stamp"] == stamp:
+                    # Набор подразделов не менялся — перечислять раздел не нужно
+                    stats.sources_reused += 1
+                    names = list(old_keys)
+                else:
+                    names = self.provider.program_keys(source)
+                keys = {}
+                changed = not cached or cached["stamp"] != stamp
+                for key, key_stamp, program, read in executor.map(
+                        lambda key: self._read_key(source, key, old_keys.get(key)), names):
+                    stats.keys += 1
+                    if key_stamp is None:
+                        continue
+                    keys[key] = [key_stamp, program]
+                    if read:
+                        stats.keys_read += 1
+                        changed = True
+                    else:
+                        stats.keys_reused += 1
+                if changed or len(keys) != len(old_keys):
+                    self._dirty = True
+                with self._lock:
+                    self._programs[source] = {"stamp": stamp, "keys": keys}
+        for source in set(self._programs) - set(sources):
+            del self._programs[source]
+            self._dirty = True
+        stats.elapsed = time.perf_counter() - start
+        self.stats = stats
+        return self.cached_programs()
+
+    def cached_programs(self):
+        with self._lock:
+            programs = [program for entry in self._programs.values() for _, program in entry["keys"].values()
+                        if program is not None]
+        return sorted(programs, key=lambda program: (program.name.lower(), program.source, program.key))
+
+    def startup_items(self):
+        result = []
+        for source in self.provider.startup_sources():
+            stamp = self.provider.source_stamp(source)
+            cached = self._startup.get(source)
+            if stamp is None:
+                if self._startup.pop(source, None) is not None:
+                    self._dirty = True
+                continue
+            if cached is None or cached["stamp"] != stamp:
+                cached = {"stamp": stamp, "items": self.provider.read_startup(source)}
+                with self._lock:
+                    self._startup[source] = cached
+                self._dirty = True
+            result.extend(cached["items"])
+        return result
+
+    def refresh_program(self, program):
+        # Точечное обновление после удаления: перечитывается один подраздел. Время записи источника
+        # сбрасывается, а не перечитывается: иначе подразделы, добавленные тем временем, не заметить
+        entry = self._programs.get(program.source)
+        key, stamp, current, _ = self._read_key(program.source, program.key, None)
+        with self._lock:
+            if entry is not None:
+                entry["stamp"] = None
+                if stamp is None:
+                    entry["keys"].pop(key, None)
+                else:
+                    entry["keys"][key] = [stamp, current]
+            self._dirty = True
+        return current
+
+    def uninstall(self, program):
+        # True — программы больше нет в списке; исключения поставщика (отказ деинсталлятора) пробрасываются
+        try:
+            self.provider.uninstall(program)
+        finally:
+            current = self.refresh_program(program)
+        return current is None
+
+    def disable_startup(self, item):
+        self.provider.disable_startup(item)
+        with self._lock:
+            self._startup.pop(item.source, None)
+            self._dirty = True
+        return self.startup_items()
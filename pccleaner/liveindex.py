@@ -0,0 +1,712 @@
+import os
+import sys
+import stat
+import time
+import errno
+import select
+import struct
+import secrets
+import threading
+from collections import namedtuple
+
+from pccleaner import hashing
+from pccleaner.config import user_config_dir
+from pccleaner.devices import plan_devices
+from pccleaner.walker import walk_roots
+
+DEFAULT_MAX_FILES = 1_000_000  # сколько файлов индекс помнит поимённо; суммы по папкам — всегда полные
+QUIET_DELAY = 0.5  # изменения применяются, когда события стихли на столько секунд...
+MAX_DELAY = 3.0  # ...но не реже, чем раз в столько секунд при непрерывном потоке событий
+POLL_INTERVAL = 5.0  # период опроса папок без inotify
+RECONCILE_INTERVAL = 600.0  # без inotify изменения внутри файлов видны только при полной сверке
+HASH_BUDGET = 1.0  # сколько секунд за цикл можно хешировать кандидатов в дубликаты
+PIPE_ADDRESS = r"\\.\pipe\pc-cleaner-live-index"
+
+# inotify(7)
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+              | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+EVENT_HEADER = struct.Struct("iIII")
+
+FileEntry = namedtuple("FileEntry", "size mtime_ns inode")
+
+
+class _Dir:
+    __slots__ = ("path", "parent", "children", "files", "own_size", "own_files", "total_size", "total_files",
+                 "mtime_ns", "dev")
+
+    def __init__(self, path, parent, mtime_ns, dev):
+        self.path = path
+        self.parent = parent
+        self.children = {}
+        self.files = {}  # только файлы не меньше min_tracked_size
+        self.own_size = 0
+        self.own_files = 0
+        self.total_size = 0
+        self.total_files = 0
+        self.mtime_ns = mtime_ns
+        self.dev = dev
+
+
+class PollingWatcher:
+    # Запасной вариант без inotify: раз в interval сверяем mtime папок (видно создание,
+    # удаление и переименование файлов), раз в reconcile_interval помечаем изменёнными все папки
+    kind = "polling"
+
+    def __init__(self, interval=POLL_INTERVAL, reconcile_interval=RECONCILE_INTERVAL):
+        self.interval = interval
+        self.reconcile_interval = reconcile_interval
+        self.dirs = {}
+        self._next_poll = time.monotonic() + interval
+        self._next_reconcile = time.monotonic() + reconcile_interval
+
+    def add(self, path, mtime_ns):
+        self.dirs[path] = mtime_ns
+
+    def remove(self, path):
+        self.dirs.pop(path, None)
+
+    def read(self, timeout):
+        # -> (изменённые папки, нужна ли полная пересборка)
+        now = time.monotonic()
+        if now < self._next_poll:
+            time.sleep(min(timeout, self._next_poll - now))
+            return set(), False
+        self._next_poll = now + self.interval
+        if now >= self._next_reconcile:
+            self._next_reconcile = now + self.reconcile_interval
+            return set(self.dirs), False
+        dirty = set()
+        for path, mtime_ns in list(self.dirs.items()):
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime_ns:
+                self.dirs[path] = current
+                dirty.add(path)
+        return dirty, False
+
+    def close(self):
+        self.dirs.clear()
+
+
+class InotifyWatcher:
+    # Одно наблюдение на папку. События внутри папки превращаются в «папка изменилась»:
+    # дальше индекс перечитывает её целиком, поэтому шторм событий по одной папке стоит одного scandir
+    kind = "inotify"
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._ctypes = ctypes
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        self.paths = {}
+        self.wds = {}
+
+    def add(self, path, mtime_ns=None):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            code = self._ctypes.get_errno()
+            raise OSError(code, os.strerror(code), path)
+        self.paths[wd] = path
+        self.wds[path] = wd
+
+    def remove(self, path):
+        wd = self.wds.pop(path, None)
+        if wd is not None:
+            self.paths.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set(), False
+        dirty = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 256 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                path = self.paths.get(wd)
+                if path is None:
+                    continue
+                if mask & IN_IGNORED:
+                    # Папку удалили или перенесли: наблюдение снято ядром, изменения увидит родитель
+                    self.paths.pop(wd, None)
+                    self.wds.pop(path, None)
+                    path = os.path.dirname(path)
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    path = os.path.dirname(path)
+                dirty.add(path)
+        return dirty, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(polling=False):
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher()
+
+
+class LiveIndex:
+    # Индекс размеров и хешей в памяти, который поддерживается актуальным по событиям ФС.
+    # Память ограничена: поимённо хранятся не больше max_files файлов; если их больше,
+    # мелкие файлы забываются (min_tracked_size растёт), но остаются в суммах по папкам.
+    # Поэтому «большие файлы» и дубликаты ищутся среди файлов от min_tracked_size и выше.
+    def __init__(self, roots, max_files=DEFAULT_MAX_FILES, cache=None, watcher=None, on_error=None,
+                 hash_backend=hashing.STRONG_BACKEND, budgets=None):
+        # Вложенные корни на том же устройстве отбрасываются, как и при обычном обходе
+        skipped = plan_devices(roots, budgets)[1]
+        self.roots = [root for root in dict.fromkeys(os.path.abspath(root) for root in roots) if root not in skipped]
+        self.max_files = max_files
+        self.cache = cache
+        self.on_error = on_error
+        self.hash_backend = hash_backend
+        self.budgets = budgets
+        self.watcher = watcher or make_watcher()
+        self.dirs = {}
+        self.min_tracked_size = 0
+        self.tracked = 0
+        self.by_size = {}  # размер -> {(папка, имя)}
+        self._sizes = []  # отсортированные размеры из by_size; None — пересортировать при следующем чтении
+        self.digests = {}  # (папка, имя) -> (size, mtime_ns, digest)
+        self.lock = threading.RLock()
+        self.events = 0
+        self.rescans = 0
+        self.updated = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- построение и обновление ---
+
+    def build(self, stop_flag=None):
+        # Индекс строится заново в отдельном объекте и подменяется целиком: запросы во время
+        # долгого обхода получают прежние данные, а не ждут блокировку
+        fresh = LiveIndex(self.roots, self.max_files, watcher=self.watcher, on_error=self.on_error,
+                          hash_backend=self.hash_backend, budgets=self.budgets)
+        fresh._populate(stop_flag)
+        with self.lock:
+            for path in set(self.dirs) - set(fresh.dirs):
+                fresh.watcher.remove(path)
+            # Уже посчитанные хеши неизменившихся файлов переносятся в новый индекс
+            for key, known in self.digests.items():
+                node = fresh.dirs.get(key[0])
+                entry = node.files.get(key[1]) if node is not None else None
+                if entry is not None and (entry.size, entry.mtime_ns) == known[:2]:
+                    fresh.digests[key] = known
+            self.watcher = fresh.watcher
+            self.dirs = fresh.dirs
+            self.min_tracked_size = fresh.min_tracked_size
+            self.tracked = fresh.tracked
+            self.by_size = fresh.by_size
+            self._sizes = fresh._sizes
+            self.digests = fresh.digests
+            self.updated = time.time()
+
+    def _populate(self, stop_flag):
+        # Первичный обход всех корней (по устройствам параллельно), затем сверка mtime папок:
+        # то, что изменилось между чтением папки и постановкой наблюдения, перечитывается.
+        # Подпапки обходятся параллельно, поэтому запись может прийти раньше своей папки: ждёт в orphans
+        orphans = {}
+        for root, batch in walk_roots(self.roots, include_dirs=True, with_inode=True, stop_flag=stop_flag,
+                                      on_error=self.on_error, budgets=self.budgets):
+            for record in batch:
+                self._add_record(record, orphans)
+        for node in list(self.dirs.values()):
+            try:
+                if os.stat(node.path).st_mtime_ns != node.mtime_ns:
+                    self.refresh(node.path)
+            except OSError:
+                self.refresh(node.path)
+
+    def _add_record(self, record, orphans):
+        if record.path not in self.roots and os.path.dirname(record.path) not in self.dirs:
+            orphans.setdefault(os.path.dirname(record.path), []).append(record)
+            return
+        if not record.is_dir:
+            self._add_file(record.path, record.size, record.mtime_ns, record.inode)
+            return
+        self._add_dir(record.path, record.mtime_ns, record.dev)
+        for orphan in orphans.pop(record.path, ()):
+            self._add_record(orphan, orphans)
+
+    def _add_dir(self, path, mtime_ns, dev):
+        parent = self.dirs.get(os.path.dirname(path)) if path not in self.roots else None
+        node = _Dir(path, parent, mtime_ns, dev)
+        if parent is not None:
+            parent.children[os.path.basename(path)] = node
+        self.dirs[path] = node
+        self._watch(node)
+        return node
+
+    def _watch(self, node):
+        try:
+            self.watcher.add(node.path, node.mtime_ns)
+        except OSError as e:
+            if e.errno != errno.ENOSPC or isinstance(self.watcher, PollingWatcher):
+                if self.on_error:
+                    self.on_error(node.path, e)
+                return
+            # Кончился лимит fs.inotify.max_user_watches: переходим на опрос для всех папок
+            if self.on_error:
+                self.on_error(node.path, e)
+            self.watcher.close()
+            self.watcher = PollingWatcher()
+            for other in self.dirs.values():
+                self.watcher.add(other.path, other.mtime_ns)
+
+    def _add_file(self, path, size, mtime_ns, inode):
+        node = self.dirs[os.path.dirname(path)]
+        self._resize(node, size, 1)
+        if size >= self.min_tracked_size:
+            self._track(node, os.path.basename(path), FileEntry(size, mtime_ns, inode))
+
+    def _resize(self, node, size, files):
+        node.own_size += size
+        node.own_files += files
+        while node is not None:
+            node.total_size += size
+            node.total_files += files
+            node = node.parent
+
+    def _track(self, node, name, entry):
+        node.files[name] = entry
+        key = (node.path, name)
+        paths = self.by_size.get(entry.size)
+        if paths is None:
+            paths = self.by_size[entry.size] = set()
+            # Вставка в отсортированный список стоит O(n) на каждый новый размер; при первичном
+            # обходе это квадратично, поэтому список просто сбрасывается и сортируется при чтении
+            self._sizes = None
+        paths.add(key)
+        self.tracked += 1
+        if self.tracked > self.max_files:
+            self._shrink()
+
+    def _untrack(self, node, name):
+        entry = node.files.pop(name)
+        key = (node.path, name)
+        paths = self.by_size[entry.size]
+        paths.discard(key)
+        if not paths:
+            del self.by_size[entry.size]
+            self._sizes = None
+        self.digests.pop(key, None)
+        self.tracked -= 1
+
+    def _shrink(self):
+        # Забываем самые мелкие файлы, пока не останется 90% от max_files
+        excess = self.tracked - int(self.max_files * 0.9)
+        sizes = self._sorted_sizes()
+        cut = 0
+        for i, size in enumerate(sizes):
+            excess -= len(self.by_size[size])
+            if excess <= 0:
+                cut = i + 1
+                break
+        for size in sizes[:cut]:
+            for folder, name in list(self.by_size[size]):
+                self._untrack(self.dirs[folder], name)
+        self._sizes = sizes[cut:]
+        if self._sizes:
+            self.min_tracked_size = max(self.min_tracked_size, self._sizes[0])
+
+    def _sorted_sizes(self):
+        if self._sizes is None:
+            self._sizes = sorted(self.by_size)
+        return self._sizes
+
+    def _drop(self, path):
+        # Убирает поддерево из индекса и суммы родителей
+        node = self.dirs.get(path)
+        if node is None:
+            return
+        if node.parent is not None:
+            node.parent.children.pop(os.path.basename(path), None)
+            parent = node.parent
+            while parent is not None:
+                parent.total_size -= node.total_size
+                parent.total_files -= node.total_files
+                parent = parent.parent
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            stack.extend(current.children.values())
+            for name in list(current.files):
+                self._untrack(current, name)
+            self.watcher.remove(current.path)
+            self.dirs.pop(current.path, None)
+
+    def refresh(self, path):
+        # Перечитывает одну папку (без рекурсии): суммы, файлы, появившиеся и исчезнувшие подпапки
+        node = self.dirs.get(path)
+        if node is None:
+            return
+        files = {}
+        subdirs = {}
+        try:
+            dir_st = os.stat(path)
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_symlink():
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if stat.S_ISDIR(st.st_mode):
+                        if os.name == "nt" or st.st_dev == node.dev:
+                            subdirs[entry.name] = st
+                    elif stat.S_ISREG(st.st_mode):
+                        files[entry.name] = FileEntry(st.st_size, st.st_mtime_ns, st.st_ino)
+        except FileNotFoundError:
+            if node.parent is not None:
+                self.refresh(node.parent.path)
+            else:
+                self._drop(path)
+            return
+        except OSError as e:
+            if self.on_error:
+                self.on_error(path, e)
+            return
+        node.mtime_ns = dir_st.st_mtime_ns
+        self._resize(node, sum(entry.size for entry in files.values()) - node.own_size,
+                     len(files) - node.own_files)
+        for name, old in list(node.files.items()):
+            if files.get(name) != old:
+                self._untrack(node, name)
+        for name, entry in files.items():
+            if name not in node.files and entry.size >= self.min_tracked_size:
+                self._track(node, name, entry)
+        for name in list(node.children):
+            if name not in subdirs:
+                self._drop(node.children[name].path)
+        for name, st in subdirs.items():
+            if name not in node.children:
+                self._scan_subtree(os.path.join(path, name), st)
+        if isinstance(self.watcher, PollingWatcher):
+            self.watcher.add(path, node.mtime_ns)
+
+    def _scan_subtree(self, path, st):
+        # Новая (или перенесённая сюда) папка: наблюдение ставим до чтения, чтобы не упустить изменения
+        self._add_dir(path, st.st_mtime_ns, st.st_dev)
+        self.refresh(path)
+
+    def apply(self, dirty):
+        # Родители раньше детей: если родитель удалил подпапку, перечитывать её уже не нужно
+        with self.lock:
+            for path in sorted(dirty, key=lambda path: path.count(os.sep)):
+                self.refresh(path)
+            self.updated = time.time()
+
+    def hash_pending(self, budget=HASH_BUDGET, min_size=1):
+        # Дохешировать кандидатов в дубликаты (одинаковый размер), не дольше budget секунд
+        deadline = time.monotonic() + budget
+        kind = f"full:{self.hash_backend}"
+        for key, entry, dev in self._unhashed(min_size):
+            if time.monotonic() > deadline or self._stop.is_set():
+                return False
+            path = os.path.join(*key)
+            digest = self.cache.get(dev, entry.inode, entry.size, entry.mtime_ns, kind) if self.cache else None
+            if digest is None:
+                try:
+                    digest = hashing.hash_file(path, self.hash_backend, stop_flag=self._stop)
+                except OSError:
+                    continue
+                except hashing.Cancelled:
+                    return False
+                if self.cache is not None:
+                    self.cache.put(dev, entry.inode, entry.size, entry.mtime_ns, kind, digest)
+            with self.lock:
+                node = self.dirs.get(key[0])
+                if node is not None and node.files.get(key[1]) == entry:
+                    self.digests[key] = (entry.size, entry.mtime_ns, digest)
+        return True
+
+    def _unhashed(self, min_size):
+        with self.lock:
+            pending = []
+            for size, keys in self.by_size.items():
+                if size < min_size or len(keys) < 2:
+                    continue
+                for key in keys:
+                    if key not in self.digests:
+                        node = self.dirs[key[0]]
+                        pending.append((key, node.files[key[1]], node.dev))
+        return pending
+
+    # --- фоновый режим ---
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.watcher.close()
+
+    def run(self):
+        # События копятся в множестве папок и применяются пачкой после затишья (QUIET_DELAY)
+        # или не позже MAX_DELAY; при переполнении очереди inotify — полный пересчёт
+        self.build(self._stop)
+        dirty = set()
+        first = last = None
+        hashed = False
+        while not self._stop.is_set():
+            changed, overflow = self.watcher.read(0.2 if dirty or not hashed else 1.0)
+            now = time.monotonic()
+            if overflow:
+                self.rescans += 1
+                dirty.clear()
+                self.build(self._stop)
+                hashed = False
+                continue
+            if changed:
+                self.events += len(changed)
+                dirty |= changed
+                first = first or now
+                last = now
+            if dirty and (now - last >= QUIET_DELAY or now - first >= MAX_DELAY):
+                batch, dirty = dirty, set()
+                first = last = None
+                self.apply(batch)
+                hashed = False
+            elif not dirty and not hashed:
+                hashed = self.hash_pending()
+                if hashed and self.cache is not None:
+                    self.cache.flush()
+
+    # --- запросы ---
+
+    def covers(self, path):
+        path = os.path.abspath(path)
+        return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in self.roots)
+
+    def usage(self, path=None, limit=20):
+        with self.lock:
+            node = self.dirs.get(os.path.abspath(path)) if path else None
+            if node is None and path:
+                return None
+            nodes = [node] if node is not None else [self.dirs[root] for root in self.roots if root in self.dirs]
+            children = []
+            for current in nodes:
+                children.extend(current.children.values())
+            children.sort(key=lambda child: child.total_size, reverse=True)
+            return {
+                "path": path or self.roots,
+                "total_size": sum(current.total_size for current in nodes),
+                "files": sum(current.total_files for current in nodes),
+                "own_size": sum(current.own_size for current in nodes),
+                "children": [{"path": child.path, "size": child.total_size, "files": child.total_files}
+                             for child in children[:limit]],
+            }
+
+    def large_files(self, limit=100, min_size=0, path=None):
+        # Самые большие файлы (в пределах path, если задан); файлы меньше min_tracked_size индекс не знает
+        prefix = os.path.abspath(path).rstrip(os.sep) + os.sep if path else None
+        with self.lock:
+            result = []
+            for size in reversed(self._sorted_sizes()):
+                if size < min_size or len(result) >= limit:
+                    break
+                for folder, name in sorted(self.by_size[size]):
+                    if prefix is None or (folder + os.sep).startswith(prefix):
+                        result.append((os.path.join(folder, name), size))
+            return result[:limit]
+
+    def duplicates(self, min_size=1):
+        # {(размер, хеш): [пути]} по уже посчитанным хешам; pending — сколько кандидатов ещё не хешировано
+        with self.lock:
+            groups = {}
+            pending = 0
+            for size, keys in self.by_size.items():
+                if size < min_size or len(keys) < 2:
+                    continue
+                for key in keys:
+                    known = self.digests.get(key)
+                    if known is None:
+                        pending += 1
+                        continue
+                    groups.setdefault((size, known[2]), []).append(os.path.join(*key))
+            duplicates = {key: sorted(paths) for key, paths in groups.items() if len(paths) > 1}
+            return duplicates, pending
+
+    def status(self):
+        with self.lock:
+            return {
+                "roots": self.roots,
+                "dirs": len(self.dirs),
+                "files": sum(self.dirs[root].total_files for root in self.roots if root in self.dirs),
+                "tracked_files": self.tracked,
+                "min_tracked_size": self.min_tracked_size,
+                "hashed": len(self.digests),
+                "watcher": self.watcher.kind,
+                "events": self.events,
+                "rescans": self.rescans,
+                "updated": self.updated,
+            }
+
+
+# --- доступ из других процессов ---
+
+def service_address():
+    if os.name == "nt":
+        return PIPE_ADDRESS
+    return os.path.join(user_config_dir(), "live-index.sock")
+
+
+def _key_path():
+    return os.path.join(user_config_dir(), "live-index.key")
+
+
+def handle_request(index, request):
+    query = request.get("query")
+    if query == "usage":
+        usage = index.usage(request.get("path"), request.get("limit", 20))
+        if usage is None:
+            raise ValueError(f"папка не в индексе: {request['path']}")
+        return usage
+    if query == "large":
+        path, min_size = request.get("path"), request.get("min_size", 0)
+        if path and not index.covers(path):
+            raise ValueError(f"папка не в индексе: {path}")
+        # Файлы меньше min_tracked_size индекс поимённо не хранит: порог поднимается до него
+        min_size = max(min_size, index.min_tracked_size)
+        return [{"path": path, "size": size}
+                for path, size in index.large_files(request.get("limit", 100), min_size, path)]
+    if query == "dupes":
+        duplicates, pending = index.duplicates(max(request.get("min_size", 1), 1))
+        return {"pending": pending,
+                "groups": [{"size": size, "digest": digest, "paths": paths}
+                           for (size, digest), paths in sorted(duplicates.items(), reverse=True)]}
+    if query == "status":
+        return index.status()
+    raise ValueError(f"неизвестный запрос: {query}")
+
+
+def serve(index, stop_flag, address=None):
+    # Отвечает на запросы по локальному сокету (named pipe на Windows); ключ доступа — в файле
+    # с правами только для владельца, клиент читает его оттуда. Проверка ключа идёт в потоке
+    # клиента: зависший или чужой клиент не мешает принимать остальных
+    from multiprocessing import AuthenticationError
+    from multiprocessing.connection import Listener, answer_challenge, deliver_challenge
+
+    address = address or service_address()
+    authkey = secrets.token_bytes(32)
+    key_path = _key_path()
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+    if os.name != "nt" and os.path.exists(address):
+        os.unlink(address)
+    listener = Listener(address)
+
+    def client(conn):
+        with conn:
+            try:
+                deliver_challenge(conn, authkey)
+                answer_challenge(conn, authkey)
+                while True:
+                    request = conn.recv()
+                    try:
+                        conn.send({"ok": True, "result": handle_request(index, request)})
+                    except Exception as e:
+                        conn.send({"ok": False, "error": str(e)})
+            except (AuthenticationError, EOFError, OSError):
+                pass
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                if stop_flag.is_set():
+                    return
+                continue
+            threading.Thread(target=client, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    try:
+        stop_flag.wait()
+    finally:
+        listener.close()
+        for path in (key_path, address if os.name != "nt" else None):
+            if path:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+
+def _query(request, address):
+    from multiprocessing import AuthenticationError
+    from multiprocessing.connection import Client
+
+    try:
+        with open(_key_path(), "rb") as f:
+            authkey = f.read()
+        conn = Client(address or service_address(), authkey=authkey)
+    except (OSError, EOFError, AuthenticationError):
+        return None
+    with conn:
+        conn.send(request)
+        response = conn.recv()
+    if not response["ok"]:
+        raise RuntimeError(response["error"])
+    return response["result"]
+
+
+def query(request, address=None, timeout=None):
+    # None, если фоновый индекс не запущен или не ответил за timeout секунд (вместе с подключением
+    # и проверкой ключа): запрос идёт в отдельном потоке, зависший индекс не держит вызывающего
+    if timeout is None:
+        return _query(request, address)
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = _query(request, address)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("result")
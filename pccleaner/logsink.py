@@ -0,0 +1,130 @@
+import json
+import time
+import queue
+import threading
+from collections import deque
+
+
+class LogRecord:
+    __slots__ = ("ts", "level", "message")
+
+    def __init__(self, ts, level, message):
+        self.ts = ts
+        self.level = level
+        self.message = message
+
+    def as_dict(self):
+        return {"ts": self.ts, "level": self.level, "message": self.message}
+
+
+def coalesce(records):
+    # Подряд идущие одинаковые сообщения -> (сообщение, сколько раз)
+    result = []
+    for record in records:
+        if result and result[-1][0] == record.message:
+            result[-1][1] += 1
+        else:
+            result.append([record.message, 1])
+    return result
+
+
+class LogPipeline:
+    # Рабочие потоки только кладут записи в очередь; раздача по приёмникам идёт пачками
+    # из одного места: таймера GUI (pump) или фонового потока (start).
+    def __init__(self, max_batch=5000):
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._sinks = []
+        self._pump_lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def add_sink(self, sink):
+        self._sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        self._sinks.remove(sink)
+
+    def emit(self, message, level="info"):
+        self._queue.put(LogRecord(time.time(), level, message))
+
+    def pump(self):
+        with self._pump_lock:
+            records = []
+            while len(records) < self.max_batch:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if records:
+                for sink in list(self._sinks):
+                    sink.write(records)
+            return len(records)
+
+    def flush(self):
+        while self.pump():
+            pass
+        for sink in list(self._sinks):
+            flush = getattr(sink, "flush", None)
+            if flush:
+                flush()
+
+    def start(self, interval=0.2):
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stopped.wait(interval):
+                self.pump()
+            self.flush()
+
+        self._thread = threading.Thread(target=run, name="log-pipeline", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+class StreamSink:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, records):
+        self.stream.write("".join(record.message + "\n" for record in records))
+
+    def flush(self):
+        self.stream.flush()
+
+
+class FileSink:
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, records):
+        self.file.write("".join(
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.ts))} [{record.level}] {record.message}\n"
+            for record in records))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class NDJSONSink(FileSink):
+    def write(self, records):
+        self.file.write("".join(json.dumps(record.as_dict(), ensure_ascii=False) + "\n" for record in records))
+
+
+class RingBufferSink:
+    def __init__(self, maxlen=10000):
+        self.records = deque(maxlen=maxlen)
+
+    def write(self, records):
+        self.records.extend(records)
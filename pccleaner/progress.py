@@ -0,0 +1,152 @@
+import time
+import threading
+from collections import namedtuple
+
+PUBLISH_INTERVAL = 0.5  # чаще снимок прогресса не пересчитывается
+
+Progress = namedtuple("Progress", "name files bytes total_files total_bytes elapsed files_per_s bytes_per_s eta "
+                                  "finished cancelled")
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Task:
+    # Одна операция: свой флаг отмены (передаётся вместо threading.Event как stop_flag)
+    # и счётчики прогресса. Движки только увеличивают счётчики; снимок со скоростью и ETA
+    # считается при опросе, не чаще раза в interval, поэтому опрашивать можно хоть по таймеру GUI.
+    def __init__(self, name, interval=PUBLISH_INTERVAL, on_finish=None):
+        self.name = name
+        self.interval = interval
+        self.files = 0
+        self.bytes = 0
+        self.total_files = None
+        self.total_bytes = None
+        self.start = time.monotonic()
+        self.end = None
+        self._on_finish = on_finish
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._published = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish()
+
+    def is_set(self):
+        return self._cancelled.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def add(self, files=0, size=0):
+        with self._lock:
+            self.files += files
+            self.bytes += size
+
+    def add_total(self, files=0, size=0):
+        # Для операций, у которых объём работы становится известен по ходу дела
+        with self._lock:
+            if files:
+                self.total_files = (self.total_files or 0) + files
+            if size:
+                self.total_bytes = (self.total_bytes or 0) + size
+
+    def set_total(self, files=None, size=None):
+        with self._lock:
+            self.total_files = files
+            self.total_bytes = size
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.monotonic()
+            if self._on_finish:
+                self._on_finish(self)
+
+    def progress(self, force=False):
+        now = time.monotonic()
+        if self._snapshot is not None and not force and self.end is None and now - self._published < self.interval:
+            return self._snapshot
+        with self._lock:
+            files, size = self.files, self.bytes
+            total_files, total_bytes = self.total_files, self.total_bytes
+        elapsed = (self.end or now) - self.start
+        files_per_s = files / elapsed if elapsed else 0.0
+        bytes_per_s = size / elapsed if elapsed else 0.0
+        eta = None
+        if self.end is None:
+            if total_bytes and bytes_per_s:
+                eta = max(total_bytes - size, 0) / bytes_per_s
+            elif total_files and files_per_s:
+                eta = max(total_files - files, 0) / files_per_s
+        self._snapshot = Progress(self.name, files, size, total_files, total_bytes, elapsed,
+                                  files_per_s, bytes_per_s, eta, self.end is not None, self.cancelled)
+        self._published = now
+        return self._snapshot
+
+
+class OperationController:
+    # Реестр идущих операций: у каждой свой флаг отмены, поэтому отмена одной операции
+    # не «залипает» для следующих, а stop_operations отменяет все текущие разом
+    def __init__(self, interval=PUBLISH_INTERVAL):
+        self.interval = interval
+        self._tasks = []
+        self._lock = threading.Lock()
+
+    def start(self, name, total_files=None, total_bytes=None):
+        task = Task(name, self.interval, on_finish=self._remove)
+        task.set_total(total_files, total_bytes)
+        with self._lock:
+            self._tasks.append(task)
+        return task
+
+    def _remove(self, task):
+        with self._lock:
+            if task in self._tasks:
+                self._tasks.remove(task)
+
+    def active(self):
+        with self._lock:
+            return list(self._tasks)
+
+    def cancel_all(self):
+        tasks = self.active()
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    def progress(self):
+        return [task.progress() for task in self.active()]
+
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} PB"
+
+
+def format_progress(progress):
+    text = f"{progress.name}: файлов {progress.files}"
+    if progress.total_files:
+        text += f" из {progress.total_files}"
+    if progress.bytes or progress.total_bytes:
+        text += f", {format_size(progress.bytes)}"
+        if progress.total_bytes:
+            text += f" из {format_size(progress.total_bytes)}"
+        text += f", {format_size(progress.bytes_per_s)}/с"
+    if progress.eta is not None:
+        minutes, seconds = divmod(int(progress.eta), 60)
+        text += f", осталось ~{minutes}:{seconds:02d}"
+    if progress.cancelled:
+        text += " (остановлено)"
+    return text
@@ -0,0 +1,106 @@
+import gzip
+import json
+import time
+import itertools
+import threading
+from collections import deque
+
+MAX_EVENTS = 100_000
+
+
+class ReportEvent:
+    __slots__ = ("seq", "ts", "op_id", "kind", "message", "fields")
+
+    def __init__(self, seq, ts, op_id, kind, message, fields):
+        self.seq = seq
+        self.ts = ts
+        self.op_id = op_id
+        self.kind = kind
+        self.message = message
+        self.fields = fields
+
+    def as_dict(self):
+        data = {"seq": self.seq, "ts": self.ts, "op_id": self.op_id, "kind": self.kind}
+        if self.message is not None:
+            data["message"] = self.message
+        if self.fields:
+            data.update(self.fields)
+        return data
+
+
+class Operation:
+    def __init__(self, store, op_id, name):
+        self.store = store
+        self.op_id = op_id
+        self.name = name
+        self.start = time.monotonic()
+        # Типизированные итоги операции, попадают в событие operation_end
+        self.fields = {"files_touched": 0, "bytes_freed": 0}
+
+    def __enter__(self):
+        self._outer = getattr(self.store._local, "op_id", None)
+        self.store._local.op_id = self.op_id
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.store._local.op_id = self._outer
+        self.store.end_operation(self, error=repr(exc) if exc is not None else None)
+
+
+class ReportStore:
+    # Кольцевой буфер событий отчёта: последовательный номер, операция, типизированные поля.
+    # При переполнении самые старые события вытесняются (счётчик dropped).
+    def __init__(self, max_events=MAX_EVENTS):
+        self._events = deque(maxlen=max_events)
+        self._seq = itertools.count(1)
+        self._op_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._active = {}
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._events)
+
+    def _current_op(self):
+        op_id = getattr(self._local, "op_id", None)
+        if op_id is None and len(self._active) == 1:
+            # Сообщения из пулов потоков относим к единственной идущей операции
+            op_id = next(iter(self._active))
+        return op_id
+
+    def add(self, message=None, kind="log", op_id=None, **fields):
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(ReportEvent(next(self._seq), time.time(), op_id or self._current_op(),
+                                            kind, message, fields))
+
+    def operation(self, name, **fields):
+        op = Operation(self, next(self._op_ids), name)
+        self._active[op.op_id] = op
+        self.add(kind="operation_start", op_id=op.op_id, operation=name, **fields)
+        return op
+
+    def end_operation(self, op, error=None):
+        self._active.pop(op.op_id, None)
+        fields = dict(op.fields)
+        if error:
+            fields["error"] = error
+        self.add(kind="operation_end", op_id=op.op_id, operation=op.name,
+                 duration=round(time.monotonic() - op.start, 3), **fields)
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def export_ndjson(self, path, compress=None):
+        if compress is None:
+            compress = path.endswith(".gz")
+        opener = gzip.open if compress else open
+        count = 0
+        with opener(path, "wt", encoding="utf-8") as f:
+            for event in self.events():
+                f.write(json.dumps(event.as_dict(), ensure_ascii=False) + "\n")
+                count += 1
+        return count
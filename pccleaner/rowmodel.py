@@ -0,0 +1,114 @@
+class RowModel:
+    # Результаты для показа в GUI: строки хранятся по постоянным id, сортировка и фильтр
+    # меняют только порядок id, а виджет запрашивает лишь видимый срез (slice).
+    # Выделение — множество id; если задан key, при set_rows оно переносится по значению ключа.
+    def __init__(self, columns, rows=(), key=None):
+        self.columns = list(columns)
+        self.key = key
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._rows = []
+        self._order = []
+        self._sort = None
+        self._filter = None
+        self.selected = set()
+        self.version = 0
+        self.extend(rows)
+
+    def __len__(self):
+        return len(self._order)
+
+    def column(self, name):
+        return self._index[name]
+
+    def row(self, row_id):
+        return self._rows[row_id]
+
+    def value(self, row_id, name):
+        return self._rows[row_id][self._index[name]]
+
+    def ids(self):
+        return list(self._order)
+
+    def slice(self, start, count):
+        return [(row_id, self._rows[row_id]) for row_id in self._order[start:start + count]]
+
+    def extend(self, rows):
+        self._rows.extend(tuple(row) for row in rows)
+        self._apply()
+
+    def set_rows(self, rows):
+        selected_keys = None
+        if self.key is not None:
+            selected_keys = {self.value(row_id, self.key) for row_id in self.selected}
+        self._rows = [tuple(row) for row in rows]
+        self.selected = set()
+        if selected_keys:
+            column = self._index[self.key]
+            self.selected = {row_id for row_id, row in enumerate(self._rows) if row[column] in selected_keys}
+        self._apply()
+
+    def remove(self, row_ids):
+        for row_id in row_ids:
+            self._rows[row_id] = None
+            self.selected.discard(row_id)
+        self._apply()
+
+    def remove_keys(self, keys):
+        # По значению key, а не по id: id меняются, если строки успели перезаписать через set_rows
+        keys = set(keys)
+        column = self._index[self.key]
+        self.remove([row_id for row_id, row in enumerate(self._rows) if row is not None and row[column] in keys])
+
+    def sort(self, name, reverse=False):
+        self._sort = (self._index[name], reverse)
+        self._apply()
+
+    def filter(self, text, names=None):
+        # Подстрока без учёта регистра в указанных столбцах (по умолчанию — во всех строковых)
+        text = text.strip().lower()
+        if not text:
+            self._filter = None
+        else:
+            columns = [self._index[name] for name in names] if names else None
+            self._filter = (text, columns)
+        self._apply()
+
+    def _apply(self):
+        rows = self._rows
+        order = [row_id for row_id, row in enumerate(rows) if row is not None]
+        if self._filter is not None:
+            text, columns = self._filter
+            if columns is not None and len(columns) == 1:
+                column = columns[0]
+                order = [row_id for row_id in order
+                         if isinstance(rows[row_id][column], str) and text in rows[row_id][column].lower()]
+            else:
+                columns = columns or range(len(self.columns))
+                order = [row_id for row_id in order
+                         if any(isinstance(rows[row_id][i], str) and text in rows[row_id][i].lower() for i in columns)]
+        if self._sort is not None:
+            column, reverse = self._sort
+            # Сортировка устойчивая: при равных значениях сохраняется исходный порядок.
+            # Пустые значения (строка «файлы в папке» без пути) всегда в конце и не сравниваются с остальными
+            order.sort(key=lambda row_id: ((rows[row_id][column] is None) != reverse, rows[row_id][column]),
+                       reverse=reverse)
+        self._order = order
+        self.version += 1
+
+    def toggle(self, row_id):
+        if row_id in self.selected:
+            self.selected.discard(row_id)
+        else:
+            self.selected.add(row_id)
+        self.version += 1
+
+    def select(self, row_ids):
+        self.selected.update(row_ids)
+        self.version += 1
+
+    def clear_selection(self):
+        self.selected.clear()
+        self.version += 1
+
+    def selected_rows(self):
+        return [(row_id, self._rows[row_id]) for row_id in self._order if row_id in self.selected]
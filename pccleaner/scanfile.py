@@ -0,0 +1,357 @@
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import socket
+from array import array
+from itertools import accumulate
+
+from pccleaner.config import user_config_dir
+from pccleaner.walker import walk_batches
+
+MAGIC = b"PCSCAN\0\1"
+SCAN_VERSION = 1
+ALIGN = 8
+HASH_KIND = "full:sha1"
+HASH_SIZE = 20
+NO_HASH = bytes(HASH_SIZE)
+
+# Числовые столбцы: имя -> код типа array
+NUMERIC_COLUMNS = {
+    "dir_parent": "q",
+    "dir_first": "q",
+    "dir_files": "q",
+    "file_dir": "q",
+    "size": "q",
+    "mtime_ns": "q",
+    "inode": "Q",
+    "dev": "Q",
+}
+
+
+def default_scan_path(root):
+    # <config>/scans/<машина>-<дата>.pcscan — удобно для ежедневных снимков с нескольких машин
+    folder = os.path.join(user_config_dir(), "scans")
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{socket.gethostname()}-{time.strftime('%Y%m%d-%H%M%S')}.pcscan")
+
+
+def _join(prefix, name):
+    return prefix + name if prefix.endswith(os.sep) else prefix + os.sep + name
+
+
+class ScanSnapshot:
+    # Полный результат сканирования в столбцах. Пути сжаты по префиксу через дерево каталогов:
+    # у каталога — индекс родителя и имя, у файла — индекс каталога и имя; имена хранятся одной
+    # строкой через \0. Числовые столбцы — array, при загрузке это memoryview поверх mmap без копирования.
+    # Файлы одного каталога идут подряд (dir_first, dir_files), как их отдаёт обход.
+    def __init__(self, root, created=None, hash_kind=None):
+        self.root = os.path.abspath(root)
+        self.created = created if created is not None else time.time()
+        self.host = socket.gethostname()
+        self.hash_kind = hash_kind
+        self.dir_names = [self.root]
+        self.file_names = []
+        self.columns = {name: array(code) for name, code in NUMERIC_COLUMNS.items()}
+        self.columns["dir_parent"].append(-1)
+        self.columns["dir_first"].append(0)
+        self.columns["dir_files"].append(0)
+        self.hashes = bytearray() if hash_kind else None
+        self._mmap = None
+        self._file = None
+        self._dir_paths = None
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_dir(self, parent, name):
+        columns = self.columns
+        columns["dir_parent"].append(parent)
+        columns["dir_first"].append(len(self.file_names))
+        columns["dir_files"].append(0)
+        self.dir_names.append(name)
+        return len(self.dir_names) - 1
+
+    def add_file(self, dir_id, name, size, mtime_ns, inode=0, dev=0, digest=None):
+        columns = self.columns
+        first, count = columns["dir_first"], columns["dir_files"]
+        if not count[dir_id]:
+            first[dir_id] = len(self.file_names)
+        elif first[dir_id] + count[dir_id] != len(self.file_names):
+            raise ValueError(f"файлы каталога {self.dir_names[dir_id]} должны добавляться подряд")
+        count[dir_id] += 1
+        columns["file_dir"].append(dir_id)
+        columns["size"].append(size)
+        columns["mtime_ns"].append(mtime_ns)
+        columns["inode"].append(inode)
+        columns["dev"].append(dev)
+        self.file_names.append(name)
+        if self.hashes is not None:
+            self.hashes += bytes.fromhex(digest) if digest else NO_HASH
+
+    @classmethod
+    def from_walk(cls, root, stop_flag=None, on_error=None, progress=None, cache=None):
+        # cache (HashCache): если передан, в снимок попадают уже известные полные хеши файлов
+        snapshot = cls(root, hash_kind=HASH_KIND if cache is not None else None)
+        dir_index = {snapshot.root: 0}
+        dirname = os.path.dirname
+        basename = os.path.basename
+        for batch in walk_batches(root, include_dirs=True, with_inode=True, stop_flag=stop_flag, on_error=on_error):
+            for record in batch:
+                if record.is_dir:
+                    if record.path not in dir_index:
+                        dir_index[record.path] = snapshot.add_dir(dir_index[dirname(record.path)],
+                                                                  basename(record.path))
+                    continue
+                digest = None
+                if cache is not None:
+                    digest = cache.get(record.dev, record.inode, record.size, record.mtime_ns, HASH_KIND)
+                snapshot.add_file(dir_index[dirname(record.path)], basename(record.path), record.size,
+                                  record.mtime_ns, record.inode, record.dev, digest)
+            if progress is not None:
+                progress.add(len(batch), sum(record.size for record in batch))
+        return snapshot
+
+    def save(self, path):
+        # Заголовок JSON с таблицей столбцов, затем столбцы, выровненные по 8 байт
+        blobs = [(name, self.columns[name].typecode, self.columns[name].tobytes()) for name in NUMERIC_COLUMNS]
+        blobs.append(("dir_names", "s", "\0".join(self.dir_names[1:]).encode("utf-8", "surrogateescape")))
+        blobs.append(("file_names", "s", "\0".join(self.file_names).encode("utf-8", "surrogateescape")))
+        if self.hashes is not None:
+            blobs.append(("hashes", "s", bytes(self.hashes)))
+
+        layout = {}
+        offset = 0
+        for name, code, data in blobs:
+            layout[name] = [offset, len(data), code]
+            offset += len(data) + (-len(data)) % ALIGN
+        header = json.dumps({
+            "version": SCAN_VERSION,
+            "root": self.root,
+            "host": self.host,
+            "created": self.created,
+            "byteorder": sys.byteorder,
+            "dirs": len(self.dir_names),
+            "files": len(self.file_names),
+            "hash_kind": self.hash_kind,
+            "columns": layout,
+        }, ensure_ascii=False).encode("utf-8")
+        header += b" " * ((-(len(MAGIC) + 4 + len(header))) % ALIGN)
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for name, code, data in blobs:
+                f.write(data)
+                f.write(b"\0" * ((-len(data)) % ALIGN))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        f = open(path, "rb")
+        try:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path}: не файл снимка")
+            header_size, = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_size))
+            if header["version"] != SCAN_VERSION:
+                raise ValueError(f"{path}: неподдерживаемая версия снимка {header['version']}")
+            base = len(MAGIC) + 4 + header_size
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            f.close()
+            raise
+
+        snapshot = cls(header["root"], header["created"], header.get("hash_kind"))
+        snapshot.host = header.get("host")
+        snapshot._file = f
+        snapshot._mmap = mapped
+        view = memoryview(mapped)
+        native = header["byteorder"] == sys.byteorder
+
+        def column(name):
+            offset, size, code = header["columns"][name]
+            data = view[base + offset:base + offset + size]
+            if code == "s":
+                return data
+            if native:
+                return data.cast(code)
+            # array(code, memoryview) перебирал бы отдельные байты — читаем буфер целиком
+            values = array(code)
+            values.frombytes(data)
+            values.byteswap()
+            return values
+
+        for name in NUMERIC_COLUMNS:
+            snapshot.columns[name] = column(name)
+        dir_names = str(column("dir_names"), "utf-8", "surrogateescape")
+        snapshot.dir_names = [snapshot.root] + (dir_names.split("\0") if dir_names else [])
+        file_names = str(column("file_names"), "utf-8", "surrogateescape")
+        snapshot.file_names = file_names.split("\0") if file_names else []
+        if "hashes" in header["columns"]:
+            snapshot.hashes = column("hashes")
+        return snapshot
+
+    def close(self):
+        if self._mmap is None:
+            return
+        # memoryview поверх mmap нужно отпустить, иначе mmap не закроется
+        for name, values in list(self.columns.items()):
+            if isinstance(values, memoryview):
+                self.columns[name] = array(values.format, values)
+                values.release()
+        if isinstance(self.hashes, memoryview):
+            hashes = self.hashes
+            self.hashes = bytearray(hashes)
+            hashes.release()
+        self._mmap.close()
+        self._file.close()
+        self._mmap = None
+        self._file = None
+
+    def dir_paths(self):
+        if self._dir_paths is None:
+            paths = [self.root]
+            prefixes = [_join(self.root, "")]
+            names = self.dir_names
+            parents = self.columns["dir_parent"]
+            for i in range(1, len(names)):
+                path = prefixes[parents[i]] + names[i]
+                paths.append(path)
+                prefixes.append(path + os.sep)
+            self._dir_paths = paths
+        return self._dir_paths
+
+    def path(self, i):
+        return _join(self.dir_paths()[self.columns["file_dir"][i]], self.file_names[i])
+
+    def dir_range(self, dir_id):
+        first = self.columns["dir_first"][dir_id]
+        return first, first + self.columns["dir_files"][dir_id]
+
+    def digest(self, i):
+        if self.hashes is None:
+            return None
+        digest = bytes(self.hashes[i * HASH_SIZE:(i + 1) * HASH_SIZE])
+        return digest.hex() if digest != NO_HASH else None
+
+    def dir_totals(self):
+        return dict(zip(self.dir_paths(), self._subtree_sizes()))
+
+    def _subtree_sizes(self):
+        # Размер поддерева каждого каталога: каталоги записаны в порядке обхода, родитель раньше детей
+        offsets = [0]
+        offsets.extend(accumulate(self.columns["size"]))
+        totals = [offsets[first + count] - offsets[first]
+                  for first, count in zip(self.columns["dir_first"], self.columns["dir_files"])]
+        parents = self.columns["dir_parent"]
+        for i in range(len(totals) - 1, 0, -1):
+            totals[parents[i]] += totals[i]
+        return totals
+
+    @property
+    def total_size(self):
+        return sum(self.columns["size"])
+
+
+class SnapshotDiff:
+    def __init__(self, old, new):
+        self.old_root = old.root
+        self.new_root = new.root
+        self.added = []
+        self.removed = []
+        self.changed = []
+        self.grown_dirs = []
+
+    @property
+    def bytes_added(self):
+        return sum(size for _, size in self.added)
+
+    @property
+    def bytes_removed(self):
+        return sum(size for _, size in self.removed)
+
+    @property
+    def bytes_changed(self):
+        return sum(new_size - old_size for _, old_size, new_size in self.changed)
+
+    def as_dict(self):
+        return {
+            "old_root": self.old_root,
+            "new_root": self.new_root,
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "changed": len(self.changed),
+            "bytes_added": self.bytes_added,
+            "bytes_removed": self.bytes_removed,
+            "bytes_changed": self.bytes_changed,
+        }
+
+
+def _same_files(old, new, a, b, c, d, compare_hashes):
+    if b - a != d - c:
+        return False
+    if old.columns["size"][a:b] != new.columns["size"][c:d] or old.columns["mtime_ns"][a:b] != new.columns["mtime_ns"][c:d]:
+        return False
+    if old.file_names[a:b] != new.file_names[c:d]:
+        return False
+    return not compare_hashes or old.hashes[a * HASH_SIZE:b * HASH_SIZE] == new.hashes[c * HASH_SIZE:d * HASH_SIZE]
+
+
+def diff_snapshots(old, new):
+    # Сравнение двух снимков без обращения к файловой системе. Файл считается изменённым,
+    # если поменялись размер или mtime (или хеш, когда он есть в обоих снимках).
+    # Каталоги сопоставляются по пути; каталог, у которого совпали столбцы целиком, сравнивается
+    # одним сравнением срезов, пофайлово разбираются только изменившиеся.
+    result = SnapshotDiff(old, new)
+    compare_hashes = old.hashes is not None and new.hashes is not None
+    old_sizes, old_mtimes = old.columns["size"], old.columns["mtime_ns"]
+    new_sizes, new_mtimes = new.columns["size"], new.columns["mtime_ns"]
+    old_dirs = {path: dir_id for dir_id, path in enumerate(old.dir_paths())}
+    old_first, old_count = old.columns["dir_first"], old.columns["dir_files"]
+    old_totals = old._subtree_sizes()
+    new_totals = new._subtree_sizes()
+    grown = []
+
+    for path, start, count, total in zip(new.dir_paths(), new.columns["dir_first"], new.columns["dir_files"],
+                                         new_totals):
+        old_dir = old_dirs.pop(path, None)
+        end = start + count
+        delta = total - (old_totals[old_dir] if old_dir is not None else 0)
+        if delta:
+            grown.append((path, delta))
+        if old_dir is None:
+            result.added.extend((_join(path, new.file_names[j]), new_sizes[j]) for j in range(start, end))
+            continue
+        old_start = old_first[old_dir]
+        old_end = old_start + old_count[old_dir]
+        if _same_files(old, new, old_start, old_end, start, end, compare_hashes):
+            continue
+        old_files = {old.file_names[i]: i for i in range(old_start, old_end)}
+        for j in range(start, end):
+            i = old_files.pop(new.file_names[j], None)
+            if i is None:
+                result.added.append((_join(path, new.file_names[j]), new_sizes[j]))
+            elif old_sizes[i] != new_sizes[j] or old_mtimes[i] != new_mtimes[j] or (
+                    compare_hashes and old.digest(i) != new.digest(j)):
+                result.changed.append((_join(path, new.file_names[j]), old_sizes[i], new_sizes[j]))
+        result.removed.extend((_join(path, name), old_sizes[i]) for name, i in old_files.items())
+
+    for path, old_dir in old_dirs.items():
+        start, end = old.dir_range(old_dir)
+        result.removed.extend((_join(path, old.file_names[i]), old_sizes[i]) for i in range(start, end))
+        if old_totals[old_dir]:
+            grown.append((path, -old_totals[old_dir]))
+    grown.sort(key=lambda item: item[1], reverse=True)
+    result.grown_dirs = grown
+    return result
@@ -0,0 +1,239 @@
+import os
+import time
+
+from pccleaner import duplicates
+from pccleaner.duplicates import PROCESS, THREAD, _Executor
+from pccleaner.walker import walk_roots
+
+AHASH = "ahash"
+DHASH = "dhash"
+PHASH = "phash"
+ALGORITHMS = [AHASH, DHASH, PHASH]
+# До какого размера уменьшается картинка перед хешированием (ширина, высота)
+HASH_INPUT = {AHASH: (8, 8), DHASH: (9, 8), PHASH: (32, 32)}
+DEFAULT_THRESHOLD = 6  # из 64 бит
+BATCH_SIZE = {THREAD: 16, PROCESS: 64}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tif", ".tiff"}
+
+_dct_matrices = {}
+
+
+class SimilarStats:
+    def __init__(self):
+        self.files_total = 0
+        self.images = 0
+        self.hashed = 0
+        self.cached = 0
+        self.errors = 0
+        self.groups = 0
+        self.similar_files = 0
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _dct_matrix(n):
+    # Матрица ортонормированного DCT-II: dct @ X @ dct.T — двумерное преобразование для всей пачки сразу
+    import numpy as np
+
+    if n not in _dct_matrices:
+        k = np.arange(n)[:, None]
+        x = np.arange(n)[None, :]
+        matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        matrix[0] /= np.sqrt(2.0)
+        _dct_matrices[n] = matrix.astype(np.float32)
+    return _dct_matrices[n]
+
+
+def hash_pixels(pixels, algorithm):
+    # pixels: массив (n, высота, ширина) в оттенках серого; возвращает n 64-битных хешей
+    import numpy as np
+
+    count = len(pixels)
+    if algorithm == AHASH:
+        bits = pixels > pixels.mean(axis=(1, 2), keepdims=True)
+    elif algorithm == DHASH:
+        bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+    elif algorithm == PHASH:
+        dct = _dct_matrix(pixels.shape[1])
+        low = (dct @ pixels @ dct.T)[:, :8, :8].reshape(count, -1)
+        bits = low > np.median(low, axis=1, keepdims=True)
+    else:
+        raise ValueError(f"неизвестный алгоритм: {algorithm}")
+    packed = np.packbits(bits.reshape(count, -1), axis=1)
+    return [int.from_bytes(row.tobytes(), "big") for row in packed]
+
+
+def load_pixels(path, size):
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(path) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе — в разы быстрее полного декодирования
+        image.draft("L", (size[0] * 8, size[1] * 8))
+        gray = image.convert("L").resize(size, Image.LANCZOS)
+    return np.asarray(gray, dtype=np.float32)
+
+
+def _hash_images(batch, algorithm, stop_flag=None):
+    # Выполняется в потоке или в отдельном процессе: картинки пачки уменьшаются по одной,
+    # а хеши считаются одним векторным проходом. Возвращает [(hex-хеш, ошибка), ...] в порядке batch.
+    import numpy as np
+    from PIL import Image
+
+    if stop_flag is None:
+        stop_flag = duplicates._worker_stop
+    pixels, results = [], []
+    for path in batch:
+        if stop_flag is not None and stop_flag.is_set():
+            break
+        try:
+            pixels.append(load_pixels(path, HASH_INPUT[algorithm]))
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            results.append((None, e))
+            continue
+        results.append((True, None))
+    hashes = iter(hash_pixels(np.stack(pixels), algorithm) if pixels else [])
+    return [(f"{next(hashes):016x}", None) if ok else (None, error) for ok, error in results]
+
+
+def popcount(values):
+    import numpy as np
+
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8).reshape(values.shape + (8,))].sum(axis=-1)
+
+
+def chunk_bounds(threshold, bits=64):
+    # Хеш делится на threshold + 1 кусков: если расстояние не больше threshold,
+    # хотя бы один кусок у двух хешей совпадает целиком (принцип Дирихле)
+    count = min(threshold + 1, bits)
+    edges = [bits * i // count for i in range(count + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def close_pairs(values, threshold, block=1024):
+    # Пары индексов (i, j), i < j, с расстоянием Хэмминга не больше threshold.
+    # Мультииндекс: сравниваются только хеши, у которых совпал один из кусков, —
+    # вместо n² сравнений выходит порядка n² / 2^(64 / (threshold + 1)) на кусок.
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.uint64)
+    pairs = set()
+    for low, high in chunk_bounds(threshold):
+        keys = (values >> np.uint64(low)) & np.uint64((1 << (high - low)) - 1)
+        order = np.argsort(keys, kind="stable")
+        starts = np.flatnonzero(np.diff(keys[order])) + 1
+        for bucket in np.split(order, starts):
+            if len(bucket) < 2:
+                continue
+            members = values[bucket]
+            for start in range(0, len(bucket), block):
+                rows = members[start:start + block]
+                distances = popcount(rows[:, None] ^ members[None, :])
+                for i, j in zip(*np.nonzero(distances <= threshold)):
+                    a, b = bucket[start + i], bucket[j]
+                    if a < b:
+                        pairs.add((int(a), int(b)))
+    return pairs
+
+
+def cluster(hashes, threshold=DEFAULT_THRESHOLD):
+    # hashes: {хеш: [элементы]}. Хеши ближе threshold объединяются в одну группу
+    # (одиночная связь: A~B и B~C дают одну группу, даже если A и C дальше порога).
+    values = list(hashes)
+    parent = list(range(len(values)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if threshold > 0 and len(values) > 1:
+        for a, b in close_pairs(values, threshold):
+            a, b = find(a), find(b)
+            if a != b:
+                parent[b] = a
+    groups = {}
+    for i, value in enumerate(values):
+        groups.setdefault(find(i), []).extend(hashes[value])
+    return [items for items in groups.values() if len(items) > 1]
+
+
+def find_similar_images(root, algorithm=DHASH, threshold=DEFAULT_THRESHOLD, stop_flag=None, max_workers=None,
+                        on_error=None, cache=None, mode=PROCESS, progress=None, extensions=IMAGE_EXTENSIONS,
+                        budgets=None):
+    # Группы похожих картинок: списки (путь, размер), в группе крупные файлы первыми.
+    # Хеши хранятся в кеше рядом с хешами содержимого (вид image:<алгоритм>).
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"неизвестный алгоритм: {algorithm}")
+    stats = SimilarStats()
+    start_time = time.time()
+    kind = f"image:{algorithm}"
+    hashes = {}
+    pending = []
+
+    def add(file, digest):
+        hashes.setdefault(int(digest, 16), []).append(file[:2])
+
+    def done(batch, results):
+        if progress is not None:
+            progress.add(size=sum(file[1] for file in batch))
+        for file, (digest, error) in zip(batch, results):
+            if error is not None:
+                stats.errors += 1
+                if on_error:
+                    on_error(file[0], error)
+                continue
+            stats.hashed += 1
+            if cache is not None:
+                cache.put(file[2], file[3], file[1], file[4], kind, digest)
+            add(file, digest)
+
+    def flush():
+        batch = list(pending)
+        pending.clear()
+        if batch:
+            executor.submit(lambda results: done(batch, results), _hash_images, [file[0] for file in batch], algorithm)
+
+    executor = _Executor(mode, max_workers or os.cpu_count(), stop_flag)
+    try:
+        roots = [root] if isinstance(root, str) else root
+        for _, batch in walk_roots(roots, with_inode=True, stop_flag=stop_flag, on_error=on_error, budgets=budgets):
+            stats.files_total += len(batch)
+            for record in batch:
+                if os.path.splitext(record.path)[1].lower() not in extensions:
+                    continue
+                stats.images += 1
+                file = (record.path, record.size, record.dev, record.inode, record.mtime_ns)
+                digest = cache.get(record.dev, record.inode, record.size, record.mtime_ns, kind) if cache else None
+                if digest is not None:
+                    stats.cached += 1
+                    add(file, digest)
+                    continue
+                if progress is not None:
+                    progress.add_total(size=record.size)
+                pending.append(file)
+                if len(pending) >= BATCH_SIZE[mode]:
+                    flush()
+            if progress is not None:
+                progress.add(files=len(batch))
+            executor.poll()
+        flush()
+        executor.join()
+    finally:
+        executor.shutdown()
+
+    if cache is not None:
+        cache.flush()
+
+    groups = [sorted(items, key=lambda item: (-item[1], item[0])) for items in cluster(hashes, threshold)]
+    groups.sort(key=lambda items: (-len(items), -items[0][1]))
+    stats.groups = len(groups)
+    stats.similar_files = sum(len(items) for items in groups)
+    stats.elapsed = time.time() - start_time
+    return groups, stats
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import errno
+import fnmatch
+
+from pccleaner.deleter import Deleter
+from pccleaner.walker import walk_batches
+
+IS_WINDOWS = os.name == "nt"
+# ERROR_SHARING_VIOLATION, ERROR_LOCK_VIOLATION: файл открыт другой программой
+IN_USE_WINERRORS = (32, 33)
+
+
+class CleanupStats:
+    def __init__(self):
+        self.files = 0
+        self.dirs = 0
+        self.bytes_freed = 0
+        self.matched = 0
+        self.reclaimable = 0
+        self.skipped = 0
+        self.in_use = 0
+        self.errors = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class CleanupRules:
+    # Что можно удалять: min_age — секунды с последнего изменения, include/exclude — шаблоны
+    # fnmatch по имени файла (или по пути от корня папки, если в шаблоне есть разделитель),
+    # min_size/max_size — границы размера файла, max_total — сколько байт освободить за раз.
+    def __init__(self, min_age=0, include=None, exclude=None, min_size=0, max_size=None, max_total=None,
+                 skip_in_use=True):
+        self.min_age = min_age
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_total = max_total
+        self.skip_in_use = skip_in_use
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{key: value for key, value in data.items() if key != "path"})
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def _match(self, patterns, name, rel):
+        for pattern in patterns:
+            target = rel if "/" in pattern or os.sep in pattern else name
+            if fnmatch.fnmatch(target, pattern):
+                return True
+        return False
+
+    def excludes_dir(self, rel):
+        return self._match(self.exclude, os.path.basename(rel), rel)
+
+    def allows_file(self, rel, size, mtime_ns, cutoff_ns):
+        if mtime_ns > cutoff_ns or size < self.min_size:
+            return False
+        if self.max_size is not None and size > self.max_size:
+            return False
+        name = os.path.basename(rel)
+        if self.include and not self._match(self.include, name, rel):
+            return False
+        return not self._match(self.exclude, name, rel)
+
+
+def temp_folders():
+    # Только TEMP/TMP: общий /tmp без явного указания не чистим — там файлы других программ и пользователей
+    folders = [os.environ.get('TEMP'), os.environ.get('TMP')]
+    return [folder for folder in dict.fromkeys(folders) if folder and os.path.isdir(folder)]
+
+
+def trash_folders():
+    # Корзина freedesktop (files — сами файлы, info — сведения о них) и корзина macOS.
+    # Корзину Windows очищает оболочка: deleter.empty_windows_recycle_bin
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    folders = [os.path.join(data_home, "Trash", "files"), os.path.join(data_home, "Trash", "info"),
+               os.path.expanduser("~/.Trash")]
+    return [folder for folder in folders if os.path.isdir(folder)]
+
+
+def load_rules(path):
+    # JSON-файл со списком {"path": папка, ...правила CleanupRules}; возраст в секундах, размеры в байтах
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    return [(entry["path"], CleanupRules.from_dict(entry)) for entry in entries]
+
+
+def open_files():
+    # На POSIX открытый файл удаляется без ошибки, поэтому занятые файлы ищем заранее.
+    # Видны только процессы, к которым есть доступ; на Windows занятость видна по ошибке удаления.
+    if IS_WINDOWS:
+        return set()
+    try:
+        import psutil
+    except ImportError:
+        return set()
+    paths = set()
+    for process in psutil.process_iter():
+        try:
+            paths.update(item.path for item in process.open_files())
+        except psutil.Error:
+            continue
+    return paths
+
+
+def _in_use_error(e):
+    return getattr(e, "winerror", None) in IN_USE_WINERRORS or e.errno == errno.EBUSY
+
+
+def clean_folder(folder, rules=None, dry_run=False, stop_flag=None, on_error=None, on_deleted=None,
+                 max_workers=None, stats=None, progress=None, deleter=None):
+    # Удаляет подходящие под правила файлы, затем опустевшие папки снизу вверх; саму папку оставляет.
+    # dry_run только считает, сколько файлов и байт было бы удалено (matched, reclaimable).
+    # deleter — общий Deleter операции (ограничение скорости, корзина, сводка ошибок по errno).
+    if rules is None:
+        rules = CleanupRules()
+    if stats is None:
+        stats = CleanupStats()
+    root = os.path.abspath(folder)
+    prefix = len(root.rstrip(os.sep)) + 1
+    cutoff_ns = time.time_ns() - int(rules.min_age * 1e9)
+    busy = open_files() if rules.skip_in_use and not dry_run else set()
+    if deleter is None:
+        deleter = Deleter(max_workers, stop_flag=stop_flag)
+
+    def deleted(path, size):
+        stats.files += 1
+        stats.bytes_freed += size
+        if on_deleted:
+            on_deleted(path)
+
+    def failed(path, e):
+        if rules.skip_in_use and _in_use_error(e):
+            stats.in_use += 1
+            return
+        stats.errors += 1
+        if on_error:
+            on_error(path, e)
+
+    dirs = []
+    protected = set()  # исключённые папки: их содержимое не трогаем целиком
+    for batch in walk_batches(root, include_dirs=True, stop_flag=stop_flag, on_error=on_error):
+        selected = []
+        for record in batch:
+            rel = record.path[prefix:]
+            if os.path.dirname(record.path) in protected:
+                if record.is_dir:
+                    protected.add(record.path)
+                else:
+                    stats.skipped += 1
+                continue
+            if record.is_dir:
+                if not rel:
+                    continue
+                if rules.excludes_dir(rel):
+                    protected.add(record.path)
+                elif record.mtime_ns <= cutoff_ns:
+                    dirs.append(record.path)
+                continue
+            if not rules.allows_file(rel, record.size, record.mtime_ns, cutoff_ns):
+                stats.skipped += 1
+                continue
+            if rules.max_total is not None and stats.reclaimable + record.size > rules.max_total:
+                stats.skipped += 1
+                continue
+            if record.path in busy:
+                stats.in_use += 1
+                continue
+            stats.matched += 1
+            stats.reclaimable += record.size
+            selected.append((record.path, record.size))
+        if progress is not None:
+            progress.add(len(batch), sum(record.size for record in batch))
+        if not dry_run and selected:
+            deleter.delete(selected, on_deleted=deleted, on_error=failed)
+
+    if dry_run:
+        return stats
+
+    # Папки — после файлов, от вложенных к родительским. Непустые (там остались файлы,
+    # не подошедшие под правила) пропускаем молча. В режиме корзины папки не трогаем:
+    # файлы из них уже перемещены, пустые каталоги в корзину не отправляем.
+    if deleter.trash:
+        return stats
+    for path in reversed(dirs):
+        if stop_flag is not None and stop_flag.is_set():
+            break
+        try:
+            os.rmdir(path)
+        except OSError as e:
+            if e.errno in (errno.ENOTEMPTY, errno.EEXIST, errno.ENOENT) or getattr(e, "winerror", None) == 145:
+                continue
+            stats.errors += 1
+            if on_error:
+                on_error(path, e)
+            continue
+        stats.dirs += 1
+        if on_deleted:
+            on_deleted(path)
+    return stats
@@ -0,0 +1,56 @@
+import heapq
+import itertools
+import threading
+
+
+class TopK:
+    # Потоковый отбор K самых больших файлов: память O(K) при любом размере дерева.
+    # items() можно вызывать из другого потока прямо во время сканирования.
+    def __init__(self, k=100, min_size=0):
+        self.k = k
+        self.min_size = min_size
+        self.version = 0
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def threshold(self):
+        # Файл меньше порога в топ уже не попадёт
+        if len(self._heap) < self.k:
+            return self.min_size
+        return max(self._heap[0][0], self.min_size)
+
+    def push(self, path, size):
+        if size < self.min_size or self.k <= 0:
+            return
+        with self._lock:
+            self._push(path, size)
+
+    def push_many(self, items):
+        if self.k <= 0:
+            return
+        threshold = self.threshold
+        with self._lock:
+            for path, size in items:
+                if size >= threshold:
+                    self._push(path, size)
+                    threshold = self.threshold
+
+    def _push(self, path, size):
+        heap = self._heap
+        if len(heap) < self.k:
+            heapq.heappush(heap, (size, next(self._counter), path))
+        elif size > heap[0][0]:
+            heapq.heapreplace(heap, (size, next(self._counter), path))
+        else:
+            return
+        self.version += 1
+
+    def items(self):
+        with self._lock:
+            heap = list(self._heap)
+        return [(path, size) for size, _, path in sorted(heap, reverse=True)]
@@ -0,0 +1,252 @@
+import os
+import stat
+import queue
+import threading
+import concurrent.futures
+from collections import namedtuple
+
+from pccleaner.devices import plan_devices
+
+FileRecord = namedtuple("FileRecord", "path size mtime_ns inode dev is_dir")
+
+FILE_ATTRIBUTE_REPARSE_POINT = 0x400
+BATCH_SIZE = 1024
+MAX_QUEUED_BATCHES = 64  # сколько пачек потоки обхода могут обогнать потребителя
+POLL_INTERVAL = 0.2
+IS_WINDOWS = os.name == "nt"
+
+
+class WalkStats:
+    def __init__(self):
+        self.dirs = 0
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.skipped_mounts = 0
+        self.reused_dirs = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def walk_batches(root, follow_symlinks=False, same_device=True, include_dirs=False, with_inode=False,
+                 batch_size=BATCH_SIZE, stop_flag=None, on_error=None, stats=None, reuse_dir=None, delegate=None):
+    # Один проход по дереву через os.scandir: каждый элемент stat'ится ровно один раз,
+    # на Windows данные stat приходят вместе с листингом каталога бесплатно.
+    # Отдаёт списки FileRecord; символические ссылки по умолчанию пропускаются.
+    # reuse_dir(path, st) может вернуть список подкаталогов из прошлого сканирования —
+    # тогда сам каталог не читается, обходятся только эти подкаталоги.
+    # delegate(path, st) может вернуть функцию, которая отдаёт поддерево другому потоку: перед её
+    # вызовом уже собранные записи отдаются потребителю, так что родительские папки приходят раньше.
+    if stats is None:
+        stats = WalkStats()
+    root = os.path.abspath(root)
+    try:
+        root_st = os.stat(root)
+    except OSError as e:
+        stats.errors += 1
+        if on_error:
+            on_error(root, e)
+        return
+    root_dev = root_st.st_dev
+
+    batch = []
+    if include_dirs:
+        batch.append(FileRecord(root, 0, root_st.st_mtime_ns, root_st.st_ino, root_dev, True))
+    stack = [(root, root_st)]
+    visited = {(root_dev, root_st.st_ino)} if follow_symlinks else None
+
+    while stack:
+        if stop_flag is not None and stop_flag.is_set():
+            return
+        top, top_st = stack.pop()
+        children = reuse_dir(top, top_st) if reuse_dir is not None else None
+        if children is not None:
+            stats.reused_dirs += 1
+            for path in children:
+                try:
+                    st = os.stat(path, follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    stats.errors += 1
+                    if on_error:
+                        on_error(path, e)
+                    continue
+                if not stat.S_ISDIR(st.st_mode):
+                    continue
+                stack.append((path, st))
+                if include_dirs:
+                    batch.append(FileRecord(path, 0, st.st_mtime_ns, st.st_ino, root_dev if IS_WINDOWS else st.st_dev, True))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+            continue
+        try:
+            it = os.scandir(top)
+        except OSError as e:
+            stats.errors += 1
+            if on_error:
+                on_error(top, e)
+            continue
+        stats.dirs += 1
+        with it:
+            for entry in it:
+                try:
+                    if not follow_symlinks and entry.is_symlink():
+                        continue
+                    st = entry.stat(follow_symlinks=follow_symlinks)
+                except OSError as e:
+                    stats.errors += 1
+                    if on_error:
+                        on_error(entry.path, e)
+                    continue
+
+                # DirEntry.stat на Windows не заполняет st_dev/st_ino
+                dev = root_dev if IS_WINDOWS else st.st_dev
+                if stat.S_ISDIR(st.st_mode):
+                    if IS_WINDOWS:
+                        # Точки соединения и точки монтирования томов — это reparse point
+                        if not follow_symlinks and st.st_file_attributes & FILE_ATTRIBUTE_REPARSE_POINT:
+                            stats.skipped_mounts += 1
+                            continue
+                    elif same_device and dev != root_dev:
+                        stats.skipped_mounts += 1
+                        continue
+                    inode = entry.inode() if IS_WINDOWS and with_inode else st.st_ino
+                    if visited is not None:
+                        if (dev, inode) in visited and inode:
+                            continue
+                        visited.add((dev, inode))
+                    handoff = delegate(entry.path, st) if delegate is not None else None
+                    if handoff is not None:
+                        if batch:
+                            yield batch
+                            batch = []
+                        handoff()
+                        continue
+                    stack.append((entry.path, st))
+                    if include_dirs:
+                        batch.append(FileRecord(entry.path, 0, st.st_mtime_ns, inode, dev, True))
+                elif stat.S_ISREG(st.st_mode):
+                    inode = entry.inode() if IS_WINDOWS and with_inode else st.st_ino
+                    batch.append(FileRecord(entry.path, st.st_size, st.st_mtime_ns, inode, dev, False))
+                    stats.files += 1
+                    stats.bytes += st.st_size
+                else:
+                    continue
+
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+                    # Большой каталог читается долго, проверяем отмену и внутри него
+                    if stop_flag is not None and stop_flag.is_set():
+                        return
+    if batch:
+        yield batch
+
+
+def walk(root, **kwargs):
+    for batch in walk_batches(root, **kwargs):
+        yield from batch
+
+
+class _StopFlag:
+    # Отмена снаружи (stop_flag) или остановка самим walk_roots, когда потребитель ушёл
+    def __init__(self, stop_flag):
+        self.stop_flag = stop_flag
+        self.event = threading.Event()
+
+    def is_set(self):
+        return self.event.is_set() or (self.stop_flag is not None and self.stop_flag.is_set())
+
+
+def walk_roots(roots, include_dirs=False, with_inode=False, batch_size=BATCH_SIZE, stop_flag=None, on_error=None,
+               stats=None, budgets=None, devices=None):
+    # Обход нескольких корней за одну операцию. Корни группируются по устройству (devices.plan_devices),
+    # у каждого устройства свой пул потоков по его бюджету: HDD читается в 1–2 потока, NVMe и сеть — в 16.
+    # Свободный поток устройства забирает у занятых ещё не прочитанные подкаталоги, поэтому
+    # и один большой корень на SSD обходится параллельно. Отдаёт пары (корень, пачка FileRecord);
+    # пачки, колбэк on_error и счётчики stats обрабатываются в потоке, который читает генератор.
+    if stats is None:
+        stats = WalkStats()
+    if devices is None:
+        devices, _ = plan_devices(roots, budgets)
+    results = queue.Queue(maxsize=MAX_QUEUED_BATCHES)
+    stop = _StopFlag(stop_flag)
+    lock = threading.Lock()
+    pending = {device.dev: 0 for device in devices}
+    outstanding = [0]
+    pools = {device.dev: concurrent.futures.ThreadPoolExecutor(max_workers=device.workers) for device in devices}
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def submit(device, root, path):
+        with lock:
+            pending[device.dev] += 1
+            outstanding[0] += 1
+        pools[device.dev].submit(run, device, root, path)
+
+    def make_delegate(device, root):
+        def delegate(path, st):
+            with lock:
+                if pending[device.dev] >= device.workers:
+                    return None
+            return lambda: submit(device, root, path)
+        return delegate
+
+    def run(device, root, path):
+        task_stats = WalkStats()
+        delegate = make_delegate(device, root) if device.workers > 1 else None
+        try:
+            for batch in walk_batches(path, include_dirs=include_dirs, with_inode=with_inode, batch_size=batch_size,
+                                      stop_flag=stop, on_error=lambda error_path, e: put(("error", error_path, e)),
+                                      stats=task_stats, delegate=delegate):
+                put(("batch", root, batch))
+        except Exception as e:
+            put(("raise", path, e))
+        finally:
+            with lock:
+                for name, value in vars(task_stats).items():
+                    setattr(stats, name, getattr(stats, name) + value)
+                pending[device.dev] -= 1
+                outstanding[0] -= 1
+                last = not outstanding[0]
+            if last:
+                # Новые задачи ставят только работающие задачи, так что после последней ничего не придёт
+                put(("done",))
+
+    for device in devices:
+        for root in device.roots:
+            submit(device, root, root)
+    if not outstanding[0]:
+        return
+    try:
+        while True:
+            try:
+                # Таймаут — только чтобы заметить отмену; о конце обхода сообщает ("done",)
+                item = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item[0] == "done":
+                return
+            if item[0] == "batch":
+                yield item[1], item[2]
+            elif item[0] == "error":
+                if on_error:
+                    on_error(item[1], item[2])
+            else:
+                raise item[2]
+    finally:
+        # Потребитель закончил или прервал чтение: останавливаем потоки и не даём им зависнуть на полной очереди
+        stop.event.set()
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
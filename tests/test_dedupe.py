@@ -0,0 +1,75 @@
+import os
+from unittest import mock
+
+import pytest
+
+from pccleaner.dedupe import HARDLINK, PartialReplaceError, dedupe_groups, replace_group
+
+
+def make_files(folder, names, data=b"same content"):
+    paths = []
+    for name in names:
+        path = os.path.join(folder, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+
+def failing_replace(fail_on):
+    # os.replace, который падает на fail_on-м вызове
+    real_replace = os.replace
+    calls = []
+
+    def replace(src, dst):
+        calls.append(dst)
+        if len(calls) == fail_on:
+            raise PermissionError(13, "нет доступа", dst)
+        return real_replace(src, dst)
+
+    return replace
+
+
+def temp_files(folder):
+    return [name for name in os.listdir(folder) if name.endswith(".pccleaner-tmp")]
+
+
+def test_replace_group_links_all_targets(tmp_path):
+    keep, *targets = make_files(tmp_path, ["a", "b", "c"])
+    assert replace_group(keep, targets, HARDLINK) == targets
+    for target in targets:
+        assert os.path.samefile(keep, target)
+    assert temp_files(tmp_path) == []
+
+
+def test_replace_group_rename_failure_cleans_up(tmp_path):
+    keep, *targets = make_files(tmp_path, ["a", "b", "c", "d"])
+    with mock.patch("os.replace", failing_replace(2)):
+        with pytest.raises(PartialReplaceError) as info:
+            replace_group(keep, targets, HARDLINK)
+    assert info.value.replaced == targets[:1]
+    assert info.value.filename == targets[1]
+    assert os.path.samefile(keep, targets[0])
+    assert not os.path.samefile(keep, targets[1])
+    assert not os.path.samefile(keep, targets[2])
+    assert temp_files(tmp_path) == []
+
+
+def test_dedupe_groups_counts_only_replaced(tmp_path):
+    paths = make_files(tmp_path, ["a", "b", "c", "d"])
+    errors = []
+    with mock.patch("os.replace", failing_replace(3)):
+        stats = dedupe_groups([paths], HARDLINK, on_error=lambda path, e: errors.append(path))
+    assert stats.files == 2
+    assert stats.bytes_saved == 2 * len(b"same content")
+    assert stats.errors == 1
+    assert errors == [paths[3]]
+    assert temp_files(tmp_path) == []
+
+
+def test_dedupe_groups_skips_changed_files(tmp_path):
+    paths = make_files(tmp_path, ["a", "b"]) + make_files(tmp_path, ["c"], b"other content")
+    stats = dedupe_groups([paths], HARDLINK)
+    assert stats.files == 1
+    assert stats.changed == 1
+    assert not os.path.samefile(paths[0], paths[2])
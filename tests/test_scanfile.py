@@ -0,0 +1,106 @@
+import os
+import sys
+from unittest import mock
+
+from pccleaner.scanfile import HASH_KIND, NUMERIC_COLUMNS, ScanSnapshot, diff_snapshots
+
+FOREIGN_BYTEORDER = "big" if sys.byteorder == "little" else "little"
+
+
+def make_tree(root, files):
+    for rel, data in files.items():
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def sample_snapshot(root):
+    snapshot = ScanSnapshot(root, created=1.5, hash_kind=HASH_KIND)
+    sub = snapshot.add_dir(0, "sub")
+    snapshot.add_file(0, "a", 10, 100, inode=1, dev=2, digest="ab" * 20)
+    snapshot.add_file(sub, "b", 2 ** 40, -5, inode=2 ** 63, dev=2)
+    return snapshot
+
+
+def file_list(snapshot):
+    return [(snapshot.path(i), snapshot.columns["size"][i], snapshot.digest(i)) for i in range(len(snapshot))]
+
+
+def assert_same(loaded, original):
+    assert loaded.root == original.root
+    assert loaded.created == original.created
+    assert loaded.dir_paths() == original.dir_paths()
+    for name in NUMERIC_COLUMNS:
+        assert list(loaded.columns[name]) == list(original.columns[name]), name
+    assert file_list(loaded) == file_list(original)
+
+
+def test_save_load_round_trip(tmp_path):
+    original = sample_snapshot(str(tmp_path / "root"))
+    path = str(tmp_path / "scan.pcscan")
+    original.save(path)
+    with ScanSnapshot.load(path) as loaded:
+        assert_same(loaded, original)
+        assert loaded.dir_totals() == original.dir_totals()
+    # После close столбцы скопированы из mmap и остаются доступны
+    assert_same(loaded, original)
+
+
+def test_load_foreign_byteorder(tmp_path):
+    original = sample_snapshot(str(tmp_path / "root"))
+    # Снимок, записанный на машине с другим порядком байт: столбцы хранятся переставленными
+    foreign = sample_snapshot(str(tmp_path / "root"))
+    for name in NUMERIC_COLUMNS:
+        foreign.columns[name].byteswap()
+    path = str(tmp_path / "scan.pcscan")
+    with mock.patch.object(sys, "byteorder", FOREIGN_BYTEORDER):
+        foreign.save(path)
+    with ScanSnapshot.load(path) as loaded:
+        assert_same(loaded, original)
+
+
+def test_load_native_file_as_foreign(tmp_path):
+    original = sample_snapshot(str(tmp_path / "root"))
+    path = str(tmp_path / "scan.pcscan")
+    original.save(path)
+    with mock.patch.object(sys, "byteorder", FOREIGN_BYTEORDER):
+        with ScanSnapshot.load(path) as loaded:
+            for name in NUMERIC_COLUMNS:
+                swapped = original.columns[name][:]
+                swapped.byteswap()
+                assert list(loaded.columns[name]) == list(swapped), name
+
+
+def test_diff_after_round_trip(tmp_path):
+    root = tmp_path / "root"
+    make_tree(root, {"a": b"1", "b": b"22", os.path.join("sub", "c"): b"333", os.path.join("old", "d"): b"4444"})
+    old_path = str(tmp_path / "old.pcscan")
+    ScanSnapshot.from_walk(str(root)).save(old_path)
+
+    os.remove(root / "old" / "d")
+    os.rmdir(root / "old")
+    with open(root / "b", "ab") as f:
+        f.write(b"2222")
+    make_tree(root, {os.path.join("sub", "e"): b"55555", os.path.join("new", "f"): b"666666"})
+    new_path = str(tmp_path / "new.pcscan")
+    ScanSnapshot.from_walk(str(root)).save(new_path)
+
+    with ScanSnapshot.load(old_path) as old, ScanSnapshot.load(new_path) as new:
+        result = diff_snapshots(old, new)
+    assert sorted(result.added) == [(str(root / "new" / "f"), 6), (str(root / "sub" / "e"), 5)]
+    assert result.removed == [(str(root / "old" / "d"), 4)]
+    assert result.changed == [(str(root / "b"), 2, 6)]
+    assert result.as_dict()["bytes_changed"] == 4
+    grown = dict(result.grown_dirs)
+    assert grown[str(root)] == 4 + 5 + 6 - 4
+    assert grown[str(root / "old")] == -4
+    assert result.grown_dirs[0] == (str(root), 11)
+
+
+def test_diff_identical_snapshots(tmp_path):
+    root = tmp_path / "root"
+    make_tree(root, {"a": b"1", os.path.join("sub", "c"): b"333"})
+    snapshot = ScanSnapshot.from_walk(str(root))
+    result = diff_snapshots(snapshot, snapshot)
+    assert (result.added, result.removed, result.changed, result.grown_dirs) == ([], [], [], [])
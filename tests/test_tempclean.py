@@ -0,0 +1,65 @@
+import os
+
+from pccleaner.tempclean import CleanupRules, clean_folder
+
+
+def make_tree(root, files):
+    for rel, data in files.items():
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def tree_files(root):
+    return sorted(os.path.relpath(os.path.join(folder, name), root)
+                  for folder, _, names in os.walk(root) for name in names)
+
+
+FILES = {
+    "a.tmp": b"x" * 10,
+    "b.log": b"x" * 20,
+    os.path.join("sub", "c.tmp"): b"x" * 30,
+    os.path.join("keep", "d.tmp"): b"x" * 40,
+}
+
+
+def test_dry_run_counts_without_deleting(tmp_path):
+    make_tree(tmp_path, FILES)
+    stats = clean_folder(tmp_path, CleanupRules(skip_in_use=False), dry_run=True)
+    assert stats.matched == 4
+    assert stats.reclaimable == 100
+    assert stats.files == 0
+    assert stats.bytes_freed == 0
+    assert tree_files(tmp_path) == sorted(FILES)
+    assert os.path.isdir(os.path.join(tmp_path, "sub"))
+
+
+def test_deletes_files_and_empty_dirs(tmp_path):
+    make_tree(tmp_path, FILES)
+    stats = clean_folder(tmp_path, CleanupRules(skip_in_use=False))
+    assert stats.files == 4
+    assert stats.bytes_freed == 100
+    assert stats.dirs == 2
+    assert stats.errors == 0
+    assert os.listdir(tmp_path) == []
+    assert os.path.isdir(tmp_path)
+
+
+def test_exclude_rules(tmp_path):
+    make_tree(tmp_path, FILES)
+    rules = CleanupRules(exclude=["*.log", "keep"], skip_in_use=False)
+    stats = clean_folder(tmp_path, rules)
+    assert stats.files == 2
+    assert stats.bytes_freed == 40
+    assert stats.skipped == 2
+    assert tree_files(tmp_path) == sorted(["b.log", os.path.join("keep", "d.tmp")])
+    assert not os.path.exists(os.path.join(tmp_path, "sub"))
+
+
+def test_include_and_size_rules(tmp_path):
+    make_tree(tmp_path, FILES)
+    rules = CleanupRules(include=["*.tmp"], min_size=20, exclude=[os.path.join("keep", "*")], skip_in_use=False)
+    stats = clean_folder(tmp_path, rules, dry_run=True)
+    assert stats.matched == 1
+    assert stats.reclaimable == 30